@@ -0,0 +1,77 @@
+import sys
+import json
+import argparse
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(baseline, current, tolerance=0.1, metric='median'):
+    """
+    Сравнивает два запуска по каждому бенчмарку и размеру
+
+    Args:
+        baseline (dict): Результаты прошлого запуска (формат benchmarks.run)
+        current (dict): Результаты текущего запуска
+        tolerance (float): Допустимое замедление (0.1 - на 10%)
+        metric (str): Какую статистику сравнивать (median, min, mean)
+
+    Returns:
+        list: [(benchmark, size, baseline, current, ratio, status), ...];
+            status - 'regression', 'improvement', 'ok', 'new' или 'missing'
+    """
+    rows = []
+    base_results = baseline.get('results', {})
+    current_results = current.get('results', {})
+    for name in sorted(set(base_results) | set(current_results)):
+        base_sizes = base_results.get(name, {})
+        current_sizes = current_results.get(name, {})
+        for size in sorted(set(base_sizes) | set(current_sizes), key=int):
+            before = (base_sizes.get(size) or {}).get(metric)
+            after = (current_sizes.get(size) or {}).get(metric)
+            if before is None and after is None:
+                continue
+            if before is None:
+                rows.append((name, size, None, after, None, 'new'))
+                continue
+            if after is None:
+                rows.append((name, size, before, None, None, 'missing'))
+                continue
+            ratio = after / before if before else float('inf')
+            if ratio > 1 + tolerance:
+                status = 'regression'
+            elif ratio < 1 / (1 + tolerance):
+                status = 'improvement'
+            else:
+                status = 'ok'
+            rows.append((name, size, before, after, ratio, status))
+    return rows
+
+
+def format_comparison(rows, metric='median'):
+    lines = [f"{'benchmark':<24}{'size':>8}{'before ms':>12}{'after ms':>12}{'ratio':>8}  status ({metric})"]
+    for name, size, before, after, ratio, status in rows:
+        before_text = f"{before * 1000:.3f}" if before is not None else '-'
+        after_text = f"{after * 1000:.3f}" if after is not None else '-'
+        ratio_text = f"{ratio:.2f}" if ratio is not None else '-'
+        lines.append(f"{name:<24}{size:>8}{before_text:>12}{after_text:>12}{ratio_text:>8}  {status}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('baseline', help="Results of the reference run")
+    parser.add_argument('current', help="Results of the new run")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed slowdown (0.1 = 10%%)")
+    parser.add_argument('--metric', default='median', choices=('median', 'min', 'mean'))
+    args = parser.parse_args(argv)
+
+    rows = compare(load_results(args.baseline), load_results(args.current), args.tolerance, args.metric)
+    print(format_comparison(rows, args.metric))
+    return 1 if any(row[-1] == 'regression' for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
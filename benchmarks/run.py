@@ -0,0 +1,322 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import subprocess
+from datetime import datetime
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+from state_store import StateStore, StateWriter
+from odds_tracker import OddsTracker
+from match_tracker import MatchTracker
+from match_state import PRICE_FIELDS
+from messages import format_odds_changes_message, format_new_matches_message
+from replay import VirtualClock, NullWriter
+from change_engine import np
+from benchmarks.synthetic import SyntheticBoard, write_fixtures
+from benchmarks.compare import load_results, compare, format_comparison
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Шаг виртуальных часов между снимками (секунды)
+CYCLE = 300.0
+
+
+def summarize(samples, size):
+    """Статистика замеров одного бенчмарка (секунды)"""
+    samples = sorted(samples)
+    median = statistics.median(samples)
+    return {
+        'runs': len(samples),
+        'min': samples[0],
+        'median': median,
+        'mean': statistics.fmean(samples),
+        'max': samples[-1],
+        'per_match_us': median / size * 1e6,
+    }
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def bench_detect_changes(size, options):
+    """Цикл OddsTracker.detect_changes на меняющейся линии (первый снимок - инициализация)"""
+    snapshots = SyntheticBoard(size, options.volatility, options.handicap_ratio, options.churn).snapshots(options.steps)
+    clock = VirtualClock(time.time())
+    tracker = OddsTracker(NullWriter(), retention_days=7, clock=clock)
+    first, _ = timed(tracker.detect_changes, snapshots[0])
+    samples = []
+    for snapshot in snapshots[1:]:
+        clock.advance_to(clock() + CYCLE)
+        samples.append(timed(tracker.detect_changes, snapshot)[0])
+    return samples, {'first': first}
+
+
+def bench_find_new_matches(size, options):
+    """Цикл MatchTracker.find_new_matches; новые матчи появляются за счет churn"""
+    snapshots = SyntheticBoard(size, options.volatility, options.handicap_ratio, options.churn).snapshots(options.steps)
+    clock = VirtualClock(time.time())
+    tracker = MatchTracker(NullWriter(), retention_days=3, clock=clock)
+    first, _ = timed(tracker.find_new_matches, snapshots[0])
+    samples = []
+    for snapshot in snapshots[1:]:
+        clock.advance_to(clock() + CYCLE)
+        samples.append(timed(tracker.find_new_matches, snapshot)[0])
+    return samples, {'first': first}
+
+
+def _populated_trackers(size, options, writer):
+    board = SyntheticBoard(size, options.volatility, options.handicap_ratio, options.churn)
+    clock = VirtualClock(time.time())
+    odds_tracker = OddsTracker(writer, retention_days=7, clock=clock)
+    match_tracker = MatchTracker(writer, retention_days=3, clock=clock)
+    for snapshot in board.snapshots(2):
+        clock.advance_to(clock() + CYCLE)
+        odds_tracker.detect_changes(snapshot)
+        match_tracker.find_new_matches(snapshot)
+    return odds_tracker, match_tracker
+
+
+def bench_state_save(size, options):
+    """Запись полного состояния (история, последние отправленные, известные матчи) одной транзакцией"""
+    directory = tempfile.mkdtemp(prefix='bench-state-')
+    store = StateStore(os.path.join(directory, 'state.db'))
+    writer = StateWriter(store, flush_interval=3600)
+    try:
+        odds_tracker, match_tracker = _populated_trackers(size, options, writer)
+        writer.flush()
+
+        def save():
+            for match_key, state in odds_tracker.odds_history.items():
+                writer.put_odds_history(match_key, state.to_record())
+                writer.put_last_notified(match_key, state.notified_dict())
+            for match_key, known in match_tracker.known_matches.items():
+                writer.put_known_match(match_key, known.match_time, known.persisted_seen)
+            writer.flush()
+
+        return [timed(save)[0] for _ in range(options.repeat)], {}
+    finally:
+        writer.close()
+        store.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_state_load(size, options):
+    """Загрузка состояния в новые OddsTracker и MatchTracker (как при старте бота)"""
+    directory = tempfile.mkdtemp(prefix='bench-state-')
+    store = StateStore(os.path.join(directory, 'state.db'))
+    writer = StateWriter(store, flush_interval=3600)
+    try:
+        _populated_trackers(size, options, writer)
+        writer.flush()
+
+        def load():
+            clock = VirtualClock(time.time())
+            OddsTracker(writer, retention_days=7, clock=clock)
+            MatchTracker(writer, retention_days=3, clock=clock)
+
+        return [timed(load)[0] for _ in range(options.repeat)], {}
+    finally:
+        writer.close()
+        store.close()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def bench_render_changes(size, options):
+    """Сообщение о значимых изменениях, в котором изменились все цены всех матчей"""
+    board = SyntheticBoard(size, options.volatility, options.handicap_ratio, options.churn)
+    significant_changes = {}
+    for match_key, match_data in board.matches.items():
+        changes = {
+            field: {'previous': match_data[field] + 0.25, 'current': match_data[field],
+                    'diff': 0.25, 'direction': -1, 'significant': True}
+            for field in PRICE_FIELDS if field in match_data
+        }
+        significant_changes[match_key] = {'match_data': match_data, 'initial_data': {}, 'changes': changes}
+    return [timed(format_odds_changes_message, significant_changes)[0] for _ in range(options.repeat)], {}
+
+
+def bench_render_new_matches(size, options):
+    """Сообщение о новых матчах для всей линии"""
+    matches = SyntheticBoard(size, options.volatility, options.handicap_ratio, options.churn).matches
+    return [timed(format_new_matches_message, matches)[0] for _ in range(options.repeat)], {}
+
+
+class FixtureServer:
+    def __init__(self, directory):
+        """Локальный файловый сервер фикстур (как python -m http.server)"""
+        handler = partial(_QuietHandler, directory=directory)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fixture-server", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def fixture_dir(size, options):
+    """Каталог фикстур размера size; отсутствующие фикстуры генерируются"""
+    directory = os.path.join(options.fixtures, str(size))
+    if not os.path.exists(os.path.join(directory, 'page.html')):
+        board = SyntheticBoard(size, options.volatility, options.handicap_ratio, options.churn)
+        write_fixtures(directory, board.matches)
+    return directory
+
+
+def _create_fetcher(backend, url, server_url):
+    from fetchers import HttpFetcher, SeleniumFetcher, CdpFetcher
+
+    if backend == 'http':
+        return HttpFetcher('benchmark', url, api_url=server_url)
+    if backend == 'cdp':
+        from config import CDP_CHROME_BINARY, CHROME_OPTIONS
+        return CdpFetcher('benchmark', url, binary=CDP_CHROME_BINARY, arguments=CHROME_OPTIONS['arguments'])
+    return SeleniumFetcher('benchmark', url)
+
+
+def bench_extraction(backend, size, options):
+    """
+    get_current_odds выбранной стратегией против фикстур на локальном сервере;
+    у браузерных стратегий отпечатки строк сбрасываются, чтобы каждый замер разбирал всю таблицу
+    """
+    with FixtureServer(fixture_dir(size, options)) as server:
+        fetcher = _create_fetcher(backend, f"{server.url}/page.html", server.url)
+        try:
+            first, matches = timed(fetcher.fetch)
+            if len(matches) != size:
+                raise RuntimeError(f"{backend} extracted {len(matches)} of {size} matches")
+            samples = []
+            for _ in range(options.repeat):
+                if hasattr(fetcher, 'extractor'):
+                    fetcher.extractor.reset()
+                samples.append(timed(fetcher.fetch)[0])
+            return samples, {'first': first}
+        finally:
+            fetcher.close()
+
+
+BENCHMARKS = {
+    'detect_changes': bench_detect_changes,
+    'find_new_matches': bench_find_new_matches,
+    'state_save': bench_state_save,
+    'state_load': bench_state_load,
+    'render_changes': bench_render_changes,
+    'render_new_matches': bench_render_new_matches,
+    'extraction_http': partial(bench_extraction, 'http'),
+    'extraction_selenium': partial(bench_extraction, 'selenium'),
+    'extraction_cdp': partial(bench_extraction, 'cdp'),
+}
+
+# Браузерные стратегии запускаются только по запросу (нужен Chromium)
+DEFAULT_BENCHMARKS = tuple(name for name in BENCHMARKS if name not in ('extraction_selenium', 'extraction_cdp'))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(FIXTURES_DIR), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(names, sizes, options):
+    """
+    Запускает бенчмарки по всем размерам
+
+    Returns:
+        dict: {'meta': окружение и параметры, 'results': {бенчмарк: {размер: статистика}}}
+    """
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__ if np is not None else None,
+            'options': {key: value for key, value in vars(options).items()
+                        if key in ('steps', 'repeat', 'volatility', 'handicap_ratio', 'churn')},
+        },
+        'results': {},
+    }
+    for name in names:
+        results = report['results'].setdefault(name, {})
+        for size in sizes:
+            try:
+                samples, extra = BENCHMARKS[name](size, options)
+            except Exception as e:
+                logger.warning(f"{name}/{size} failed: {e}")
+                results[str(size)] = {'error': str(e)}
+                continue
+            results[str(size)] = dict(summarize(samples, size), **extra)
+            print(f"{name:<24}{size:>8}  median {results[str(size)]['median'] * 1000:10.3f} ms"
+                  f"  ({results[str(size)]['per_match_us']:.2f} us/match)", file=sys.stderr)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark extraction, change detection, matching, "
+                                                 "state persistence and message rendering")
+    parser.add_argument('--only', help=f"Comma-separated benchmarks (default: {','.join(DEFAULT_BENCHMARKS)}; "
+                                       f"also extraction_selenium, extraction_cdp)")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help="Comma-separated match counts")
+    parser.add_argument('--steps', type=int, default=20, help="Snapshots per tracker benchmark")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per one-shot benchmark")
+    parser.add_argument('--volatility', type=float, default=0.2, help="Share of prices moving per snapshot")
+    parser.add_argument('--handicap-ratio', type=float, default=0.8, help="Share of matches with handicaps")
+    parser.add_argument('--churn', type=float, default=0.01, help="Share of matches replaced per snapshot")
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help="Fixture directory (missing sizes are generated)")
+    parser.add_argument('--output', help="Write results as JSON to this file (default: stdout)")
+    parser.add_argument('--compare', help="Compare with a previous results file; exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed slowdown for --compare")
+    options = parser.parse_args(argv)
+
+    # Логи трекеров не должны попадать в замеры
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    names = options.only.split(',') if options.only else list(DEFAULT_BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+    sizes = [int(size) for size in options.sizes.split(',')]
+
+    report = run(names, sizes, options)
+    if options.output:
+        with open(options.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if options.compare:
+        rows = compare(load_results(options.compare), report, options.tolerance)
+        print(format_comparison(rows), file=sys.stderr)
+        if any(row[-1] == 'regression' for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import os
+import json
+import random
+from html import escape
+from datetime import datetime, timedelta, timezone
+
+from match_state import PRICE_FIELDS
+
+
+def _american(decimal):
+    """Десятичный коэффициент в американский (формат JSON-фида Pinnacle)"""
+    if decimal >= 2:
+        return round((decimal - 1) * 100)
+    return round(-100 / (decimal - 1))
+
+
+class SyntheticBoard:
+    def __init__(self, count, volatility=0.2, handicap_ratio=0.8, churn=0.01, step_size=0.08, seed=0):
+        """
+        Синтетическая линия матчей: снимки в формате скрапа, цены которых
+        случайно двигаются от снимка к снимку
+
+        Args:
+            count (int): Количество матчей в снимке
+            volatility (float): Доля цен, которые меняются за один снимок
+            handicap_ratio (float): Доля матчей с форами -1.5/+1.5
+            churn (float): Доля матчей, которые за снимок сменяются новыми
+            step_size (float): Наибольший шаг цены за снимок
+            seed (int): Начальное значение генератора (одинаковые данные между запусками)
+        """
+        self.count = count
+        self.volatility = volatility
+        self.handicap_ratio = handicap_ratio
+        self.churn = churn
+        self.step_size = step_size
+        self.random = random.Random(seed)
+        self._next_id = 0
+        self.matches = {}
+        for _ in range(count):
+            self._add_match()
+
+    def _add_match(self):
+        rnd = self.random
+        match_id = self._next_id
+        self._next_id += 1
+        team1, team2 = f"Team {match_id}A", f"Team {match_id}B"
+        odds1 = round(rnd.uniform(1.05, 4.5), 3)
+        odds2 = round(max(1.01, 1 / max(1.02 - 1 / odds1, 0.05)), 3)
+        match_data = {
+            'team1': team1,
+            'team2': team2,
+            'time': f"{rnd.randrange(24):02d}:{rnd.choice((0, 15, 30, 45)):02d}",
+            'odds1': odds1,
+            'odds2': odds2,
+        }
+        if rnd.random() < self.handicap_ratio:
+            favorite_first = odds1 <= odds2
+            match_data['handicap1'] = '-1.5' if favorite_first else '+1.5'
+            match_data['handicap_odd1'] = round(rnd.uniform(1.5, 2.6), 3)
+            match_data['handicap2'] = '+1.5' if favorite_first else '-1.5'
+            match_data['handicap_odd2'] = round(rnd.uniform(1.5, 2.6), 3)
+        self.matches[f"{team1} vs {team2}"] = match_data
+
+    def step(self):
+        """
+        Следующий снимок: часть матчей сменяется, часть цен сдвигается
+
+        Returns:
+            dict: Новый словарь матчей (словари матчей не разделяются с прошлыми снимками)
+        """
+        rnd = self.random
+        for match_key in rnd.sample(list(self.matches), int(self.count * self.churn)):
+            del self.matches[match_key]
+            self._add_match()
+
+        snapshot = {}
+        for match_key, match_data in self.matches.items():
+            match_data = dict(match_data)
+            for field in PRICE_FIELDS:
+                if field in match_data and rnd.random() < self.volatility:
+                    step = rnd.uniform(-self.step_size, self.step_size)
+                    match_data[field] = round(min(max(match_data[field] + step, 1.01), 15.0), 3)
+            self.matches[match_key] = match_data
+            snapshot[match_key] = match_data
+        return snapshot
+
+    def snapshots(self, steps):
+        """Первый снимок и steps следующих"""
+        return [dict(self.matches)] + [self.step() for _ in range(steps)]
+
+
+def render_page(matches):
+    """
+    HTML страницы линии с разметкой, которую разбирает ROW_EXTRACT_JS
+    (классы styleRowHighlight, event-row-participant, styleMatchupDate, stylePrice)
+    """
+    rows = []
+    for match_data in matches.values():
+        handicaps = ''
+        if 'handicap1' in match_data:
+            handicaps = (
+                f'<div><div><span>{match_data["handicap1"]}</span>'
+                f'<span class="stylePrice">{match_data["handicap_odd1"]:.3f}</span></div>'
+                f'<div><span>{match_data["handicap2"]}</span>'
+                f'<span class="stylePrice">{match_data["handicap_odd2"]:.3f}</span></div></div>'
+            )
+        rows.append(
+            '<div class="styleRowHighlight">'
+            f'<div class="event-row-participant">{escape(match_data["team1"])} (Match)</div>'
+            f'<div class="event-row-participant">{escape(match_data["team2"])} (Match)</div>'
+            f'<div class="styleMatchupDate">{match_data["time"]}</div>'
+            f'<div><span class="stylePrice">{match_data["odds1"]:.3f}</span>'
+            f'<span class="stylePrice">{match_data["odds2"]:.3f}</span></div>'
+            f'{handicaps}</div>'
+        )
+    return '<!DOCTYPE html>\n<html><head><meta charset="utf-8"></head><body>\n' + '\n'.join(rows) + '\n</body></html>\n'
+
+
+def render_feed(matches, sport_id=12, utc_offset=1):
+    """
+    Ответы эндпоинтов matchups и markets/straight JSON-фида для тех же матчей
+
+    Returns:
+        tuple: (matchups, markets)
+    """
+    display_tz = timezone(timedelta(hours=utc_offset))
+    today = datetime.now(display_tz).date()
+    matchups, markets = [], []
+    for matchup_id, match_data in enumerate(matches.values(), start=1):
+        hours, minutes = map(int, match_data['time'].split(':'))
+        start = datetime(today.year, today.month, today.day, hours, minutes, tzinfo=display_tz)
+        matchups.append({
+            'id': matchup_id,
+            'league': {'name': 'Dota 2 - Synthetic League', 'sport': {'id': sport_id}},
+            'startTime': start.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'participants': [
+                {'alignment': 'home', 'name': f"{match_data['team1']} (Match)"},
+                {'alignment': 'away', 'name': f"{match_data['team2']} (Match)"},
+            ],
+        })
+        markets.append({
+            'matchupId': matchup_id, 'period': 0, 'type': 'moneyline', 'isAlternate': False,
+            'prices': [
+                {'designation': 'home', 'price': _american(match_data['odds1'])},
+                {'designation': 'away', 'price': _american(match_data['odds2'])},
+            ],
+        })
+        if 'handicap1' in match_data:
+            markets.append({
+                'matchupId': matchup_id, 'period': 0, 'type': 'spread', 'isAlternate': False,
+                'prices': [
+                    {'designation': 'home', 'points': float(match_data['handicap1']),
+                     'price': _american(match_data['handicap_odd1'])},
+                    {'designation': 'away', 'points': float(match_data['handicap2']),
+                     'price': _american(match_data['handicap_odd2'])},
+                ],
+            })
+    return matchups, markets
+
+
+def write_fixtures(directory, matches, sport_id=12):
+    """
+    Записывает фикстуры одного размера в формате, который раздает python -m http.server:
+    page.html для браузерных стратегий и sports/<id>/... для стратегии http
+
+    Args:
+        directory (str): Каталог фикстур этого размера
+        matches (dict): Матчи снимка
+    """
+    feed_dir = os.path.join(directory, 'sports', str(sport_id), 'markets')
+    os.makedirs(feed_dir, exist_ok=True)
+    with open(os.path.join(directory, 'page.html'), 'w', encoding='utf-8') as f:
+        f.write(render_page(matches))
+    matchups, markets = render_feed(matches, sport_id)
+    with open(os.path.join(directory, 'sports', str(sport_id), 'matchups'), 'w', encoding='utf-8') as f:
+        json.dump(matchups, f)
+    with open(os.path.join(feed_dir, 'straight'), 'w', encoding='utf-8') as f:
+        json.dump(markets, f)
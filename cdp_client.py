@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import subprocess
+
+from resource_governor import (make_profile_dir, discard_profile_dir, process_tree, kill_processes, track_orphans,
+                               reap_zombies)
+
+logger = logging.getLogger(__name__)
+
+
+class CdpError(Exception):
+    """Ошибка, которую вернул браузер в ответ на команду DevTools"""
+
+
+class CdpPage:
+    def __init__(self, websocket):
+        """
+        Вкладка браузера, управляемая напрямую по протоколу DevTools (без chromedriver)
+
+        Args:
+            websocket: Открытое aiohttp-соединение с webSocketDebuggerUrl вкладки
+        """
+        self._ws = websocket
+        self._next_id = 0
+        self._pending = {}
+        self._waiters = {}
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        import aiohttp
+
+        try:
+            async for message in self._ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                data = json.loads(message.data)
+                if 'id' in data:
+                    future = self._pending.pop(data['id'], None)
+                    if future is None or future.done():
+                        continue
+                    if 'error' in data:
+                        future.set_exception(CdpError(data['error'].get('message', data['error'])))
+                    else:
+                        future.set_result(data.get('result', {}))
+                else:
+                    for future in self._waiters.pop(data.get('method'), []):
+                        if not future.done():
+                            future.set_result(data.get('params', {}))
+        finally:
+            # Соединение закрыто: будим всех, кто ждет ответа
+            error = ConnectionError("DevTools connection closed")
+            for future in list(self._pending.values()) + [f for fs in self._waiters.values() for f in fs]:
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+            self._waiters.clear()
+
+    @property
+    def closed(self):
+        return self._ws.closed or self._reader.done()
+
+    async def send(self, method, params=None, timeout=30):
+        """Отправляет команду DevTools и ждет ответ"""
+        self._next_id += 1
+        message_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        await self._ws.send_str(json.dumps({'id': message_id, 'method': method, 'params': params or {}}))
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(message_id, None)
+
+    def expect(self, method):
+        """
+        Регистрирует ожидание события до отправки команды, которая его вызовет
+
+        Returns:
+            asyncio.Future: Параметры первого события method
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(method, []).append(future)
+        return future
+
+    async def evaluate(self, script, *args):
+        """
+        Выполняет скрипт на странице с той же семантикой, что и execute_script
+        в Selenium: тело функции с return, аргументы доступны через arguments
+
+        Returns:
+            Значение, которое вернул скрипт (сериализуемое в JSON)
+        """
+        expression = f"(function() {{\n{script}\n}}).apply(null, {json.dumps(list(args))})"
+        result = await self.send('Runtime.evaluate', {'expression': expression, 'returnByValue': True})
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            description = details.get('exception', {}).get('description') or details.get('text')
+            raise CdpError(f"Script error: {description}")
+        return result.get('result', {}).get('value')
+
+    async def navigate(self, url, timeout=30):
+        """Открывает url и ждет события load"""
+        loaded = self.expect('Page.loadEventFired')
+        result = await self.send('Page.navigate', {'url': url}, timeout)
+        if result.get('errorText'):
+            raise CdpError(f"Navigation to {url} failed: {result['errorText']}")
+        await asyncio.wait_for(loaded, timeout)
+
+    async def close(self):
+        await self._ws.close()
+        self._reader.cancel()
+
+
+class ChromiumBrowser:
+    def __init__(self, binary, arguments=(), profile_root=None):
+        """
+        Headless Chromium, запущенный ботом с открытым портом DevTools
+
+        Args:
+            binary (str): Путь к исполняемому файлу Chromium/Chrome
+            arguments (list): Дополнительные аргументы командной строки
+            profile_root (str): Каталог для временного профиля
+        """
+        self.binary = binary
+        self.arguments = list(arguments)
+        self.profile_root = profile_root
+
+        self.process = None
+        self.profile_dir = None
+        self.session = None
+        self.page = None
+        self.started_at = None
+        self.requests = 0
+
+    @property
+    def age(self):
+        return time.monotonic() - self.started_at if self.started_at else 0
+
+    async def start(self, timeout=30):
+        """Запускает браузер и подключается к его первой вкладке"""
+        import aiohttp
+
+        self.profile_dir = make_profile_dir(self.profile_root)
+        command = [self.binary, '--remote-debugging-port=0', f'--user-data-dir={self.profile_dir}',
+                   '--no-first-run', '--no-default-browser-check'] + self.arguments + ['about:blank']
+        self.process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.started_at = time.monotonic()
+
+        # Chrome записывает выбранный порт в DevToolsActivePort профиля
+        port_file = os.path.join(self.profile_dir, 'DevToolsActivePort')
+        deadline = time.monotonic() + timeout
+        port = None
+        while port is None:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Browser exited with code {self.process.returncode} during startup")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Browser did not open DevTools port in {timeout}s")
+            try:
+                with open(port_file) as f:
+                    port = int(f.readline().strip())
+            except (OSError, ValueError):
+                await asyncio.sleep(0.1)
+
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout))
+        page_target = None
+        while page_target is None:
+            async with self.session.get(f'http://127.0.0.1:{port}/json/list') as response:
+                targets = await response.json(content_type=None)
+            page_target = next((target for target in targets if target.get('type') == 'page'), None)
+            if page_target is None:
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Browser did not open a page in {timeout}s")
+                await asyncio.sleep(0.1)
+
+        websocket = await self.session.ws_connect(page_target['webSocketDebuggerUrl'], max_msg_size=0)
+        self.page = CdpPage(websocket)
+        await self.page.send('Page.enable')
+        logger.info(f"Browser started (pid {self.process.pid}, DevTools port {port})")
+        return self.page
+
+    async def close(self):
+        """Закрывает браузер, добивает его процессы и удаляет профиль"""
+        processes = process_tree(self.process.pid) if self.process else []
+        # Самим браузером владеет Popen, собираются только осиротевшие процессы его дерева
+        track_orphans(processes, self.process.pid if self.process else None)
+        try:
+            if self.page is not None and not self.page.closed:
+                await self.page.send('Browser.close', timeout=5)
+        except Exception:
+            pass
+        try:
+            if self.page is not None:
+                await self.page.close()
+            if self.session is not None:
+                await self.session.close()
+        except Exception as e:
+            logger.warning(f"Error closing DevTools connection: {e}")
+
+        if self.process is not None:
+            try:
+                await asyncio.wait_for(asyncio.to_thread(self.process.wait), 5)
+            except asyncio.TimeoutError:
+                pass
+        kill_processes(processes)
+        reap_zombies()
+        discard_profile_dir(self.profile_dir)
+
+        self.process = None
+        self.page = None
+        self.session = None
@@ -0,0 +1,149 @@
+import math
+import logging
+from bisect import bisect_right
+
+from match_state import PRICE_FIELDS, SLOTS, INITIAL, NOTIFIED, CURRENT
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Таблица порогов значимого изменения: границы диапазонов коэффициента
+# и порог для каждого диапазона; ниже 1.01 и от 4.0 и выше порог 0.50
+THRESHOLD_EDGES = (1.01, 1.1, 1.2, 1.3, 1.4, 1.6, 1.9, 2.2, 2.5, 3.0, 4.0)
+THRESHOLD_VALUES = (0.50, 0.01, 0.02, 0.03, 0.04, 0.05, 0.07, 0.10, 0.15, 0.20, 0.30, 0.50)
+
+# Схема порогов: (границы, пороги); трекер может работать с любой схемой (replay.py сравнивает их)
+DEFAULT_SCHEDULE = (THRESHOLD_EDGES, THRESHOLD_VALUES)
+
+WIDTH = len(PRICE_FIELDS)
+
+if np is not None:
+    _SLOT_BITS = np.arange(SLOTS, dtype=np.int64)
+
+# Таблицы схем для numpy: {схема: (границы, пороги)}
+_numpy_schedules = {}
+
+
+def make_schedule(edges, values):
+    """
+    Проверяет и собирает схему порогов
+
+    Args:
+        edges (iterable): Возрастающие границы диапазонов коэффициента
+        values (iterable): Пороги: на один больше, чем границ (ниже первой и от последней границы)
+
+    Returns:
+        tuple: Схема (границы, пороги)
+    """
+    edges = tuple(float(edge) for edge in edges)
+    values = tuple(float(value) for value in values)
+    if len(values) != len(edges) + 1:
+        raise ValueError(f"Threshold schedule needs {len(edges) + 1} values for {len(edges)} edges, got {len(values)}")
+    if any(second <= first for first, second in zip(edges, edges[1:])):
+        raise ValueError(f"Threshold schedule edges must be increasing: {edges}")
+    if any(value <= 0 for value in values):
+        raise ValueError(f"Threshold schedule values must be positive: {values}")
+    return edges, values
+
+
+def get_threshold(odds_value, schedule=DEFAULT_SCHEDULE):
+    """
+    Порог значимого изменения для коэффициента
+
+    Args:
+        odds_value (float): Коэффициент, от которого считается изменение
+        schedule (tuple): Схема порогов (по умолчанию DEFAULT_SCHEDULE)
+
+    Returns:
+        float: Порог
+    """
+    edges, values = schedule
+    return values[bisect_right(edges, odds_value)]
+
+
+def _numpy_schedule(schedule):
+    tables = _numpy_schedules.get(schedule)
+    if tables is None:
+        tables = _numpy_schedules[schedule] = (np.array(schedule[0]), np.array(schedule[1]))
+    return tables
+
+
+def _evaluate_numpy(prices, present, current, schedule):
+    count = len(present)
+    matrix = np.frombuffer(prices, dtype=float).reshape(count, SLOTS)
+    bits = (np.array(present, dtype=np.int64)[:, None] >> _SLOT_BITS & 1).astype(bool)
+    current = np.array(current, dtype=float).reshape(count, WIDTH)
+
+    # NaN (нет значения) не проходит ни одно сравнение
+    with np.errstate(invalid='ignore'):
+        eligible = ~np.isnan(current) & bits[:, INITIAL:INITIAL + WIDTH]
+        notified = np.where(bits[:, NOTIFIED:NOTIFIED + WIDTH], matrix[:, NOTIFIED:NOTIFIED + WIDTH], np.nan)
+        fill = eligible & np.isnan(notified)
+        reported = np.where(fill, current, notified)
+
+        edges, values = _numpy_schedule(schedule)
+        thresholds = values[np.searchsorted(edges, reported, side='right')]
+        significant = eligible & (current != reported) & (np.abs(current - reported) >= thresholds)
+
+        previous = matrix[:, CURRENT:CURRENT + WIDTH]
+        moved = eligible & bits[:, CURRENT:CURRENT + WIDTH] & ~np.isnan(previous) & (current != previous)
+        moved_rows = np.flatnonzero(moved)
+        moved_diff = np.abs(previous - current).ravel()[moved_rows]
+        direction = np.where(current > previous, 1, -1).ravel()[moved_rows]
+
+    return (np.flatnonzero(fill).tolist(), np.flatnonzero(significant).tolist(),
+            moved_rows.tolist(), moved_diff.tolist(), direction.tolist())
+
+
+def _evaluate_python(prices, present, current, schedule):
+    fill, significant, moved, moved_diff, direction = [], [], [], [], []
+    for position, mask in enumerate(present):
+        base = position * SLOTS
+        for index in range(WIDTH):
+            row = position * WIDTH + index
+            current_value = current[row]
+            if current_value is None or not mask >> (INITIAL + index) & 1:
+                continue
+
+            reported_value = prices[base + NOTIFIED + index] if mask >> (NOTIFIED + index) & 1 else math.nan
+            if math.isnan(reported_value):
+                fill.append(row)
+                reported_value = current_value
+            if current_value != reported_value and \
+                    abs(current_value - reported_value) >= get_threshold(reported_value, schedule):
+                significant.append(row)
+
+            previous_value = prices[base + CURRENT + index] if mask >> (CURRENT + index) & 1 else math.nan
+            if not math.isnan(previous_value) and current_value != previous_value:
+                moved.append(row)
+                moved_diff.append(abs(previous_value - current_value))
+                direction.append(1 if current_value > previous_value else -1)
+    return fill, significant, moved, moved_diff, direction
+
+
+def evaluate_changes(prices, present, current, schedule=DEFAULT_SCHEDULE):
+    """
+    Сверяет цены сразу всех матчей цикла. Поле сверяется, если его цена есть
+    в снимке и в начальных значениях; отсчет идет от последнего отправленного
+    значения, а если его нет - от текущей цены.
+
+    Args:
+        prices (array): Подряд идущие массивы MatchState.prices сверяемых матчей
+        present (list): Маски MatchState.present тех же матчей
+        current (list): Цены снимка, по len(PRICE_FIELDS) на матч (None - нет цены)
+        schedule (tuple): Схема порогов (по умолчанию DEFAULT_SCHEDULE)
+
+    Returns:
+        tuple: Номера строк (матч * len(PRICE_FIELDS) + поле): (без последнего отправленного
+            значения, со значимым изменением, изменившиеся с прошлого скрапа), а также модули
+            и направления (1/-1) изменений для изменившихся строк
+    """
+    if not present:
+        return [], [], [], [], []
+    if np is not None:
+        return _evaluate_numpy(prices, present, current, schedule)
+    return _evaluate_python(prices, present, current, schedule)
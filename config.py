@@ -28,7 +28,20 @@ else:  # production
             '--no-sandbox',
             '--disable-dev-shm-usage',
             '--disable-gpu'
-        ]
+        ],
+        # Читать коэффициенты из JSON-ответов, которые загружает страница (CDP performance log);
+        # только FETCH_BACKEND=selenium, стратегия cdp всегда разбирает DOM
+        'capture_feed': os.getenv('CDP_CAPTURE_FEED', '1') == '1',
+        # Не загружать картинки, шрифты, стили и трекеры (CDP Network.setBlockedURLs)
+        'block_resources': os.getenv('BLOCK_RESOURCES', '1') == '1',
+        'blocked_urls': [
+            '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+            '*.woff', '*.woff2', '*.ttf', '*.otf', '*.css',
+            '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+            '*hotjar*', '*facebook.net*'
+        ] + [p.strip() for p in os.getenv('BLOCKED_URL_PATTERNS', '').split(',') if p.strip()],
+        # Передавать из браузера только строки, изменившиеся с прошлого скрапа
+        'incremental_extract': os.getenv('INCREMENTAL_EXTRACT', '1') == '1'
     }
 
 # Логи
@@ -37,6 +50,14 @@ if ENVIRONMENT == 'development':
     LOG_FILE = os.getenv('LOG_FILE', 'logs/dev.log')
 else:
     LOG_FILE = os.getenv('LOG_FILE', '/var/log/dota_bot/bot.log')
+LOG_MAX_MB = int(os.getenv('LOG_MAX_MB', '10'))  # ротация по размеру, закрытые файлы сжимаются в gzip
+LOG_ROTATE_HOURS = float(os.getenv('LOG_ROTATE_HOURS', '24'))  # и по времени
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+
+# Отладочный журнал трекера (JSON lines); при DEBUG_LOG=0 события даже не собираются
+DEBUG_LOG = os.getenv('DEBUG_LOG', '1') == '1'
+DEBUG_LOG_FILE = os.getenv('DEBUG_LOG_FILE', 'debug_odds_tracker.log')
+DEBUG_LOG_SAMPLE = int(os.getenv('DEBUG_LOG_SAMPLE', '20'))  # из частых событий пишется каждое N-е
 
 # Администраторы бота
 ADMIN_IDS = list(map(int, os.getenv('ADMIN_IDS', '').split(',')))
@@ -44,4 +65,82 @@ ADMIN_IDS = list(map(int, os.getenv('ADMIN_IDS', '').split(',')))
 # URL букмекерских контор
 BOOKMAKER_URLS = {
     'pinnacle': os.getenv('PINNACLE_URL', 'https://www.pin880.com/en/standard/esports/games/dota-2')
-}
\ No newline at end of file
+}
+
+# Дополнительные страницы для скрапа в формате "имя=url,имя=url"
+# (другие категории, лиги, live и prematch). Первым всегда идет pinnacle.
+for _entry in filter(None, os.getenv('EXTRA_BOOKMAKER_URLS', '').split(',')):
+    _name, _, _url = _entry.partition('=')
+    BOOKMAKER_URLS[_name.strip()] = _url.strip()
+SOURCE_TIMEOUT = int(os.getenv('SOURCE_TIMEOUT', '120'))  # таймаут скрапа одного источника
+
+# Пул браузерных сессий
+DRIVER_POOL_SIZE = int(os.getenv('DRIVER_POOL_SIZE', '1'))
+DRIVER_MAX_AGE = int(os.getenv('DRIVER_MAX_AGE', '1800'))  # секунды
+DRIVER_MAX_REQUESTS = int(os.getenv('DRIVER_MAX_REQUESTS', '100'))
+DRIVER_ACQUIRE_TIMEOUT = int(os.getenv('DRIVER_ACQUIRE_TIMEOUT', '120'))
+
+# Ожидание готовности таблицы коэффициентов
+READY_TIMEOUT = float(os.getenv('READY_TIMEOUT', '20'))  # секунды
+READY_QUIET_WINDOW = float(os.getenv('READY_QUIET_WINDOW', '1.0'))
+READY_POLL_INTERVAL = float(os.getenv('READY_POLL_INTERVAL', '0.25'))
+
+# Способ получения коэффициентов: selenium (браузер), cdp (браузер без chromedriver)
+# или http (JSON-фид без браузера)
+FETCH_BACKEND = os.getenv('FETCH_BACKEND', 'selenium')
+PINNACLE_API_URL = os.getenv('PINNACLE_API_URL', 'https://guest.api.arcadia.pinnacle.com/0.1')
+PINNACLE_API_KEY = os.getenv('PINNACLE_API_KEY')
+PINNACLE_SPORT_ID = int(os.getenv('PINNACLE_SPORT_ID', '12'))  # 12 - киберспорт
+PINNACLE_LEAGUE_FILTER = os.getenv('PINNACLE_LEAGUE_FILTER', 'Dota 2')
+PINNACLE_RECORD_DIR = os.getenv('PINNACLE_RECORD_DIR')  # сохранять ответы фида для локального стенда
+DISPLAY_UTC_OFFSET = int(os.getenv('DISPLAY_UTC_OFFSET', '1'))  # время матчей в сообщениях указано в UTC+1
+# Браузер для FETCH_BACKEND=cdp (управляется напрямую по DevTools, chromedriver не нужен)
+CDP_CHROME_BINARY = os.getenv('CDP_CHROME_BINARY', CHROME_OPTIONS['binary_location'] or 'chromium')
+CDP_CAPTURE_TIMEOUT = float(os.getenv('CDP_CAPTURE_TIMEOUT', '10'))  # сколько ждать JSON-фид страницы (selenium)
+
+# Количество потоков для блокирующих скрапов (вне event loop бота)
+SCRAPE_WORKERS = int(os.getenv('SCRAPE_WORKERS', str(DRIVER_POOL_SIZE)))
+
+# Сколько секунд снимок коэффициентов считается свежим для команд и рассылок
+SNAPSHOT_TTL = int(os.getenv('SNAPSHOT_TTL', '150'))
+
+# Режим наблюдения: одна постоянно открытая вкладка, изменения цен отслеживаются на странице
+WATCH_MODE = os.getenv('WATCH_MODE', '0') == '1'
+WATCH_DRAIN_INTERVAL = float(os.getenv('WATCH_DRAIN_INTERVAL', '1.0'))  # секунды
+WATCH_BUFFER_SIZE = int(os.getenv('WATCH_BUFFER_SIZE', '2000'))
+WATCH_RELOAD_INTERVAL = int(os.getenv('WATCH_RELOAD_INTERVAL', '1800'))  # секунды
+
+# Адаптивное расписание скрапов: чаще перед началом матчей и после движения цен
+ADAPTIVE_SCHEDULE = os.getenv('ADAPTIVE_SCHEDULE', '1') == '1'
+SCHEDULE_MIN_INTERVAL = int(os.getenv('SCHEDULE_MIN_INTERVAL', '30'))  # секунды
+SCHEDULE_MAX_INTERVAL = int(os.getenv('SCHEDULE_MAX_INTERVAL', '900'))  # секунды
+SCHEDULE_KICKOFF_WINDOW = int(os.getenv('SCHEDULE_KICKOFF_WINDOW', '60'))  # минуты до начала матча
+SCHEDULE_VOLATILITY_WINDOW = int(os.getenv('SCHEDULE_VOLATILITY_WINDOW', '600'))  # секунды после движения цены
+
+# Контроль ресурсов браузеров (selenium и cdp): память и CPU из /proc, сбор зомби, временные профили
+CHROME_RSS_BUDGET_MB = int(os.getenv('CHROME_RSS_BUDGET_MB', '1500'))  # на одну сессию
+CHROME_PROFILE_ROOT = os.getenv('CHROME_PROFILE_ROOT')  # по умолчанию системный каталог временных файлов
+GOVERNOR_INTERVAL = int(os.getenv('GOVERNOR_INTERVAL', '30'))  # секунды
+
+# Постоянный профиль браузера с HTTP-кэшем, переживающий утилизацию сессий
+CHROME_PERSISTENT_PROFILE = os.getenv('CHROME_PERSISTENT_PROFILE', '0') == '1'
+CHROME_PROFILE_DIR = os.getenv('CHROME_PROFILE_DIR', 'browser_profiles')  # по слоту на сессию пула
+CHROME_DISK_CACHE_MB = int(os.getenv('CHROME_DISK_CACHE_MB', '200'))
+CHROME_PROFILE_MAX_MB = int(os.getenv('CHROME_PROFILE_MAX_MB', '1000'))  # больше - слот очищается
+
+# Хранилище состояния трекеров (SQLite); старые JSON-файлы импортируются один раз
+STATE_DB_FILE = os.getenv('STATE_DB_FILE', 'bot_state.db')
+STATE_FLUSH_INTERVAL = float(os.getenv('STATE_FLUSH_INTERVAL', '2.0'))  # секунды накопления изменений перед записью
+
+# Сроки хранения состояния трекеров (дни без обновлений до вытеснения)
+ODDS_HISTORY_RETENTION_DAYS = float(os.getenv('ODDS_HISTORY_RETENTION_DAYS', '7'))
+KNOWN_MATCHES_RETENTION_DAYS = float(os.getenv('KNOWN_MATCHES_RETENTION_DAYS', '3'))
+
+# Журнал всех наблюдаемых цен: дневные сегменты с записями фиксированной длины
+TICK_LOG = os.getenv('TICK_LOG', '1') == '1'
+TICK_LOG_DIR = os.getenv('TICK_LOG_DIR', 'ticks')
+TICK_LOG_CHANGES_ONLY = os.getenv('TICK_LOG_CHANGES_ONLY', '0') == '1'  # писать только изменившиеся цены
+
+# Метрики этапов цикла и задач в формате Prometheus (0 - endpoint выключен)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
@@ -0,0 +1,405 @@
+import os
+import time
+import logging
+import threading
+import traceback
+
+from metrics import observe_stage
+from resource_governor import (make_profile_dir, discard_profile_dir, process_tree, track_orphans,
+                               reap_zombies, get_persistent_profiles)
+
+logger = logging.getLogger(__name__)
+
+
+def create_driver():
+    """
+    Создает новый экземпляр WebDriver согласно настройкам окружения
+    (Chrome в production, Firefox в development)
+    """
+    from selenium import webdriver
+    from config import ENVIRONMENT, CHROME_OPTIONS, CHROME_PROFILE_ROOT, CHROME_DISK_CACHE_MB
+
+    if ENVIRONMENT == 'production':
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.chrome.options import Options
+
+        # Настройки для Chrome в продакшен-окружении
+        chrome_options = Options()
+        for arg in CHROME_OPTIONS['arguments']:
+            chrome_options.add_argument(arg)
+
+        if CHROME_OPTIONS['binary_location']:
+            chrome_options.binary_location = CHROME_OPTIONS['binary_location']
+
+        # Постоянный профиль с HTTP-кэшем переживает утилизацию сессии;
+        # иначе - собственный временный профиль, который удаляется вместе с сессией
+        persistent = get_persistent_profiles()
+        if persistent is not None:
+            profile_dir = persistent.acquire()
+            chrome_options.add_argument(f'--disk-cache-size={CHROME_DISK_CACHE_MB * 1024 * 1024}')
+        else:
+            profile_dir = make_profile_dir(CHROME_PROFILE_ROOT)
+        chrome_options.add_argument(f'--user-data-dir={profile_dir}')
+
+        # Включаем журнал сетевых событий CDP, чтобы читать JSON-фид страницы
+        # и считать заблокированные запросы
+        if CHROME_OPTIONS.get('capture_feed') or CHROME_OPTIONS.get('block_resources'):
+            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+            chrome_options.add_experimental_option('perfLoggingPrefs', {
+                'enableNetwork': True,
+                'enablePage': False
+            })
+
+        # Используем установленный chromedriver
+        service = Service('/usr/bin/chromedriver')
+        try:
+            driver = webdriver.Chrome(service=service, options=chrome_options)
+        except Exception:
+            if persistent is None:
+                discard_profile_dir(profile_dir)
+                raise
+            # Профиль мог быть испорчен: повторяем запуск с чистым слотом
+            persistent.wipe(profile_dir, "browser failed to start")
+            os.makedirs(profile_dir, exist_ok=True)
+            try:
+                driver = webdriver.Chrome(service=service, options=chrome_options)
+            except Exception:
+                discard_profile_dir(profile_dir)
+                raise
+        driver.profile_dir = profile_dir
+    else:
+        # Проверяем наличие локальных драйверов
+        driver_path = None
+        possible_paths = [
+            'geckodriver.exe',
+            'drivers/geckodriver.exe',
+            './geckodriver.exe',
+            './drivers/geckodriver.exe'
+        ]
+
+        for path in possible_paths:
+            if os.path.exists(path):
+                driver_path = path
+                break
+
+        from selenium.webdriver.firefox.service import Service as FirefoxService
+        from selenium.webdriver.firefox.options import Options as FirefoxOptions
+
+        # Настраиваем опции Firefox
+        firefox_options = FirefoxOptions()
+        firefox_options.add_argument("--headless")
+        firefox_options.add_argument("--disable-gpu")
+        firefox_options.add_argument("--no-sandbox")
+
+        # Отключаем загрузку изображений для ускорения
+        firefox_options.set_preference("permissions.default.image", 2)
+        firefox_options.set_preference("dom.ipc.plugins.enabled.libflashplayer.so", False)
+
+        # Маскируем автоматизацию
+        firefox_options.set_preference("dom.webdriver.enabled", False)
+        firefox_options.set_preference("useAutomationExtension", False)
+
+        # Устанавливаем User-Agent
+        firefox_options.set_preference("general.useragent.override",
+                                       "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
+
+        if driver_path:
+            logger.info(f"Using local driver at {driver_path}")
+            service = FirefoxService(executable_path=driver_path)
+            driver = webdriver.Firefox(service=service, options=firefox_options)
+        else:
+            logger.info("No local driver found, downloading one time")
+            from webdriver_manager.firefox import GeckoDriverManager
+            service = FirefoxService(GeckoDriverManager(version="v0.33.0").install())
+            driver = webdriver.Firefox(service=service, options=firefox_options)
+
+    try:
+        if ENVIRONMENT == 'production' and CHROME_OPTIONS.get('block_resources'):
+            block_resources(driver, CHROME_OPTIONS['blocked_urls'])
+
+        # Настраиваем таймауты
+        driver.set_page_load_timeout(30)
+        driver.set_script_timeout(30)
+
+        # Устанавливаем размер окна
+        driver.set_window_size(1920, 1080)
+    except Exception:
+        # Браузер уже запущен: закрываем его и освобождаем профиль, как при ошибке запуска
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting driver after failed setup: {e}")
+        discard_profile_dir(getattr(driver, 'profile_dir', None))
+        raise
+
+    return driver
+
+
+def block_resources(driver, blocked_urls):
+    """
+    Запрещает браузеру загружать ресурсы по шаблонам URL на сетевом уровне (CDP).
+    Network.setBlockedURLs не поддерживает исключений: чтобы загрузить ресурс,
+    нужно убрать шаблон, под который он попадает
+
+    Args:
+        driver: Chrome WebDriver
+        blocked_urls (list): Шаблоны URL с '*', которые не загружаются
+
+    Returns:
+        list: Примененные шаблоны блокировки
+    """
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': blocked_urls})
+    logger.info(f"Blocking {len(blocked_urls)} URL patterns")
+    return blocked_urls
+
+
+class PooledDriver:
+    """Сессия браузера, выданная пулом, со счетчиками для утилизации"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.created_at = time.monotonic()
+        self.requests = 0
+        # Процесс chromedriver/geckodriver и временный профиль сессии
+        service = getattr(driver, 'service', None)
+        process = getattr(service, 'process', None)
+        self.pid = getattr(process, 'pid', None)
+        self.profile_dir = getattr(driver, 'profile_dir', None)
+        # Причина внеочередной утилизации (например, превышен бюджет памяти)
+        self.recycle_reason = None
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+
+class DriverPool:
+    def __init__(self, factory=create_driver, size=1, max_age=1800, max_requests=100):
+        """
+        Пул "теплых" сессий браузера, которые переиспользуются между скрапами
+
+        Args:
+            factory (callable): Функция, создающая новый WebDriver
+            size (int): Максимальное количество одновременно живых сессий
+            max_age (int): Возраст сессии в секундах, после которого она пересоздается
+            max_requests (int): Количество скрапов, после которого сессия пересоздается
+        """
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_age = max_age
+        self.max_requests = max_requests
+
+        self._idle = []
+        self._sessions = set()
+        self._total = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        # Вызывается после quit() с процессами сессии и ее профилем (см. ResourceGovernor)
+        self.on_destroy = None
+
+        # Счетчики для диагностики
+        self.created_count = 0
+        self.recycled_count = 0
+
+    def _create(self):
+        started = time.monotonic()
+        driver = self.factory()
+        self.created_count += 1
+        elapsed = time.monotonic() - started
+        observe_stage('driver_init', elapsed)
+        logger.info(f"Driver session created in {elapsed:.2f}s")
+        pooled = PooledDriver(driver)
+        with self._cond:
+            self._sessions.add(pooled)
+        return pooled
+
+    def _destroy(self, pooled, reason):
+        logger.info(f"Recycling driver session ({reason}, age {pooled.age:.0f}s, "
+                    f"{pooled.requests} requests)")
+        self.recycled_count += 1
+        with self._cond:
+            self._sessions.discard(pooled)
+
+        # Запоминаем процессы до quit(), чтобы добить те, что его переживут
+        processes = process_tree(pooled.pid) if pooled.pid else []
+        # Процессы Chrome, пережившие chromedriver, переходят к боту и собираются reap_zombies
+        track_orphans(processes, pooled.pid)
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting driver: {e}")
+
+        if self.on_destroy is not None:
+            self.on_destroy(processes, pooled.profile_dir)
+        else:
+            reap_zombies()
+            discard_profile_dir(pooled.profile_dir)
+
+    def _is_healthy(self, pooled):
+        try:
+            return pooled.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def _expired_reason(self, pooled):
+        if pooled.recycle_reason:
+            return pooled.recycle_reason
+        if self.max_age and pooled.age >= self.max_age:
+            return "max age reached"
+        if self.max_requests and pooled.requests >= self.max_requests:
+            return "max requests reached"
+        return None
+
+    def acquire(self, timeout=None):
+        """
+        Выдает проверенную сессию из пула, при необходимости создавая новую
+
+        Args:
+            timeout (float): Сколько ждать освобождения сессии (None - без ограничения)
+
+        Returns:
+            PooledDriver: Арендованная сессия
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._cond:
+                while not self._idle and self._total >= self.size:
+                    if self._closed:
+                        raise RuntimeError("Driver pool is closed")
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError("Timed out waiting for a free driver session")
+                    self._cond.wait(remaining)
+
+                if self._closed:
+                    raise RuntimeError("Driver pool is closed")
+
+                pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    # Резервируем место под новую сессию
+                    self._total += 1
+
+            if pooled is None:
+                try:
+                    return self._create()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+
+            reason = self._expired_reason(pooled)
+            if reason is None and not self._is_healthy(pooled):
+                reason = "health check failed"
+            if reason is None:
+                return pooled
+
+            self._destroy(pooled, reason)
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+
+    def release(self, pooled, failed=False):
+        """
+        Возвращает сессию в пул
+
+        Args:
+            pooled (PooledDriver): Сессия, полученная через acquire
+            failed (bool): Скрап завершился ошибкой - сессию нужно проверить
+        """
+        pooled.requests += 1
+
+        reason = self._expired_reason(pooled)
+        if reason is None and failed and not self._is_healthy(pooled):
+            reason = "crashed"
+        if reason is None and self._closed:
+            reason = "pool closed"
+
+        if reason is not None:
+            self._destroy(pooled, reason)
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            return
+
+        with self._cond:
+            self._idle.append(pooled)
+            self._cond.notify()
+
+    def warm_up(self):
+        """Заранее создает все сессии пула, чтобы первый скрап не платил за холодный старт"""
+        sessions = []
+        try:
+            for _ in range(self.size):
+                sessions.append(self.acquire(timeout=0))
+        except TimeoutError:
+            pass
+        except Exception as e:
+            logger.error(f"Error warming up driver pool: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            for pooled in sessions:
+                # Прогрев не считается запросом
+                pooled.requests -= 1
+                self.release(pooled)
+
+    def close(self):
+        """Закрывает все простаивающие сессии; занятые будут закрыты при возврате"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+            self._cond.notify_all()
+        for pooled in idle:
+            self._destroy(pooled, "pool closed")
+
+    def sessions(self):
+        """Все живые сессии пула, включая выданные"""
+        with self._cond:
+            return list(self._sessions)
+
+    def recycle_marked(self):
+        """Утилизирует простаивающие сессии, помеченные на внеочередную утилизацию"""
+        with self._cond:
+            marked = [pooled for pooled in self._idle if pooled.recycle_reason]
+            if not marked:
+                return 0
+            self._idle = [pooled for pooled in self._idle if not pooled.recycle_reason]
+            self._total -= len(marked)
+            self._cond.notify_all()
+        for pooled in marked:
+            self._destroy(pooled, pooled.recycle_reason)
+        return len(marked)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self.size,
+                'alive': self._total,
+                'idle': len(self._idle),
+                'created': self.created_count,
+                'recycled': self.recycled_count,
+            }
+
+
+# Глобальный пул драйверов
+_driver_pool = None
+_driver_pool_lock = threading.Lock()
+
+
+def get_driver_pool():
+    """Возвращает общий пул драйверов, создавая его по настройкам из config при первом вызове"""
+    global _driver_pool
+
+    with _driver_pool_lock:
+        if _driver_pool is None:
+            from config import DRIVER_POOL_SIZE, DRIVER_MAX_AGE, DRIVER_MAX_REQUESTS
+            _driver_pool = DriverPool(
+                size=DRIVER_POOL_SIZE,
+                max_age=DRIVER_MAX_AGE,
+                max_requests=DRIVER_MAX_REQUESTS
+            )
+        return _driver_pool
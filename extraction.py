@@ -0,0 +1,507 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# Разбор одной строки таблицы. Возвращает компактный массив
+# [team1, team2, time, odds1, odds2, [[handicap, odd], ...]] или null,
+# если строка не является матчем (те же правила, что и при разборе через Selenium)
+ROW_EXTRACT_JS = r"""
+function extractRow(row) {
+    var text = row.innerText || '';
+    if (text.indexOf('(Match)') === -1) {
+        return null;
+    }
+
+    var teams = row.getElementsByClassName('event-row-participant');
+    if (teams.length !== 2) {
+        return null;
+    }
+
+    var timeElements = row.getElementsByClassName('styleMatchupDate');
+    var matchTime = timeElements.length ? timeElements[0].innerText : '';
+
+    var odds = row.getElementsByClassName('stylePrice');
+    if (odds.length < 2) {
+        return null;
+    }
+
+    // Найдем все спаны с текстом -1.5 или +1.5
+    var pairs = [];
+    var handicapSpans = Array.from(row.querySelectorAll('span')).filter(
+        span => span.textContent === "-1.5" || span.textContent === "+1.5"
+    );
+
+    // Для каждого гандикапа ищем ближайший коэффициент
+    for (var i = 0; i < handicapSpans.length; i++) {
+        var handicapSpan = handicapSpans[i];
+        var handicapValue = handicapSpan.textContent;
+        var parent = handicapSpan.parentElement;
+
+        var oddSpan = parent.querySelector('span.stylePrice') ||
+                    Array.from(parent.parentElement.querySelectorAll('span'))
+                    .find(span => {
+                        var text = span.textContent;
+                        return text.match(/^\d+\.\d+$/) && text !== handicapValue;
+                    });
+
+        // Если не нашли в родителе, ищем в соседних элементах
+        if (!oddSpan) {
+            var siblings = Array.from(parent.parentElement.children);
+            var currentIndex = siblings.indexOf(parent);
+
+            for (var j = currentIndex + 1; j < siblings.length; j++) {
+                var spanInSibling = siblings[j].querySelector('span');
+                if (spanInSibling && spanInSibling.textContent.match(/^\d+\.\d+$/)) {
+                    oddSpan = spanInSibling;
+                    break;
+                }
+            }
+        }
+
+        if (oddSpan) {
+            pairs.push([handicapValue, oddSpan.textContent]);
+        }
+    }
+
+    return [teams[0].innerText, teams[1].innerText, matchTime, odds[0].innerText, odds[1].innerText, pairs];
+}
+"""
+
+# Извлекает все строки страницы за один вызов execute_script
+PAGE_EXTRACT_JS = ROW_EXTRACT_JS + r"""
+var rows = document.getElementsByClassName('styleRowHighlight');
+var result = [];
+for (var i = 0; i < rows.length; i++) {
+    var extracted = extractRow(rows[i]);
+    if (extracted !== null) {
+        result.push(extracted);
+    }
+}
+return JSON.stringify(result);
+"""
+
+# Инкрементальное извлечение. arguments[0] - отпечатки строк с прошлого скрапа
+# {id: fingerprint}; полностью разбираются только новые и изменившиеся строки.
+# Возвращает пустую строку, если ничего не изменилось, иначе
+# JSON [[[id, fingerprint, row], ...], [id удаленных строк]]
+INCREMENTAL_EXTRACT_JS = ROW_EXTRACT_JS + r"""
+var previous = arguments[0] || {};
+var rows = document.getElementsByClassName('styleRowHighlight');
+var changed = [];
+var seen = {};
+var occurrences = {};
+for (var i = 0; i < rows.length; i++) {
+    var row = rows[i];
+    // Тот же текст, что читает extractRow, иначе изменение видимости оставит старые цены
+    var text = row.innerText || '';
+    if (text.indexOf('(Match)') === -1) {
+        continue;
+    }
+    var teams = row.getElementsByClassName('event-row-participant');
+    if (teams.length !== 2) {
+        continue;
+    }
+
+    // Строки с одинаковыми командами различаются номером повтора на странице
+    var id = teams[0].textContent + '|' + teams[1].textContent;
+    var occurrence = occurrences[id] || 0;
+    occurrences[id] = occurrence + 1;
+    if (occurrence) {
+        id += '\u0001' + occurrence;
+    }
+
+    // Отпечаток строки: хэш всего текста (команды, время, цены, форы)
+    var hash = 0;
+    for (var j = 0; j < text.length; j++) {
+        hash = (hash * 31 + text.charCodeAt(j)) | 0;
+    }
+    var fingerprint = hash.toString(36) + ':' + text.length;
+
+    if (previous[id] === fingerprint) {
+        seen[id] = true;
+        continue;
+    }
+    var extracted = extractRow(row);
+    if (extracted === null) {
+        continue;
+    }
+    seen[id] = true;
+    changed.push([id, fingerprint, extracted]);
+}
+
+var removed = Object.keys(previous).filter(function(id) { return !seen[id]; });
+if (!changed.length && !removed.length) {
+    return '';
+}
+return JSON.stringify([changed, removed]);
+"""
+
+# Снимок состояния таблицы для детектора готовности: количество строк,
+# количество цен и хэш текста всех цен
+READY_PROBE_JS = r"""
+var rows = document.getElementsByClassName('styleRowHighlight');
+var prices = document.getElementsByClassName('stylePrice');
+var hash = 0;
+for (var i = 0; i < prices.length; i++) {
+    var text = prices[i].textContent;
+    for (var j = 0; j < text.length; j++) {
+        hash = (hash * 31 + text.charCodeAt(j)) | 0;
+    }
+    hash = (hash * 31 + 124) | 0;
+}
+return [rows.length, prices.length, hash];
+"""
+
+
+class TableReadiness:
+    """
+    Решает по последовательным замерам READY_PROBE_JS, готова ли таблица.
+    Общая логика для синхронного (Selenium) и асинхронного (CDP) ожидания.
+    """
+
+    def __init__(self, timeout=20, quiet_window=1.0):
+        self.timeout = timeout
+        self.quiet_window = quiet_window
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+
+        self._last_state = None
+        self._state_since = self.started
+        self._last_count = None
+        self._count_since = self.started
+
+    def observe(self, probe, now):
+        """
+        Учитывает очередной замер
+
+        Args:
+            probe (list): [rows, prices, hash] из READY_PROBE_JS
+            now (float): Время замера (time.monotonic)
+
+        Returns:
+            float: Сколько секунд заняло ожидание, если таблица готова, иначе None
+
+        Raises:
+            TimeoutError: Таблица не отрисовалась за отведенное время
+        """
+        row_count, price_count, price_hash = probe
+        state = (row_count, price_count, price_hash)
+
+        if state != self._last_state:
+            self._last_state = state
+            self._state_since = now
+        if row_count != self._last_count:
+            self._last_count = row_count
+            self._count_since = now
+
+        if row_count > 0 and now - self._state_since >= self.quiet_window:
+            return now - self.started
+
+        if now >= self.deadline:
+            if row_count > 0 and now - self._count_since >= self.quiet_window:
+                logger.warning(f"Odds table rows are stable but prices keep changing after {self.timeout}s, parsing anyway")
+                return now - self.started
+            raise TimeoutError(f"Odds table was not ready after {self.timeout}s ({row_count} rows)")
+
+        return None
+
+    def sleep_time(self, now, poll_interval):
+        return min(poll_interval, max(self.deadline - now, 0))
+
+
+def wait_for_odds_table(driver, timeout=20, quiet_window=1.0, poll_interval=0.25):
+    """
+    Ждет, пока таблица коэффициентов отрисуется и перестанет меняться
+
+    Таблица считается готовой, когда строки найдены, а их количество и цены
+    не менялись в течение quiet_window секунд. Если к таймауту цены все еще
+    двигаются, но количество строк стабильно (живая линия), таблица тоже
+    считается готовой.
+
+    Args:
+        driver: WebDriver с загруженной страницей
+        timeout (float): Максимальное время ожидания в секундах
+        quiet_window (float): Сколько секунд таблица должна оставаться неизменной
+        poll_interval (float): Интервал опроса страницы
+
+    Returns:
+        float: Сколько секунд заняло ожидание
+
+    Raises:
+        TimeoutError: Таблица не отрисовалась за отведенное время
+    """
+    readiness = TableReadiness(timeout, quiet_window)
+    while True:
+        now = time.monotonic()
+        waited = readiness.observe(driver.execute_script(READY_PROBE_JS), now)
+        if waited is not None:
+            return waited
+        time.sleep(readiness.sleep_time(now, poll_interval))
+
+
+async def wait_for_odds_table_async(evaluate, timeout=20, quiet_window=1.0, poll_interval=0.25):
+    """
+    То же, что wait_for_odds_table, для асинхронного клиента
+
+    Args:
+        evaluate (callable): Корутина evaluate(script), выполняющая скрипт на странице
+    """
+    readiness = TableReadiness(timeout, quiet_window)
+    while True:
+        now = time.monotonic()
+        waited = readiness.observe(await evaluate(READY_PROBE_JS), now)
+        if waited is not None:
+            return waited
+        await asyncio.sleep(readiness.sleep_time(now, poll_interval))
+
+
+def build_match(row):
+    """
+    Преобразует строку, полученную из ROW_EXTRACT_JS, в словарь match_data
+
+    Args:
+        row (list): [team1, team2, time, odds1, odds2, pairs]
+
+    Returns:
+        tuple: (match_key, match_data)
+    """
+    raw_team1, raw_team2, raw_time, raw_odds1, raw_odds2, pairs = row
+
+    team1 = raw_team1.replace("(Match)", "").strip()
+    team2 = raw_team2.replace("(Match)", "").strip()
+    odds1 = float(raw_odds1.strip())
+    odds2 = float(raw_odds2.strip())
+
+    match_data = {
+        'team1': team1,
+        'team2': team2,
+        'time': raw_time.strip(),
+        'odds1': odds1,
+        'odds2': odds2
+    }
+
+    # Определяем, какой гандикап для какой команды
+    minus_handicap = None
+    plus_handicap = None
+    for handicap, odd in pairs:
+        if handicap == '-1.5':
+            minus_handicap = (handicap, odd)
+        elif handicap == '+1.5':
+            plus_handicap = (handicap, odd)
+
+    # Обычно -1.5 для фаворита (команда с меньшим коэффициентом)
+    if minus_handicap and plus_handicap:
+        if odds1 <= odds2:  # Первая команда фаворит
+            first, second = minus_handicap, plus_handicap
+        else:  # Вторая команда фаворит
+            first, second = plus_handicap, minus_handicap
+        match_data['handicap1'] = first[0]
+        match_data['handicap_odd1'] = float(first[1])
+        match_data['handicap2'] = second[0]
+        match_data['handicap_odd2'] = float(second[1])
+
+    return f"{team1} vs {team2}", match_data
+
+
+def parse_rows(rows):
+    """
+    Собирает словарь матчей из массива строк, возвращенного PAGE_EXTRACT_JS
+
+    Args:
+        rows (list | str): Массив строк или его JSON-представление
+
+    Returns:
+        dict: Матчи в формате {"team1 vs team2": match_data}
+    """
+    if isinstance(rows, str):
+        rows = json.loads(rows)
+
+    matches = {}
+    for row in rows:
+        try:
+            match_key, match_data = build_match(row)
+        except Exception as e:
+            logger.error(f"Error processing match row {row}: {e}")
+            continue
+        matches[match_key] = match_data
+
+    return matches
+
+
+class IncrementalExtractor:
+    """
+    Хранит отпечатки строк и разобранные матчи прошлого скрапа и на каждом
+    следующем получает со страницы только добавленные, измененные и удаленные строки
+    """
+
+    def __init__(self):
+        self._fingerprints = {}
+        self._rows = {}
+        self._lock = threading.Lock()
+
+        # Счетчики последнего извлечения для диагностики
+        self.last_changed = 0
+        self.last_removed = 0
+
+    @property
+    def fingerprints(self):
+        """Отпечатки строк прошлого скрапа для передачи в INCREMENTAL_EXTRACT_JS"""
+        return self._fingerprints
+
+    def extract(self, driver):
+        """
+        Извлекает матчи со страницы, пропуская строки, которые не изменились
+
+        Returns:
+            dict: Полный словарь матчей {"team1 vs team2": match_data}
+        """
+        with self._lock:
+            raw = driver.execute_script(INCREMENTAL_EXTRACT_JS, self._fingerprints)
+            return self.apply(raw)
+
+    def apply(self, raw):
+        """
+        Применяет ответ INCREMENTAL_EXTRACT_JS к предыдущему снимку
+
+        Args:
+            raw (str): JSON [[[id, fingerprint, row], ...], [removed ids]] или пустая строка
+
+        Returns:
+            dict: Полный словарь матчей после применения изменений
+        """
+        changed, removed = json.loads(raw) if raw else ([], [])
+
+        for row_id in removed:
+            self._fingerprints.pop(row_id, None)
+            self._rows.pop(row_id, None)
+
+        for row_id, fingerprint, row in changed:
+            try:
+                self._rows[row_id] = build_match(row)
+            except Exception as e:
+                logger.error(f"Error processing match row {row}: {e}")
+                self._fingerprints.pop(row_id, None)
+                self._rows.pop(row_id, None)
+                continue
+            self._fingerprints[row_id] = fingerprint
+
+        self.last_changed = len(changed)
+        self.last_removed = len(removed)
+        if raw:
+            logger.info(f"Incremental extraction: {len(changed)} rows changed, {len(removed)} removed, "
+                        f"{len(self._rows) - len(changed)} unchanged")
+        else:
+            logger.info(f"Incremental extraction: no changes in {len(self._rows)} rows")
+
+        return self._matches()
+
+    def _matches(self):
+        """
+        Словарь матчей из разобранных строк. Если на странице есть строки
+        с одинаковыми командами, побеждает последняя, как в parse_rows
+        """
+        matches = dict(self._rows.values())
+        if len(matches) == len(self._rows):
+            return matches
+
+        # Номер повтора в id растет вместе с позицией строки на странице
+        occurrences = {}
+        for row_id, (match_key, match_data) in self._rows.items():
+            occurrence = int(row_id.rpartition('\x01')[2]) if '\x01' in row_id else 0
+            if occurrence >= occurrences.get(match_key, -1):
+                occurrences[match_key] = occurrence
+                matches[match_key] = match_data
+        return matches
+
+    def reset(self):
+        """Забывает прошлый снимок: следующее извлечение разберет все строки"""
+        with self._lock:
+            self._fingerprints = {}
+            self._rows = {}
+
+
+def american_to_decimal(price):
+    """Переводит американский коэффициент из JSON-фида Pinnacle в десятичный"""
+    if price > 0:
+        return round(1 + price / 100, 3)
+    return round(1 + 100 / abs(price), 3)
+
+
+def build_matches_from_feed(matchups, markets, utc_offset=1):
+    """
+    Собирает словарь матчей из JSON-фида, который загружает страница Pinnacle
+
+    Берутся только матчапы уровня всего матча (участники с пометкой "(Match)"),
+    как и при разборе страницы. Коэффициенты берутся из рынков moneyline и
+    spread +-1.5 полного матча (period 0).
+
+    Args:
+        matchups (list): Ответ эндпоинта matchups
+        markets (list): Ответ эндпоинта markets/straight
+        utc_offset (int): Смещение часового пояса для отображения времени матча
+
+    Returns:
+        dict: Матчи в формате {"team1 vs team2": match_data}
+    """
+    display_tz = timezone(timedelta(hours=utc_offset))
+
+    markets_by_matchup = {}
+    for market in markets:
+        if market.get('period') != 0 or market.get('isAlternate'):
+            continue
+        markets_by_matchup.setdefault(market.get('matchupId'), []).append(market)
+
+    matches = {}
+    for matchup in matchups:
+        try:
+            participants = {p.get('alignment'): p for p in matchup.get('participants', [])}
+            home = participants.get('home')
+            away = participants.get('away')
+            if not home or not away:
+                continue
+            if "(Match)" not in home.get('name', '') and "(Match)" not in away.get('name', ''):
+                continue
+
+            team1 = home['name'].replace("(Match)", "").strip()
+            team2 = away['name'].replace("(Match)", "").strip()
+
+            match_time = ""
+            if matchup.get('startTime'):
+                start = datetime.fromisoformat(matchup['startTime'].replace('Z', '+00:00'))
+                match_time = start.astimezone(display_tz).strftime("%H:%M")
+
+            match_data = {
+                'team1': team1,
+                'team2': team2,
+                'time': match_time,
+                'matchup_id': matchup.get('id')
+            }
+
+            for market in markets_by_matchup.get(matchup.get('id'), []):
+                prices = {p.get('designation'): p for p in market.get('prices', [])}
+                if 'home' not in prices or 'away' not in prices:
+                    continue
+
+                if market.get('type') == 'moneyline':
+                    match_data['odds1'] = american_to_decimal(prices['home']['price'])
+                    match_data['odds2'] = american_to_decimal(prices['away']['price'])
+                elif market.get('type') == 'spread' and abs(prices['home'].get('points', 0)) == 1.5:
+                    match_data['handicap1'] = f"{prices['home']['points']:+.1f}"
+                    match_data['handicap_odd1'] = american_to_decimal(prices['home']['price'])
+                    match_data['handicap2'] = f"{prices['away']['points']:+.1f}"
+                    match_data['handicap_odd2'] = american_to_decimal(prices['away']['price'])
+
+            if 'odds1' not in match_data:
+                continue
+
+            matches[f"{team1} vs {team2}"] = match_data
+        except Exception as e:
+            logger.error(f"Error processing matchup {matchup.get('id')}: {e}")
+            continue
+
+    return matches
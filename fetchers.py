@@ -0,0 +1,719 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+import threading
+import traceback
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
+
+from driver_pool import get_driver_pool
+from metrics import observe_stage, stage_timer
+from extraction import (PAGE_EXTRACT_JS, INCREMENTAL_EXTRACT_JS, IncrementalExtractor, parse_rows,
+                        wait_for_odds_table, wait_for_odds_table_async, build_matches_from_feed)
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeCancelled(Exception):
+    """Скрап прерван, потому что вызывающий код перестал ждать результат"""
+
+
+def _check_cancelled(cancelled):
+    if cancelled is not None and cancelled.is_set():
+        raise ScrapeCancelled("Scrape abandoned after the caller timed out")
+
+
+class OddsFetcher:
+    """
+    Стратегия получения коэффициентов с одной страницы букмекера.
+    Метод scrape возвращает словарь {"team1 vs team2": match_data}
+    и при ошибке бросает исключение, fetch при ошибке возвращает пустой словарь.
+    """
+    backend = None
+
+    def __init__(self, source, url):
+        self.source = source
+        self.url = url
+
+    def scrape(self, cancelled=None):
+        """
+        Args:
+            cancelled (threading.Event): Установлен, если результат больше не ждут
+        """
+        raise NotImplementedError
+
+    def fetch(self):
+        try:
+            return self.scrape()
+        except Exception as e:
+            logger.error(f"Error getting data: {e}")
+            logger.error(traceback.format_exc())
+            return {}
+
+    async def fetch_async(self):
+        """
+        Выполняет блокирующий скрап в отдельном потоке скрапера, не блокируя
+        event loop бота. Ошибки пробрасываются вызывающему. Если ожидание
+        отменено (например, по таймауту), скрап прерывается на ближайшем
+        этапе и возвращает браузер в пул
+        """
+        loop = asyncio.get_running_loop()
+        cancelled = threading.Event()
+        try:
+            return await loop.run_in_executor(get_scrape_executor(), self.scrape, cancelled)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    def close(self):
+        pass
+
+
+class SeleniumFetcher(OddsFetcher):
+    """Разбор отрисованной страницы через браузер из общего пула"""
+    backend = 'selenium'
+
+    def __init__(self, source, url):
+        super().__init__(source, url)
+        # Сетевая статистика загрузок страницы (по журналу CDP)
+        self.last_load_stats = None
+        self.load_totals = {}
+        # Отпечатки строк прошлого скрапа для инкрементального извлечения
+        self.extractor = IncrementalExtractor()
+
+    def scrape(self, cancelled=None):
+        from config import DRIVER_ACQUIRE_TIMEOUT
+
+        failed = False
+        pool = get_driver_pool()
+        lease = pool.acquire(timeout=DRIVER_ACQUIRE_TIMEOUT)
+        try:
+            logger.info("Driver initialized")
+            return self._scrape(lease.driver, cancelled)
+        except ScrapeCancelled:
+            # Прерывание между этапами: браузер в порядке и возвращается в пул как есть
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            pool.release(lease, failed=failed)
+
+    def _scrape(self, driver, cancelled=None):
+        from config import (READY_TIMEOUT, READY_QUIET_WINDOW, READY_POLL_INTERVAL,
+                            CDP_CAPTURE_TIMEOUT, CHROME_OPTIONS)
+
+        # Сбрасываем сетевые события, накопленные сессией до этого скрапа
+        network_log = self._read_performance_log(driver) is not None
+        events = []
+
+        _check_cancelled(cancelled)
+        logger.info(f"Getting URL: {self.url}")
+        with stage_timer('navigation'):
+            driver.get(self.url)
+        logger.info("URL loaded")
+        _check_cancelled(cancelled)
+
+        try:
+            # Сначала пробуем взять коэффициенты из JSON, который загрузила сама страница
+            if network_log and CHROME_OPTIONS.get('capture_feed'):
+                with stage_timer('extraction'):
+                    try:
+                        matches = self._capture_feed(driver, CDP_CAPTURE_TIMEOUT, events)
+                    except Exception as e:
+                        # Фид - только быстрый путь, при любой его ошибке разбираем страницу
+                        logger.warning(f"Feed capture failed: {e}")
+                        matches = {}
+                if matches:
+                    logger.info(f"Captured {len(matches)} matches from page feed")
+                    return matches
+                logger.info("No feed payload captured, falling back to DOM parsing")
+
+            # Устанавливаем масштаб страницы для отображения большего количества столбцов
+            driver.execute_script("document.body.style.zoom = '70%'")
+
+            # Ждем, пока таблица отрисуется и перестанет меняться
+            waited = wait_for_odds_table(
+                driver,
+                timeout=READY_TIMEOUT,
+                quiet_window=READY_QUIET_WINDOW,
+                poll_interval=READY_POLL_INTERVAL
+            )
+            observe_stage('readiness_wait', waited)
+            logger.info(f"Odds table ready after {waited:.2f}s, starting parsing...")
+            _check_cancelled(cancelled)
+
+            with stage_timer('extraction'):
+                if CHROME_OPTIONS.get('incremental_extract', True):
+                    # Со страницы приходят только строки, изменившиеся с прошлого скрапа
+                    matches = self.extractor.extract(driver)
+                else:
+                    # Извлекаем все матчи страницы одним вызовом скрипта
+                    extracted = driver.execute_script(PAGE_EXTRACT_JS)
+                    matches = parse_rows(extracted)
+            logger.info(f"Extracted {len(matches)} matches")
+            return matches
+        finally:
+            if network_log:
+                self._report_page_load(driver, events)
+
+    @staticmethod
+    def _read_performance_log(driver):
+        """Читает журнал сетевых событий CDP; None, если журнал не включен"""
+        try:
+            return driver.get_log('performance')
+        except Exception:
+            return None
+
+    def _collect_network_events(self, driver, events):
+        """
+        Дочитывает журнал CDP и добавляет события (method, params) в events
+
+        Returns:
+            list: Только что прочитанные события
+        """
+        new_events = []
+        for entry in self._read_performance_log(driver) or []:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, ValueError):
+                continue
+            new_events.append((message.get('method'), message.get('params', {})))
+        events.extend(new_events)
+        return new_events
+
+    def _report_page_load(self, driver, events):
+        """
+        Считает по сетевым событиям загрузки страницы количество запросов,
+        переданные байты и запросы, отсеченные политикой блокировки ресурсов.
+        Размер заблокированных ответов неизвестен (запрос не выполнялся), поэтому
+        сэкономленные байты не считаются: только число заблокированных запросов
+        """
+        self._collect_network_events(driver, events)
+
+        urls = {}
+        transferred = 0
+        blocked_by_type = {}
+
+        for method, params in events:
+            if method == 'Network.requestWillBeSent':
+                urls[params.get('requestId')] = params.get('request', {}).get('url', '')
+            elif method == 'Network.loadingFinished':
+                transferred += params.get('encodedDataLength', 0)
+            elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+                resource_type = params.get('type', 'Other')
+                blocked_by_type[resource_type] = blocked_by_type.get(resource_type, 0) + 1
+
+        blocked = sum(blocked_by_type.values())
+        stats = {
+            'requests': len(urls),
+            'bytes_transferred': transferred,
+            'requests_blocked': blocked,
+            'blocked_by_type': blocked_by_type,
+        }
+        self.last_load_stats = stats
+        for key in ('requests', 'bytes_transferred', 'requests_blocked'):
+            self.load_totals[key] = self.load_totals.get(key, 0) + stats[key]
+        self.load_totals['page_loads'] = self.load_totals.get('page_loads', 0) + 1
+
+        logger.info(f"Page load: {len(urls)} requests, {transferred / 1024:.0f} KB transferred, "
+                    f"{blocked} requests blocked {blocked_by_type} (size of blocked responses unknown)")
+
+    @staticmethod
+    def _feed_kind(url):
+        path = url.split('?', 1)[0]
+        if path.endswith('/matchups'):
+            return 'matchups'
+        if path.endswith('/markets/straight'):
+            return 'markets'
+        return None
+
+    def _capture_feed(self, driver, timeout, events):
+        """
+        Ждет, пока страница загрузит matchups и markets/straight, и
+        собирает матчи из тел этих ответов. Обрезанные и не-JSON тела
+        пропускаются
+
+        Returns:
+            dict: Матчи или пустой словарь, если фид не был пойман
+        """
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+        from config import PINNACLE_LEAGUE_FILTER, DISPLAY_UTC_OFFSET, READY_POLL_INTERVAL
+
+        responses = {}
+        finished = {'matchups': [], 'markets': []}
+
+        def feed_loaded(driver):
+            for method, params in self._collect_network_events(driver, events):
+                if method == 'Network.responseReceived':
+                    response = params.get('response', {})
+                    kind = self._feed_kind(response.get('url', ''))
+                    if kind and response.get('status') == 200:
+                        responses[params.get('requestId')] = kind
+                elif method == 'Network.loadingFinished' and params.get('requestId') in responses:
+                    finished[responses[params['requestId']]].append(params['requestId'])
+            return bool(finished['matchups'] and finished['markets'])
+
+        # Журнал дочитывается до появления обоих ответов или до истечения таймаута
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=READY_POLL_INTERVAL).until(feed_loaded)
+        except TimeoutException:
+            return {}
+
+        payload = {'matchups': {}, 'markets': []}
+        for kind, request_ids in finished.items():
+            for request_id in request_ids:
+                try:
+                    body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+                except Exception as e:
+                    logger.warning(f"Could not read feed response body: {e}")
+                    continue
+                try:
+                    text = body.get('body', '')
+                    if body.get('base64Encoded'):
+                        text = base64.b64decode(text).decode('utf-8')
+                    data = json.loads(text)
+                    if not isinstance(data, list):
+                        raise ValueError(f"expected a list, got {type(data).__name__}")
+                except ValueError as e:
+                    # binascii.Error, UnicodeDecodeError и JSONDecodeError - подклассы ValueError
+                    logger.warning(f"Skipping malformed {kind} feed response: {e}")
+                    continue
+                if kind == 'matchups':
+                    # Более поздние ответы перекрывают ранние
+                    payload['matchups'].update({m.get('id'): m for m in data})
+                else:
+                    payload['markets'].extend(data)
+
+        matchups = list(payload['matchups'].values())
+        if PINNACLE_LEAGUE_FILTER:
+            matchups = [m for m in matchups
+                        if PINNACLE_LEAGUE_FILTER in (m.get('league') or {}).get('name', '')]
+
+        return build_matches_from_feed(matchups, payload['markets'], DISPLAY_UTC_OFFSET)
+
+
+def _wait_future(future, timeout):
+    """Ждет результат корутины из BackgroundLoop; по таймауту отменяет ее"""
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+class BackgroundLoop:
+    """
+    Собственный event loop в отдельном потоке. Позволяет асинхронным
+    клиентам держать пул соединений между вызовами, независимо от того,
+    из какого потока и loop их вызывают.
+    """
+
+    def __init__(self, name):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def run(self, coro, timeout=None):
+        """Выполняет корутину в фоновом loop и синхронно ждет результат"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class HttpFetcher(OddsFetcher):
+    """
+    Получение коэффициентов напрямую из JSON-фида, который потребляет
+    страница Pinnacle, без браузера. Для тестов api_url можно направить
+    на локальный сервер с записанными ответами (см. PINNACLE_RECORD_DIR).
+    """
+    backend = 'http'
+
+    def __init__(self, source, url, api_url, api_key=None, sport_id=12,
+                 league_filter='Dota 2', utc_offset=1, timeout=15, record_dir=None):
+        super().__init__(source, url)
+        self.api_url = api_url.rstrip('/')
+        self.api_key = api_key
+        self.sport_id = sport_id
+        self.league_filter = league_filter
+        self.utc_offset = utc_offset
+        self.timeout = timeout
+        self.record_dir = record_dir
+
+        self._loop = None
+        self._session = None
+
+    async def _get_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            headers = {
+                'Accept': 'application/json',
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+                'Referer': self.url,
+            }
+            if self.api_key:
+                headers['X-API-Key'] = self.api_key
+            self._session = aiohttp.ClientSession(
+                headers=headers,
+                connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def _get_json(self, path, params=None):
+        session = await self._get_session()
+        async with session.get(f"{self.api_url}/{path}", params=params) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        if self.record_dir:
+            # Сохраняем ответ в структуре, которую может раздавать python -m http.server
+            record_path = os.path.join(self.record_dir, *path.split('/'))
+            os.makedirs(os.path.dirname(record_path), exist_ok=True)
+            with open(record_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+
+        return data
+
+    async def _fetch_feed(self):
+        # Запрос фида - аналог загрузки страницы у браузерных стратегий
+        with stage_timer('navigation'):
+            matchups, markets = await asyncio.gather(
+                self._get_json(f"sports/{self.sport_id}/matchups", {'withSpecials': 'false'}),
+                self._get_json(f"sports/{self.sport_id}/markets/straight", {'primaryOnly': 'false', 'withSpecials': 'false'})
+            )
+
+        with stage_timer('extraction'):
+            if self.league_filter:
+                matchups = [m for m in matchups
+                            if self.league_filter in (m.get('league') or {}).get('name', '')]
+
+            return build_matches_from_feed(matchups, markets, self.utc_offset)
+
+    def _submit(self):
+        if self._loop is None:
+            self._loop = BackgroundLoop(f"http-fetcher-{self.source}")
+        return asyncio.run_coroutine_threadsafe(self._fetch_feed(), self._loop.loop)
+
+    def scrape(self, cancelled=None):
+        matches = _wait_future(self._submit(), self.timeout * 2)
+        logger.info(f"Fetched {len(matches)} matches from {self.api_url}")
+        return matches
+
+    async def fetch_async(self):
+        # Запрос выполняется в собственном loop клиента, здесь только ждем результат;
+        # отмена ожидания отменяет и сам запрос
+        matches = await asyncio.wait_for(asyncio.wrap_future(self._submit()), self.timeout * 2)
+        logger.info(f"Fetched {len(matches)} matches from {self.api_url}")
+        return matches
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self._session is not None:
+            try:
+                self._loop.run(self._session.close(), timeout=5)
+            except Exception as e:
+                logger.warning(f"Error closing HTTP session: {e}")
+        self._loop.stop()
+        self._loop = None
+        self._session = None
+
+
+class CdpFetcher(OddsFetcher):
+    """
+    Разбор отрисованной страницы в headless Chromium, которым бот управляет
+    напрямую по протоколу DevTools, без chromedriver. Использует те же скрипты
+    извлечения, что и SeleniumFetcher, но только их: перехвата JSON-фида
+    страницы (capture_feed) и сетевой статистики загрузок здесь нет.
+    """
+    backend = 'cdp'
+
+    def __init__(self, source, url, binary, arguments=(), timeout=60, max_age=1800, max_requests=100):
+        super().__init__(source, url)
+        self.binary = binary
+        self.arguments = list(arguments)
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_requests = max_requests
+
+        self._loop = None
+        self._browser = None
+        self._scrape_lock = None
+        self.extractor = IncrementalExtractor()
+
+    async def _get_page(self):
+        from cdp_client import ChromiumBrowser
+        from config import CHROME_OPTIONS, CHROME_PROFILE_ROOT
+        from resource_governor import process_tree, track_orphans
+
+        browser = self._browser
+        if browser is not None:
+            reason = None
+            if browser.page is None or browser.page.closed or browser.process.poll() is not None:
+                reason = "connection lost"
+            elif self.max_age and browser.age >= self.max_age:
+                reason = "max age reached"
+            elif self.max_requests and browser.requests >= self.max_requests:
+                reason = "max requests reached"
+            if reason is None:
+                # Запоминаем процессы живого браузера: при его падении они перейдут к боту
+                # (become_subreaper) и будут собраны контролером ресурсов
+                track_orphans(process_tree(browser.process.pid), browser.process.pid)
+                return browser.page
+            logger.info(f"Restarting browser ({reason}, age {browser.age:.0f}s, {browser.requests} requests)")
+            await self._close_browser()
+
+        browser = ChromiumBrowser(self.binary, self.arguments, profile_root=CHROME_PROFILE_ROOT)
+        self._browser = browser
+        with stage_timer('driver_init'):
+            page = await browser.start()
+
+        if CHROME_OPTIONS.get('block_resources'):
+            await page.send('Network.enable')
+            await page.send('Network.setBlockedURLs', {'urls': CHROME_OPTIONS['blocked_urls']})
+        return page
+
+    async def _close_browser(self):
+        browser, self._browser = self._browser, None
+        if browser is not None:
+            await browser.close()
+
+    async def _scrape(self):
+        from config import READY_TIMEOUT, READY_QUIET_WINDOW, READY_POLL_INTERVAL, CHROME_OPTIONS
+
+        if self._scrape_lock is None:
+            self._scrape_lock = asyncio.Lock()
+
+        async with self._scrape_lock:
+            try:
+                page = await self._get_page()
+                self._browser.requests += 1
+
+                logger.info(f"Getting URL: {self.url}")
+                with stage_timer('navigation'):
+                    await page.navigate(self.url)
+                logger.info("URL loaded")
+
+                # Устанавливаем масштаб страницы для отображения большего количества столбцов
+                await page.evaluate("document.body.style.zoom = '70%'")
+
+                waited = await wait_for_odds_table_async(
+                    page.evaluate,
+                    timeout=READY_TIMEOUT,
+                    quiet_window=READY_QUIET_WINDOW,
+                    poll_interval=READY_POLL_INTERVAL
+                )
+                observe_stage('readiness_wait', waited)
+                logger.info(f"Odds table ready after {waited:.2f}s, starting parsing...")
+
+                with stage_timer('extraction'):
+                    if CHROME_OPTIONS.get('incremental_extract', True):
+                        raw = await page.evaluate(INCREMENTAL_EXTRACT_JS, self.extractor.fingerprints)
+                        matches = self.extractor.apply(raw)
+                    else:
+                        matches = parse_rows(await page.evaluate(PAGE_EXTRACT_JS))
+                logger.info(f"Extracted {len(matches)} matches")
+                return matches
+            except (Exception, asyncio.CancelledError):
+                # После ошибки или отмены посреди загрузки браузер перезапускается при следующем скрапе
+                await self._close_browser()
+                raise
+
+    def _submit(self):
+        if self._loop is None:
+            self._loop = BackgroundLoop(f"cdp-fetcher-{self.source}")
+        return asyncio.run_coroutine_threadsafe(self._scrape(), self._loop.loop)
+
+    def scrape(self, cancelled=None):
+        return _wait_future(self._submit(), self.timeout)
+
+    async def fetch_async(self):
+        # Браузер управляется из собственного loop клиента, здесь только ждем результат;
+        # отмена ожидания отменяет и скрап
+        return await asyncio.wait_for(asyncio.wrap_future(self._submit()), self.timeout)
+
+    def close(self):
+        if self._loop is None:
+            return
+        try:
+            self._loop.run(self._close_browser(), timeout=15)
+        except Exception as e:
+            logger.warning(f"Error closing browser: {e}")
+        self._loop.stop()
+        self._loop = None
+
+
+class SourceResult:
+    """Итог скрапа одного источника для статистики снимка"""
+
+    def __init__(self, source, matches_count, duration, error=None):
+        self.source = source
+        self.matches_count = matches_count
+        self.duration = duration
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class ScrapeResult(dict):
+    """Объединенный словарь матчей всех источников со статистикой по каждому (sources)"""
+
+    def __init__(self, matches=None, sources=None):
+        super().__init__(matches or {})
+        self.sources = sources or {}
+
+
+async def _fetch_source(source, timeout):
+    started = time.monotonic()
+    try:
+        matches = await asyncio.wait_for(get_fetcher(source).fetch_async(), timeout)
+        error = None if matches else "no matches"
+    except asyncio.TimeoutError:
+        matches = {}
+        error = f"TimeoutError: no result after {time.monotonic() - started:.1f}s"
+    except Exception as e:
+        matches = {}
+        error = f"{type(e).__name__}: {e}"
+        logger.debug(f"Source {source} traceback:\n{traceback.format_exc()}")
+    return matches, SourceResult(source, len(matches), time.monotonic() - started, error)
+
+
+async def fetch_sources_async(sources, timeout=120):
+    """
+    Скрапит несколько источников из BOOKMAKER_URLS одновременно и объединяет
+    результаты в один снимок. Ошибка одного источника не влияет на остальные.
+    Параллельность ограничена пулом потоков скрапера и пулом браузеров.
+
+    Матчи первого (основного) источника сохраняют ключ "team1 vs team2",
+    к ключам остальных источников добавляется имя источника.
+
+    Args:
+        sources (list): Имена источников из BOOKMAKER_URLS
+        timeout (float): Таймаут скрапа одного источника в секундах
+
+    Returns:
+        ScrapeResult: Объединенные матчи и статистика по источникам
+    """
+    results = await asyncio.gather(*(_fetch_source(source, timeout) for source in sources))
+
+    merged = ScrapeResult()
+    for index, (matches, stats) in enumerate(results):
+        merged.sources[stats.source] = stats
+        if stats.ok:
+            logger.info(f"Source {stats.source}: {stats.matches_count} matches in {stats.duration:.2f}s")
+        else:
+            logger.warning(f"Source {stats.source} failed after {stats.duration:.2f}s: {stats.error}")
+
+        for match_key, match_data in matches.items():
+            # Копия: словари матчей может хранить и возвращать повторно IncrementalExtractor
+            merged_key = match_key if index == 0 else f"{match_key} [{stats.source}]"
+            merged[merged_key] = dict(match_data, source=stats.source)
+
+    return merged
+
+
+def scrape_sources():
+    """
+    Источники из BOOKMAKER_URLS, которые скрапятся в общий снимок.
+    Стратегия http читает один и тот же JSON-фид независимо от URL страницы,
+    поэтому с ней скрапится только основной источник: иначе каждый
+    дополнительный источник добавлял бы в снимок копию всей линии
+
+    Returns:
+        list: Имена источников
+    """
+    from config import BOOKMAKER_URLS, FETCH_BACKEND
+
+    sources = list(BOOKMAKER_URLS)
+    if FETCH_BACKEND == 'http' and len(sources) > 1:
+        logger.warning(f"FETCH_BACKEND=http reads a single feed, ignoring extra sources: {sources[1:]}")
+        return sources[:1]
+    return sources
+
+
+def create_fetcher(source='pinnacle'):
+    """
+    Создает стратегию получения коэффициентов для источника из BOOKMAKER_URLS
+    согласно FETCH_BACKEND
+    """
+    from config import (BOOKMAKER_URLS, FETCH_BACKEND, PINNACLE_API_URL, PINNACLE_API_KEY,
+                        PINNACLE_SPORT_ID, PINNACLE_LEAGUE_FILTER, DISPLAY_UTC_OFFSET,
+                        PINNACLE_RECORD_DIR, CHROME_OPTIONS, CDP_CHROME_BINARY, DRIVER_MAX_AGE,
+                        DRIVER_MAX_REQUESTS)
+
+    url = BOOKMAKER_URLS.get(source, "https://www.pin880.com/en/standard/esports/games/dota-2")
+
+    if FETCH_BACKEND == 'http':
+        return HttpFetcher(
+            source, url,
+            api_url=PINNACLE_API_URL,
+            api_key=PINNACLE_API_KEY,
+            sport_id=PINNACLE_SPORT_ID,
+            league_filter=PINNACLE_LEAGUE_FILTER,
+            utc_offset=DISPLAY_UTC_OFFSET,
+            record_dir=PINNACLE_RECORD_DIR
+        )
+    if FETCH_BACKEND == 'cdp':
+        return CdpFetcher(
+            source, url,
+            binary=CDP_CHROME_BINARY,
+            arguments=CHROME_OPTIONS['arguments'],
+            max_age=DRIVER_MAX_AGE,
+            max_requests=DRIVER_MAX_REQUESTS
+        )
+    if FETCH_BACKEND != 'selenium':
+        logger.warning(f"Unknown FETCH_BACKEND '{FETCH_BACKEND}', falling back to selenium")
+    return SeleniumFetcher(source, url)
+
+
+_fetchers_lock = threading.Lock()
+
+# Потоки, в которых выполняются блокирующие скрапы
+_scrape_executor = None
+
+
+def get_scrape_executor():
+    global _scrape_executor
+
+    with _fetchers_lock:
+        if _scrape_executor is None:
+            from config import SCRAPE_WORKERS
+            _scrape_executor = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scraper")
+        return _scrape_executor
+
+
+# Кэш стратегий по источникам, чтобы переиспользовать соединения между скрапами
+_fetchers = {}
+
+
+def get_fetcher(source='pinnacle'):
+    with _fetchers_lock:
+        if source not in _fetchers:
+            _fetchers[source] = create_fetcher(source)
+        return _fetchers[source]
+
+
+def close_fetchers():
+    global _scrape_executor
+
+    with _fetchers_lock:
+        fetchers = list(_fetchers.values())
+        _fetchers.clear()
+        executor, _scrape_executor = _scrape_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    for fetcher in fetchers:
+        try:
+            fetcher.close()
+        except Exception as e:
+            logger.warning(f"Error closing fetcher {fetcher.source}: {e}")
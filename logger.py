@@ -1,38 +1,222 @@
 import os
+import glob
+import gzip
+import json
+import time
+import queue
+import shutil
 import logging
-from logging.handlers import RotatingFileHandler
-from config import LOG_LEVEL, LOG_FILE
+import threading
+from logging.handlers import BaseRotatingHandler, QueueHandler, QueueListener
+
+# Логгер отладочного журнала трекера (JSON lines, отдельный файл)
+DEBUG_LOGGER = 'debug'
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class CompressingRotatingFileHandler(BaseRotatingHandler):
+    def __init__(self, filename, max_bytes=10 * 1024 * 1024, interval=24 * 3600, backup_count=5):
+        """
+        Файл лога с ротацией по размеру и по времени: закрытый файл сжимается
+        в gzip рядом с исходным, лишние архивы удаляются
+
+        Args:
+            filename (str): Путь к файлу лога
+            max_bytes (int): Размер, после которого файл ротируется (0 - без ограничения)
+            interval (float): Сколько секунд писать в один файл (0 - без ограничения)
+            backup_count (int): Сколько сжатых архивов хранить
+        """
+        log_dir = os.path.dirname(filename)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        super().__init__(filename, 'a', encoding='utf-8', delay=True)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backup_count = backup_count
+        self.rollover_at = time.time() + interval if interval else None
+
+    def shouldRollover(self, record):
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        if self.max_bytes:
+            if self.stream is None:
+                self.stream = self._open()
+            return self.stream.tell() >= self.max_bytes
+        return False
+
+    def doRollover(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+        if not os.path.exists(self.baseFilename) or not os.path.getsize(self.baseFilename):
+            return
+        archive = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S')}.gz"
+        suffix = 1
+        while os.path.exists(archive):
+            archive = f"{self.baseFilename}.{time.strftime('%Y%m%d-%H%M%S')}-{suffix}.gz"
+            suffix += 1
+        with open(self.baseFilename, 'rb') as source, gzip.open(archive, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(self.baseFilename)
+
+        archives = sorted(glob.glob(f"{glob.escape(self.baseFilename)}.*.gz"), key=os.path.getmtime)
+        for old_archive in archives[:max(len(archives) - self.backup_count, 0)]:
+            os.remove(old_archive)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON; данные события сериализуются только здесь, в потоке записи"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'msg': record.getMessage(),
+        }
+        data = getattr(record, 'data', None)
+        if data is not None:
+            entry['data'] = data
+        sampled = getattr(record, 'sampled', None)
+        if sampled:
+            entry['sampled'] = sampled
+        if record.exc_text or record.exc_info:
+            entry['exc'] = record.exc_text or self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Передает запись в очередь без форматирования: сообщение и данные
+    собираются в потоке записи, вызывающий поток не ждет ни сериализации, ни диска
+    """
+
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            # Трассировку форматируем сразу: кадры стека к моменту записи уже изменятся
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+
+# Выборка частых событий: пишется каждое _sample_rate-е событие с одним сообщением
+_sample_rate = 1
+_sample_counters = {}
+_sample_lock = threading.Lock()
+
+
+def write_debug_log(message, data=None, frequent=False):
+    """
+    Записывает событие в отладочный журнал. Если журнал выключен, ничего не строится;
+    data может быть функцией без аргументов, тогда она вызывается только при включенном журнале.
+
+    Args:
+        message (str): Сообщение (им же различаются события при выборке)
+        data (any): Данные события или функция, которая их возвращает
+        frequent (bool): Частое событие: пишется только каждое DEBUG_LOG_SAMPLE-е
+    """
+    debug_logger = logging.getLogger(DEBUG_LOGGER)
+    if not debug_logger.isEnabledFor(logging.DEBUG):
+        return
+
+    sampled = None
+    if frequent and _sample_rate > 1:
+        with _sample_lock:
+            seen = _sample_counters.get(message, 0) + 1
+            _sample_counters[message] = seen
+        if (seen - 1) % _sample_rate:
+            return
+        sampled = _sample_rate
+
+    if callable(data):
+        data = data()
+    debug_logger.debug(message, extra={'data': data, 'sampled': sampled})
+
+
+_listener = None
+_debug_handler = None
+_setup_lock = threading.Lock()
+
 
 def setup_logger():
-    # Создаем директорию для логов, если её нет
-    log_dir = os.path.dirname(LOG_FILE)
-    if log_dir and not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    # Настраиваем форматирование
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # Настраиваем обработчик файла логов с ротацией
-    file_handler = RotatingFileHandler(
-        LOG_FILE,
-        maxBytes=10*1024*1024,  # 10 МБ
-        backupCount=5
-    )
-    file_handler.setFormatter(formatter)
-    
-    # Настраиваем обработчик консоли
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    
-    # Настраиваем корневой логгер
+    """
+    Настраивает логирование через очередь: обработчики (консоль, файл лога
+    и отладочный журнал) работают в фоновом потоке QueueListener.
+    Повторный вызов ничего не делает.
+
+    Returns:
+        logging.Logger: Корневой логгер
+    """
+    global _listener, _debug_handler, _sample_rate
+    from config import (LOG_LEVEL, LOG_FILE, LOG_MAX_MB, LOG_ROTATE_HOURS, LOG_BACKUP_COUNT,
+                        DEBUG_LOG, DEBUG_LOG_FILE, DEBUG_LOG_SAMPLE)
+
     root_logger = logging.getLogger()
-    root_logger.setLevel(getattr(logging, LOG_LEVEL))
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
-    
+    with _setup_lock:
+        if _listener is not None:
+            return root_logger
+
+        formatter = logging.Formatter(TEXT_FORMAT)
+        not_debug = lambda record: record.name != DEBUG_LOGGER
+        handlers = []
+
+        # Настраиваем обработчик консоли
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(formatter)
+        console_handler.addFilter(not_debug)
+        handlers.append(console_handler)
+
+        # Настраиваем обработчик файла логов с ротацией и сжатием
+        rotation = dict(max_bytes=LOG_MAX_MB * 1024 * 1024, interval=LOG_ROTATE_HOURS * 3600,
+                        backup_count=LOG_BACKUP_COUNT)
+        try:
+            file_handler = CompressingRotatingFileHandler(LOG_FILE, **rotation)
+            file_handler.setFormatter(formatter)
+            file_handler.addFilter(not_debug)
+            handlers.append(file_handler)
+        except OSError as e:
+            console_handler.handle(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f"Log file {LOG_FILE} is not writable, logging to console only: {e}",
+            }))
+
+        # Отладочный журнал трекера
+        debug_logger = logging.getLogger(DEBUG_LOGGER)
+        debug_logger.setLevel(logging.DEBUG if DEBUG_LOG else logging.WARNING)
+        _sample_rate = max(DEBUG_LOG_SAMPLE, 1)
+        _debug_handler = CompressingRotatingFileHandler(DEBUG_LOG_FILE, **rotation)
+        _debug_handler.setFormatter(JsonLinesFormatter())
+        _debug_handler.addFilter(lambda record: record.name == DEBUG_LOGGER)
+        handlers.append(_debug_handler)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(log_queue)
+        root_logger.handlers = [queue_handler]
+        root_logger.setLevel(getattr(logging, LOG_LEVEL))
+
+        _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
     return root_logger
 
-# Инициализируем логгер
-logger = setup_logger()
\ No newline at end of file
+
+def rotate_debug_log():
+    """Начинает отладочный журнал с нового файла (предыдущий сжимается)"""
+    if _debug_handler is None:
+        return
+    # Под блокировкой обработчика, чтобы не пересечься с записью из потока очереди
+    _debug_handler.acquire()
+    try:
+        _debug_handler.doRollover()
+    finally:
+        _debug_handler.release()
+
+
+def stop_logging():
+    """Дописывает все записи из очереди (при завершении бота)"""
+    global _listener
+    with _setup_lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
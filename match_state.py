@@ -0,0 +1,269 @@
+import sys
+import math
+from array import array
+
+# Рыночные цены матча в порядке хранения
+PRICE_FIELDS = ('odds1', 'odds2', 'handicap_odd1', 'handicap_odd2')
+PRICE_INDEX = {field: index for index, field in enumerate(PRICE_FIELDS)}
+
+# Наборы цен записи: смещения в общем массиве
+INITIAL, REPORTED, NOTIFIED, CURRENT, PREVIOUS = (index * len(PRICE_FIELDS) for index in range(5))
+SLOTS = 5 * len(PRICE_FIELDS)
+
+# Отсутствующее значение (None) в массиве; наличие ключа хранится отдельной маской
+NONE = math.nan
+FULL_SET = (1 << len(PRICE_FIELDS)) - 1
+PRESENT_COUNT = tuple(bin(mask).count('1') for mask in range(FULL_SET + 1))
+
+# Разделы сохраненного формата и смещения их цен
+SECTIONS = (('initial', INITIAL), ('last_reported', REPORTED))
+
+
+def intern_value(value):
+    """Интернирует строки: названия команд и время повторяются в каждом снимке"""
+    return sys.intern(value) if type(value) is str else value
+
+
+def _price(value):
+    return NONE if value is None else value
+
+
+class MatchState:
+    __slots__ = ('prices', 'present', 'info', 'previous_info', 'last_updated', 'extra', 'settled')
+
+    def __init__(self, match_data, timestamp):
+        """
+        Состояние одного матча в трекере коэффициентов: все наборы цен (начальные,
+        последние отчеты, последние отправленные, текущие и предыдущие) лежат
+        в одном массиве double, остальные поля снимка - в словаре с
+        интернированными строками, который разделяют текущий и предыдущий снимки
+
+        Args:
+            match_data (dict): Данные матча из снимка
+            timestamp (float): Время наблюдения (секунды epoch)
+        """
+        self.prices = array('d', [NONE]) * SLOTS
+        # Биты наличия ключей: по len(PRICE_FIELDS) бит на набор
+        self.present = 0
+        self.info = None
+        self.previous_info = None
+        self.last_updated = timestamp
+        # Нестандартные ключи сохраненного формата, чтобы преобразование было без потерь
+        self.extra = None
+        # Предыдущие данные равны текущим и уже сверены с последними отправленными
+        self.settled = False
+
+        self.set_current(match_data)
+        for offset in (INITIAL, REPORTED):
+            for index, field in enumerate(PRICE_FIELDS):
+                self._set(offset, index, match_data.get(field))
+        for index, field in enumerate(PRICE_FIELDS):
+            if field in match_data:
+                self._set(NOTIFIED, index, match_data[field])
+
+    def _set(self, offset, index, value):
+        self.prices[offset + index] = _price(value)
+        self.present |= 1 << (offset + index)
+
+    def has(self, offset, field):
+        return bool(self.present & (1 << (offset + PRICE_INDEX[field])))
+
+    def get(self, offset, field):
+        """Цена поля из набора offset или None, если ее нет"""
+        index = offset + PRICE_INDEX[field]
+        if not self.present & (1 << index):
+            return None
+        value = self.prices[index]
+        return None if value != value else value
+
+    def set(self, offset, field, value):
+        self._set(offset, PRICE_INDEX[field], value)
+
+    @property
+    def has_previous(self):
+        return self.previous_info is not None
+
+    def _prices_dict(self, offset):
+        present = self.present >> offset
+        values = self.prices[offset:offset + len(PRICE_FIELDS)]
+        return {
+            field: None if value != value else value
+            for index, (field, value) in enumerate(zip(PRICE_FIELDS, values)) if present >> index & 1
+        }
+
+    def _same_prices(self, first, second):
+        """Совпадают ли два набора цен (с учетом отсутствующих ключей и None)"""
+        width = len(PRICE_FIELDS)
+        if (self.present >> first) & FULL_SET != (self.present >> second) & FULL_SET:
+            return False
+        prices = self.prices
+        for index in range(width):
+            a, b = prices[first + index], prices[second + index]
+            if a != b and not (a != a and b != b):
+                return False
+        return True
+
+    def same_as_current(self, match_data):
+        """Совпадает ли снимок с текущими данными матча (без построения словаря)"""
+        present = (self.present >> CURRENT) & FULL_SET
+        info = self.info
+        if len(match_data) != len(info) + PRESENT_COUNT[present]:
+            return False
+        # Сравнение представлений items выполняется целиком на C
+        if not info.items() <= match_data.items():
+            return False
+        prices = self.prices
+        for index, field in enumerate(PRICE_FIELDS):
+            if present & (1 << index):
+                if field not in match_data:
+                    return False
+                value = match_data[field]
+                stored = prices[CURRENT + index]
+                if value is None:
+                    if stored == stored:
+                        return False
+                elif stored != value:
+                    return False
+        return True
+
+    def notified_covers_current(self):
+        """Есть ли последнее отправленное значение для каждой текущей цены"""
+        current = (self.present >> CURRENT) & FULL_SET
+        if current & ~(self.present >> NOTIFIED):
+            return False
+        prices = self.prices
+        for index in range(len(PRICE_FIELDS)):
+            if current & (1 << index):
+                value = prices[NOTIFIED + index]
+                if value != value:
+                    return False
+        return True
+
+    def previous_same_as_current(self):
+        return self.info == self.previous_info and self._same_prices(PREVIOUS, CURRENT)
+
+    def set_current(self, match_data):
+        """Записывает снимок как текущие данные матча; словарь полей переиспользуется, если он не изменился"""
+        self.present &= ~(FULL_SET << CURRENT)
+        for index, field in enumerate(PRICE_FIELDS):
+            if field in match_data:
+                self._set(CURRENT, index, match_data[field])
+
+        info = self.info
+        present = (self.present >> CURRENT) & FULL_SET
+        if info is None or len(match_data) != len(info) + PRESENT_COUNT[present] \
+                or not info.items() <= match_data.items():
+            info = {
+                intern_value(key): intern_value(value)
+                for key, value in match_data.items() if key not in PRICE_INDEX
+            }
+            self.info = self.previous_info if self.previous_info == info else info
+
+    def shift_previous(self):
+        """Текущие данные становятся предыдущими"""
+        self.prices[PREVIOUS:PREVIOUS + len(PRICE_FIELDS)] = self.prices[CURRENT:CURRENT + len(PRICE_FIELDS)]
+        self.present = (self.present & ~(FULL_SET << PREVIOUS)) | (
+            ((self.present >> CURRENT) & FULL_SET) << PREVIOUS)
+        self.previous_info = self.info
+
+    def match_data(self, offset=CURRENT):
+        """Снимок матча (текущий или предыдущий) в виде словаря"""
+        info = self.info if offset == CURRENT else self.previous_info
+        if info is None:
+            return None
+        result = dict(info)
+        result.update(self._prices_dict(offset))
+        return result
+
+    def initial_dict(self):
+        return self._section_dict('initial', INITIAL)
+
+    def notified_dict(self):
+        return self._prices_dict(NOTIFIED)
+
+    def _section_dict(self, name, offset):
+        result = self._prices_dict(offset)
+        if self.extra and name in self.extra:
+            result.update(self.extra[name])
+        return result
+
+    def to_record(self):
+        """
+        Преобразует состояние в сохраняемый формат истории (строка odds_history)
+
+        Returns:
+            dict: {'initial', 'last_reported', 'previous', 'match_data', 'last_updated'}
+        """
+        record = {
+            'initial': self._section_dict('initial', INITIAL),
+            'last_reported': self._section_dict('last_reported', REPORTED),
+            'previous': self.match_data(PREVIOUS),
+            'match_data': self.match_data(CURRENT),
+            'last_updated': self.last_updated,
+        }
+        if self.extra and '' in self.extra:
+            record.update(self.extra[''])
+        return record
+
+    @classmethod
+    def from_record(cls, record, notified=None):
+        """
+        Восстанавливает состояние из сохраненного формата
+
+        Args:
+            record (dict): Строка odds_history
+            notified (dict): Строка last_notified того же матча
+
+        Returns:
+            MatchState: Состояние, для которого to_record() вернет равный record
+        """
+        state = cls.__new__(cls)
+        state.prices = array('d', [NONE]) * SLOTS
+        state.present = 0
+        state.info = None
+        state.previous_info = None
+        state.last_updated = record.get('last_updated')
+        state.extra = None
+        state.settled = False
+
+        previous = record.get('previous')
+        if previous is not None:
+            state.set_current(previous)
+            state.shift_previous()
+        state.set_current(record.get('match_data') or {})
+
+        for name, offset in SECTIONS:
+            for key, value in (record.get(name) or {}).items():
+                index = PRICE_INDEX.get(key)
+                if index is None:
+                    state._set_extra(name, key, value)
+                else:
+                    state._set(offset, index, value)
+        for key, value in (notified or {}).items():
+            if key in PRICE_INDEX:
+                state._set(NOTIFIED, PRICE_INDEX[key], value)
+        for key, value in record.items():
+            if key not in ('initial', 'last_reported', 'previous', 'match_data', 'last_updated'):
+                state._set_extra('', key, value)
+        return state
+
+    def _set_extra(self, section, key, value):
+        if self.extra is None:
+            self.extra = {}
+        self.extra.setdefault(section, {})[key] = value
+
+
+class KnownMatch:
+    __slots__ = ('match_time', 'persisted_seen')
+
+    def __init__(self, match_time, persisted_seen=None):
+        """
+        Известный матч: время начала (интернированная строка) и отметка
+        о последнем появлении на странице, записанная в хранилище
+
+        Args:
+            match_time (str): Время начала матча ("HH:MM")
+            persisted_seen (float): Записанное время последнего появления (секунды epoch)
+        """
+        self.match_time = intern_value(match_time)
+        self.persisted_seen = persisted_seen
@@ -0,0 +1,198 @@
+import time
+import logging
+from datetime import datetime
+
+from odds_tracker import TOUCH_INTERVAL
+from state_store import get_state_writer
+from retention import ExpiryIndex, to_epoch
+from match_state import KnownMatch, intern_value
+
+logger = logging.getLogger(__name__)
+
+
+class MatchTracker:
+    def __init__(self, writer=None, retention_days=None, clock=None):
+        """
+        Initialize the match tracker with the shared state store
+        
+        Args:
+            writer (StateWriter): Фоновая запись в хранилище состояния (по умолчанию общая)
+            retention_days (float): Сколько дней помнить матч, пропавший со страницы (по умолчанию из конфига)
+            clock (callable): Источник текущего времени в секундах epoch (по умолчанию time.time)
+        """
+        if retention_days is None:
+            from config import KNOWN_MATCHES_RETENTION_DAYS
+            retention_days = KNOWN_MATCHES_RETENTION_DAYS
+        self.clock = clock or time.time
+        self.writer = writer or get_state_writer()
+        self.store = self.writer.store
+        # Загружаем состояние только после записи всего, что еще не записано
+        self.writer.flush()
+        self.retention_days = retention_days
+        # Когда матч последний раз был на странице (секунды epoch), в порядке времени
+        self.expiry = ExpiryIndex()
+        self.evicted_total = 0
+        self.known_matches = self._load_matches()
+        
+    def _load_matches(self):
+        """
+        Load known matches from the state store
+        """
+        try:
+            # Храним словарь матчей: время начала и записанная отметка появления
+            seen = self.store.load_known_matches_seen()
+            now = self.clock()
+            known_matches = {}
+            for match_key, match_time in self.store.load_known_matches().items():
+                match_key = intern_value(match_key)
+                # Старые версии хранили updated_at в ISO
+                seen_at = to_epoch(seen.get(match_key))
+                self.expiry.touch(match_key, now if seen_at is None else seen_at)
+                known_matches[match_key] = KnownMatch(match_time, seen_at)
+            return known_matches
+        except Exception as e:
+            logger.error(f"Error loading matches: {e}")
+        return {}
+        
+    def _cleanup_old_matches(self):
+        """
+        Забывает матчи, которых не было на странице дольше retention_days
+        
+        Returns:
+            list: Удаленные матчи
+        """
+        expired = self.expiry.expire(self.clock() - self.retention_days * 86400)
+        for match_key in expired:
+            self.known_matches.pop(match_key, None)
+            self.writer.delete_known_match(match_key)
+        if expired:
+            self.evicted_total += len(expired)
+            logger.info(f"Evicted {len(expired)} known matches older than {self.retention_days} days "
+                        f"({self.evicted_total} since start, {len(self.known_matches)} left)")
+        return expired
+        
+    def _save_matches(self, match_keys=None):
+        """
+        Save known matches to the state store
+        
+        Args:
+            match_keys (iterable): Матчи для записи (по умолчанию все)
+        """
+        try:
+            match_keys = self.known_matches if match_keys is None else match_keys
+            for match_key in match_keys:
+                known = self.known_matches[match_key]
+                known.persisted_seen = self.expiry.get(match_key)
+                self.writer.put_known_match(match_key, known.match_time, known.persisted_seen)
+            logger.info(f"Queued {len(match_keys)} of {len(self.known_matches)} matches for saving to {self.store.path}")
+        except Exception as e:
+            logger.error(f"Error saving matches: {e}")
+            logger.exception("Full exception details:")
+    
+    def _is_within_time_buffer(self, time_str1, time_str2, buffer_hours=5):
+        """
+        Проверяет, находится ли время time_str2 в пределах буфера от time_str1
+        
+        Args:
+            time_str1 (str): Первая метка времени (формат: "HH:MM")
+            time_str2 (str): Вторая метка времени (формат: "HH:MM")
+            buffer_hours (int): Размер буфера в часах (по умолчанию 5)
+            
+        Returns:
+            bool: True если время в пределах буфера, иначе False
+        """
+        try:
+            # Парсим строки времени в стандартный формат
+            format_str = "%H:%M"
+            if ":" not in time_str1 or ":" not in time_str2:
+                logger.warning(f"Странный формат времени: {time_str1} или {time_str2}")
+                return False
+                
+            time1 = datetime.strptime(time_str1.strip(), format_str).time()
+            time2 = datetime.strptime(time_str2.strip(), format_str).time()
+            
+            # Преобразуем в минуты для простоты сравнения
+            minutes1 = time1.hour * 60 + time1.minute
+            minutes2 = time2.hour * 60 + time2.minute
+            
+            # Буфер в минутах (увеличен с 3 до 5 часов)
+            buffer_minutes = buffer_hours * 60
+            
+            # Проверяем, находится ли время2 в пределах ±buffer_minutes от время1
+            diff = abs(minutes1 - minutes2)
+            
+            # Учитываем переход через полночь
+            if diff > 12 * 60:
+                diff = 24 * 60 - diff
+                
+            within_buffer = diff <= buffer_minutes
+            logger.debug("Сравнение времен: %s и %s, разница %s минут, в буфере: %s",
+                         time_str1, time_str2, diff, within_buffer)
+            return within_buffer
+            
+        except Exception as e:
+            logger.error(f"Ошибка при сравнении времен {time_str1} и {time_str2}: {e}")
+            logger.exception("Полные детали ошибки:")
+            return False
+    
+    def find_new_matches(self, current_matches):
+        """
+        Identify new matches from the current set with time buffer
+        Returns a dictionary of new matches
+        """
+        new_matches = {}
+        # Словарь, а не список: проверка "not in" выполняется для каждого матча
+        changed_matches = {}
+        self._cleanup_old_matches()
+        now = self.clock()
+        logger.info(f"Проверка новых матчей. Всего текущих матчей: {len(current_matches)}")
+        logger.info(f"Известных матчей: {len(self.known_matches)}")
+        
+        for match_name, data in current_matches.items():
+            match_time = data['time']
+            logger.debug("Обработка матча: %s в %s", match_name, match_time)
+            
+            # Проверяем, есть ли уже такой матч
+            match_found = False
+            
+            # Поиск по точному названию
+            if match_name in self.known_matches:
+                known = self.known_matches[match_name]
+                known_time = known.match_time
+                logger.debug("Найден известный матч: %s, сохраненное время: %s, новое время: %s",
+                             match_name, known_time, match_time)
+                
+                # Проверяем, попадает ли текущее время в буфер от известного времени
+                if self._is_within_time_buffer(known_time, match_time, 5):
+                    match_found = True
+                    # Обновляем время, если оно изменилось
+                    if known_time != match_time:
+                        logger.info(f"Обновлено время для матча: {match_name} с {known_time} на {match_time}")
+                        known.match_time = intern_value(match_time)
+                        changed_matches[match_name] = True
+                else:
+                    logger.warning(f"Матч {match_name} найден, но время {match_time} не попадает в буфер с {known_time}")
+            else:
+                logger.debug("Новый матч не найден в известных: %s", match_name)
+            
+            # Если матч не найден, считаем его новым
+            if not match_found:
+                logger.info(f"Добавляем новый матч: {match_name} в {match_time}")
+                new_matches[match_name] = data
+                # Добавляем в список известных матчей
+                match_name = intern_value(match_name)
+                self.known_matches[match_name] = KnownMatch(match_time)
+                changed_matches[match_name] = True
+            
+            # Отметку о том, что матч еще на странице, переписываем не чаще TOUCH_INTERVAL
+            self.expiry.touch(match_name, now)
+            persisted_seen = self.known_matches[match_name].persisted_seen
+            if match_name not in changed_matches and (persisted_seen is None or now - persisted_seen >= TOUCH_INTERVAL):
+                changed_matches[match_name] = True
+        
+        # Сохраняем только новые и изменившиеся матчи
+        logger.info(f"Обнаружено {len(new_matches)} новых матчей")
+        if changed_matches:
+            self._save_matches(changed_matches)
+        
+        return new_matches
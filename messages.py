@@ -0,0 +1,97 @@
+from datetime import datetime
+
+# Заголовки сообщений в каналы (markdown, курсив)
+ODDS_CHANGES_HEADER = "_Обнаружено значимое изменение коэффициента по Pinnacle_\n\n"
+NEW_MATCHES_HEADER = "_Обнаружены новые матчи по Pinnacle_\n\n"
+
+
+def _format_change(label, change):
+    """Строка изменения коэффициента: старое значение, новое жирным и разница со знаком"""
+    previous = change['previous']
+    current = change['current']
+    diff = abs(previous - current)
+    sign = '+' if current > previous else '-'
+    return f"{label}: {previous:.3f} ➔ *{current:.3f}* ({sign}{diff:.2f})\n"
+
+
+def format_odds_changes_message(significant_changes, header=ODDS_CHANGES_HEADER, date=None):
+    """
+    Собирает сообщение о значимых изменениях коэффициентов
+
+    Args:
+        significant_changes (dict): Результат OddsTracker.detect_changes
+        header (str): Первая строка сообщения
+        date (str): Дата в заголовке матча ("дд.мм", по умолчанию сегодня)
+
+    Returns:
+        str: Текст сообщения в markdown
+    """
+    date = date or datetime.now().strftime("%d.%m")
+    parts = [header]
+
+    for match_name, data in significant_changes.items():
+        match_data = data['match_data']
+        changes = data.get('changes', {})
+
+        # Название матча и время
+        match_time = match_data.get('time', '')
+        parts.append(f"*⚔️ {match_name} | {date} {match_time} (UTC+1)*\n\n")
+
+        # Секция для монилайна (исхода): изменения для обеих команд
+        parts.append("🧮 Исход:\n")
+        team1 = match_data.get('team1', 'Team 1')
+        team2 = match_data.get('team2', 'Team 2')
+        for field, label in (('odds1', team1), ('odds2', team2)):
+            if field in changes and changes[field].get('significant', False):
+                parts.append(_format_change(label, changes[field]))
+
+        # Секция форы, только если есть изменения
+        handicap_lines = []
+        for field, label, handicap_field, default in (
+                ('handicap_odd1', team1, 'handicap1', '-1.5'),
+                ('handicap_odd2', team2, 'handicap2', '+1.5')):
+            if field in changes and changes[field].get('significant', False):
+                handicap = match_data.get(handicap_field, default)
+                handicap_lines.append(_format_change(f"{label} ({handicap})", changes[field]))
+        if handicap_lines:
+            parts.append("\n📍 Форы:\n")
+            parts.extend(handicap_lines)
+
+        parts.append("\n")
+
+    return ''.join(parts)
+
+
+def format_new_matches_message(new_matches, header=NEW_MATCHES_HEADER, date=None):
+    """
+    Собирает сообщение о новых матчах
+
+    Args:
+        new_matches (dict): Результат MatchTracker.find_new_matches
+        header (str): Первая строка сообщения
+        date (str): Дата в заголовке матча ("дд.мм", по умолчанию сегодня)
+
+    Returns:
+        str: Текст сообщения в markdown
+    """
+    date = date or datetime.now().strftime("%d.%m")
+    parts = [header]
+
+    for match_name, data in new_matches.items():
+        # Объединенная строка матча и времени (жирным шрифтом)
+        parts.append(f"*⚔️ {match_name} | {date} {data['time']} (UTC+1)*\n\n")
+
+        # Секция для исходов с жирными коэффициентами
+        parts.append("🧮 Исход:\n")
+        parts.append(f"{data['team1']}: *{data['odds1']:.3f}*\n")
+        parts.append(f"{data['team2']}: *{data['odds2']:.3f}*\n")
+
+        # Секция для фор (если они есть) с жирными коэффициентами
+        if 'handicap1' in data and 'handicap2' in data:
+            parts.append("\n📍 Форы:\n")
+            parts.append(f"{data['team1']} ({data['handicap1']}): *{data['handicap_odd1']:.3f}*\n")
+            parts.append(f"{data['team2']} ({data['handicap2']}): *{data['handicap_odd2']:.3f}*\n")
+
+        parts.append("\n")
+
+    return ''.join(parts)
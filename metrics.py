@@ -0,0 +1,322 @@
+import time
+import logging
+import functools
+import threading
+import contextvars
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (секунды): от миллисекунд детектора до минут скрапа
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Метрики бота
+STAGE_SECONDS = 'oddsbot_stage_seconds'
+JOB_SECONDS = 'oddsbot_job_seconds'
+JOB_RUNS = 'oddsbot_job_runs_total'
+JOB_OVERLAPS = 'oddsbot_job_overlaps_total'
+JOB_FAILURES = 'oddsbot_job_failures_total'
+JOB_RUNNING = 'oddsbot_job_running'
+
+METRICS = {
+    STAGE_SECONDS: ('histogram', "Time spent in each stage of a cycle"),
+    JOB_SECONDS: ('histogram', "Job run duration"),
+    JOB_RUNS: ('counter', "Job runs started"),
+    JOB_OVERLAPS: ('counter', "Job runs started while a previous run of the same job was still in progress"),
+    JOB_FAILURES: ('counter', "Job runs that failed"),
+    JOB_RUNNING: ('gauge', "Job runs currently in progress"),
+}
+
+# Задача, внутри которой выполняется текущий код (см. instrument_job)
+_current_job = contextvars.ContextVar('job', default=None)
+
+# Этапы цикла в порядке выполнения (для /stats)
+STAGES = ('driver_init', 'navigation', 'readiness_wait', 'extraction', 'detection', 'new_matches',
+          'persistence', 'message_build', 'telegram_send')
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', 'max', 'last')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        Гистограмма в формате Prometheus: счетчики корзин (последняя - +Inf),
+        сумма и количество наблюдений, а также максимум и последнее значение для /stats
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self.last = None
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+        self.last = value
+
+    def quantile(self, q):
+        """Оценка квантиля по корзинам (верхняя граница корзины, как histogram_quantile)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.sum, histogram.count, histogram.max, histogram.last = self.sum, self.count, self.max, self.last
+        return histogram
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry:
+    def __init__(self, metrics=None):
+        """
+        Счетчики, показатели и гистограммы с метками. Обновления приходят
+        из event loop, потоков скрапера и потока записи состояния, поэтому
+        все операции выполняются под одной блокировкой
+
+        Args:
+            metrics (dict): {name: (type, help)} - описания метрик (по умолчанию METRICS)
+        """
+        self.metrics = dict(METRICS if metrics is None else metrics)
+        self._lock = threading.Lock()
+        self._values = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        """
+        Увеличивает счетчик или показатель (value может быть отрицательным для показателя)
+
+        Returns:
+            float: Новое значение
+        """
+        key = (name, _labels_key(labels))
+        with self._lock:
+            value = self._values[key] = self._values.get(key, 0) + value
+        return value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._values[(name, _labels_key(labels))] = value
+
+    def get(self, name, **labels):
+        with self._lock:
+            return self._values.get((name, _labels_key(labels)), 0)
+
+    def observe(self, name, value, **labels):
+        key = (name, _labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Записывает в гистограмму длительность блока with (в том числе завершившегося исключением)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def histograms(self, name):
+        """Копии гистограмм метрики: [(метки, Histogram), ...]"""
+        with self._lock:
+            return [
+                (dict(key), histogram.copy())
+                for (metric, key), histogram in self._histograms.items() if metric == name
+            ]
+
+    def values(self, name):
+        """Значения счетчика или показателя: [(метки, значение), ...]"""
+        with self._lock:
+            return [(dict(key), value) for (metric, key), value in self._values.items() if metric == name]
+
+    def render(self):
+        """
+        Все метрики в текстовом формате Prometheus (version 0.0.4)
+
+        Returns:
+            str: Тело ответа /metrics
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+            histograms = sorted((key, histogram.copy()) for key, histogram in self._histograms.items())
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name in described:
+                return
+            described.add(name)
+            kind, help_text = self.metrics.get(name, ('untyped', name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, key), value in values:
+            describe(name)
+            lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+
+        for (name, key), histogram in histograms:
+            describe(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', _format_number(bound))])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(key)} {_format_number(histogram.sum)}")
+            lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+
+        return '\n'.join(lines) + '\n'
+
+
+# Общий реестр метрик
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Возвращает общий реестр метрик"""
+    global _metrics
+
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+        return _metrics
+
+
+def observe_stage(stage, seconds):
+    """Записывает длительность этапа цикла (см. STAGES)"""
+    get_metrics().observe(STAGE_SECONDS, seconds, stage=stage)
+
+
+def stage_timer(stage):
+    """Контекстный менеджер: длительность блока записывается как этап цикла"""
+    return get_metrics().timer(STAGE_SECONDS, stage=stage)
+
+
+def job_failed(job=None):
+    """
+    Отмечает неудачный запуск задачи, которая сама перехватывает свои ошибки
+
+    Args:
+        job (str): Имя задачи (по умолчанию задача, внутри которой выполняется вызов)
+    """
+    job = job or _current_job.get()
+    if job is not None:
+        get_metrics().inc(JOB_FAILURES, job=job)
+
+
+def instrument_job(job):
+    """
+    Декоратор корутины задачи: считает запуски, наложения (запуск, пока
+    предыдущий еще идет), ошибки и длительность
+
+    Args:
+        job (str): Имя задачи в метках
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            metrics = get_metrics()
+            running = metrics.inc(JOB_RUNNING, job=job) - 1
+            metrics.inc(JOB_RUNS, job=job)
+            if running:
+                metrics.inc(JOB_OVERLAPS, job=job)
+                logger.warning(f"Job {job} started while {running} previous run(s) still in progress")
+
+            token = _current_job.set(job)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                metrics.inc(JOB_FAILURES, job=job)
+                raise
+            finally:
+                metrics.observe(JOB_SECONDS, time.perf_counter() - started, job=job)
+                metrics.inc(JOB_RUNNING, -1, job=job)
+                _current_job.reset(token)
+        return wrapper
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = get_metrics().render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("Metrics request: " + format, *args)
+
+
+_metrics_server = None
+
+
+def start_metrics_server(host='127.0.0.1', port=9108):
+    """
+    Запускает HTTP-сервер /metrics в фоновом потоке (повторный вызов ничего не делает)
+
+    Returns:
+        ThreadingHTTPServer: Сервер или None, если порт занять не удалось
+    """
+    global _metrics_server
+
+    with _metrics_lock:
+        if _metrics_server is not None:
+            return _metrics_server
+        try:
+            server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            logger.error(f"Could not start metrics endpoint on {host}:{port}: {e}")
+            return None
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        _metrics_server = server
+    logger.info(f"Metrics endpoint listening on http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+
+def stop_metrics_server():
+    global _metrics_server
+
+    with _metrics_lock:
+        server, _metrics_server = _metrics_server, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
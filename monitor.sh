@@ -21,13 +21,7 @@ if [ -f "$LOG_FILE" ]; then
     fi
 fi
 
-# Проверка на зомби-процессы chromedriver
-if ps aux | grep -w Z | grep chromedriver > /dev/null; then
-    echo "Обнаружены зомби-процессы chromedriver. Очистка..."
-    # Мягкий перезапуск systemd-user-sessions может помочь с зомби
-    systemctl restart systemd-user-sessions
-    RESTART_NEEDED=true
-fi
+# Зомби-процессы chromedriver и Chrome собирает сам бот (resource_governor.py)
 
 # Перезапуск при необходимости
 if [ "$RESTART_NEEDED" = true ]; then
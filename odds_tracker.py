@@ -1,87 +1,112 @@
-import os
-import json
+import time
 import logging
-from datetime import datetime, timedelta
+from array import array
 
-logger = logging.getLogger(__name__)
+from logger import write_debug_log
+from state_store import get_state_writer
+from retention import ExpiryIndex, to_epoch
+from match_state import MatchState, PRICE_FIELDS, REPORTED, NOTIFIED, CURRENT, intern_value
+from change_engine import DEFAULT_SCHEDULE, get_threshold, evaluate_changes
 
-# Файл для отладочной информации
-DEBUG_LOG_FILE = 'debug_odds_tracker.log'
+logger = logging.getLogger(__name__)
 
-def write_debug_log(message, data=None):
-    """
-    Записывает отладочную информацию в файл
-    
-    Args:
-        message (str): Сообщение для записи
-        data (any): Данные для записи (будут преобразованы в JSON)
-    """
-    try:
-        timestamp = datetime.now().isoformat()
-        log_entry = f"[{timestamp}] {message}\n"
-        
-        if data is not None:
-            if isinstance(data, dict) or isinstance(data, list):
-                log_entry += json.dumps(data, indent=2, default=str) + "\n"
-            else:
-                log_entry += str(data) + "\n"
-        
-        log_entry += "\n" + "-" * 50 + "\n"
-        
-        with open(DEBUG_LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
-            
-        logger.info(f"Debug info written to {DEBUG_LOG_FILE}")
-    except Exception as e:
-        logger.error(f"Error writing debug log: {e}")
+# Как часто переписывать last_updated матча, у которого ничего не изменилось (секунды)
+TOUCH_INTERVAL = 3600
 
 class OddsTracker:
-    def __init__(self, storage_file='odds_history.json', retention_days=7):
+    def __init__(self, writer=None, retention_days=None, clock=None, schedule=None):
         """
         Initialize the odds tracker
         
         Args:
-            storage_file (str): File to store odds history
-            retention_days (int): Number of days to keep match history
+            writer (StateWriter): Фоновая запись в хранилище состояния (по умолчанию общая)
+            retention_days (float): Number of days to keep match history (по умолчанию из конфига)
+            clock (callable): Источник текущего времени в секундах epoch (по умолчанию time.time)
+            schedule (tuple): Схема порогов значимого изменения (по умолчанию DEFAULT_SCHEDULE)
         """
-        self.storage_file = storage_file
+        if retention_days is None:
+            from config import ODDS_HISTORY_RETENTION_DAYS
+            retention_days = ODDS_HISTORY_RETENTION_DAYS
+        self.clock = clock or time.time
+        self.schedule = schedule or DEFAULT_SCHEDULE
+        self.writer = writer or get_state_writer()
+        self.store = self.writer.store
+        # Загружаем состояние только после записи всего, что еще не записано
+        self.writer.flush()
         self.retention_days = retention_days
+        # Состояние матчей (MatchState), включая последние отправленные значения
         self.odds_history = self._load_odds_history()
-        self.last_notified = self.load_last_notified()
+        # Матчи в порядке last_updated: вытеснение не перебирает всю историю
+        self.expiry = ExpiryIndex()
+        for match_key, state in self.odds_history.items():
+            self.expiry.touch(match_key, state.last_updated)
+        self.evicted_total = 0
+        # Время last_updated, записанное в хранилище, по каждому матчу
+        self._persisted_updates = {
+            match_key: state.last_updated for match_key, state in self.odds_history.items()
+        }
         
-        # Создаем новый файл логов при инициализации
         write_debug_log("Инициализирован OddsTracker", {
-            "storage_file": storage_file,
+            "store": self.store.path,
             "retention_days": retention_days,
             "history_size": len(self.odds_history)
         })
         
     def _load_odds_history(self):
-        """Load odds history from storage file"""
-        if os.path.exists(self.storage_file):
-            try:
-                with open(self.storage_file, 'r') as f:
-                    history = json.load(f)
-                    write_debug_log(f"Загружена история из {self.storage_file}", {
-                        "history_size": len(history),
-                        "matches": list(history.keys())
-                    })
-                    return history
-            except Exception as e:
-                logger.error(f"Error loading odds history: {e}")
-                write_debug_log(f"Ошибка загрузки истории: {e}")
-        write_debug_log("История не найдена, создана пустая")
+        """Load odds history from the state store"""
+        try:
+            records = self.store.load_odds_history()
+            last_notified = self.load_last_notified()
+            # last_updated хранится в секундах epoch; строки ISO из старых версий переводим,
+            # а матчи без разборчивой метки считаем обновленными сейчас
+            now = self.clock()
+            history = {}
+            for match_key, record in records.items():
+                last_updated = to_epoch(record.get('last_updated'))
+                if last_updated is None:
+                    logger.warning(f"Invalid timestamp format for match {match_key}")
+                    last_updated = now
+                record['last_updated'] = last_updated
+                history[intern_value(match_key)] = MatchState.from_record(record, last_notified.get(match_key))
+            write_debug_log(f"Загружена история из {self.store.path}", lambda: {
+                "history_size": len(history),
+                "matches": list(history.keys())
+            })
+            return history
+        except Exception as e:
+            logger.error(f"Error loading odds history: {e}")
+            write_debug_log(f"Ошибка загрузки истории: {e}")
         return {}
         
-    def _save_odds_history(self):
-        """Save odds history to storage file"""
+    def _save_odds_history(self, changed, removed=(), notified=()):
+        """
+        Передает изменившиеся матчи фоновой записи; на диск они попадут
+        одной транзакцией вместе с изменениями следующих циклов
+        
+        Args:
+            changed (iterable): Матчи, история которых изменилась
+            removed (iterable): Матчи, удаленные из истории
+            notified (iterable): Матчи, у которых изменились последние отправленные значения
+        """
         try:
-            with open(self.storage_file, 'w') as f:
-                json.dump(self.odds_history, f)
-                write_debug_log(f"История сохранена в {self.storage_file}", {
-                    "history_size": len(self.odds_history),
-                    "matches": list(self.odds_history.keys())
-                })
+            # Сначала удаления: матч, вытесненный и снова появившийся в этом же цикле,
+            # должен остаться в хранилище с новой записью
+            for match_key in removed:
+                self.writer.delete_odds_history(match_key)
+                self.writer.delete_last_notified(match_key)
+                self._persisted_updates.pop(match_key, None)
+            for match_key in changed:
+                state = self.odds_history[match_key]
+                self.writer.put_odds_history(match_key, state.to_record())
+                self._persisted_updates[match_key] = state.last_updated
+            for match_key in notified:
+                self.writer.put_last_notified(match_key, self.odds_history[match_key].notified_dict())
+            write_debug_log("История передана на запись", {
+                "history_size": len(self.odds_history),
+                "changed": len(changed),
+                "removed": len(removed),
+                "notified": len(notified)
+            })
         except Exception as e:
             logger.error(f"Error saving odds history: {e}")
             write_debug_log(f"Ошибка сохранения истории: {e}")
@@ -96,28 +121,7 @@ class OddsTracker:
         Returns:
             float: The threshold value
         """
-        if 1.01 <= odds_value < 1.1:
-            return 0.01
-        elif 1.1 <= odds_value < 1.2:
-            return 0.02
-        elif 1.2 <= odds_value < 1.3:
-            return 0.03
-        elif 1.3 <= odds_value < 1.4:
-            return 0.04
-        elif 1.4 <= odds_value < 1.6:
-            return 0.05
-        elif 1.6 <= odds_value < 1.9:
-            return 0.07
-        elif 1.9 <= odds_value < 2.2:
-            return 0.10
-        elif 2.2 <= odds_value < 2.5:
-            return 0.15
-        elif 2.5 <= odds_value < 3.0:
-            return 0.20
-        elif 3.0 <= odds_value < 4.0:
-            return 0.30
-        else:  # 4.0 and above
-            return 0.50
+        return get_threshold(odds_value, self.schedule)
     
     def is_significant_change(self, initial_value, current_value, last_reported_value):
         """
@@ -150,7 +154,7 @@ class OddsTracker:
         # Проверяем, достаточно ли велико изменение (в любом направлении)
         is_significant = diff >= threshold
         
-        write_debug_log("Проверка значимости изменения (кумулятивная)", {
+        write_debug_log("Проверка значимости изменения (кумулятивная)", lambda: {
             "last_reported": last_reported_value,
             "current": current_value, 
             "initial": initial_value,
@@ -158,39 +162,33 @@ class OddsTracker:
             "direction": "рост" if current_value > last_reported_value else "падение",
             "threshold": threshold,
             "is_significant": is_significant
-        })
+        }, frequent=True)
         
         # Возвращаем результат и новое значение для last_reported
         # Если изменение значимое, обновляем reference value
         return is_significant, current_value if is_significant else last_reported_value
     
     def _cleanup_old_matches(self):
-        """Remove matches older than retention_days from history"""
-        if not self.odds_history:
-            return
-            
-        current_time = datetime.now()
-        matches_to_remove = []
+        """
+        Remove matches older than retention_days from history
         
-        for match_key, history in self.odds_history.items():
-            last_updated_str = history.get('last_updated')
-            if not last_updated_str:
-                continue
-                
-            try:
-                last_updated = datetime.fromisoformat(last_updated_str)
-                if (current_time - last_updated) > timedelta(days=self.retention_days):
-                    matches_to_remove.append(match_key)
-            except ValueError:
-                logger.warning(f"Invalid timestamp format for match {match_key}")
+        Returns:
+            list: Удаленные матчи
+        """
+        cutoff = self.clock() - self.retention_days * 86400
+        matches_to_remove = self.expiry.expire(cutoff)
         
         for match_key in matches_to_remove:
             logger.info(f"Removing old match from history: {match_key}")
-            del self.odds_history[match_key]
+            self.odds_history.pop(match_key, None)
             
         if matches_to_remove:
+            self.evicted_total += len(matches_to_remove)
+            logger.info(f"Evicted {len(matches_to_remove)} matches older than {self.retention_days} days "
+                        f"({self.evicted_total} since start, {len(self.odds_history)} left)")
             write_debug_log(f"Удалено {len(matches_to_remove)} устаревших матчей", 
-                         {"removed_matches": matches_to_remove})
+                         {"removed_matches": matches_to_remove, "evicted_total": self.evicted_total})
+        return matches_to_remove
     
     def detect_changes(self, current_matches):
         """
@@ -204,7 +202,11 @@ class OddsTracker:
             dict: Матчи со значимыми изменениями коэффициентов
         """
         significant_changes = {}
-        self._cleanup_old_matches()
+        removed_matches = self._cleanup_old_matches()
+        
+        # Матчи, которые нужно записать в хранилище в этом цикле
+        changed_matches = set()
+        notified_matches = set()
         
         write_debug_log("Запуск обнаружения изменений", {
             "current_matches_count": len(current_matches),
@@ -212,127 +214,148 @@ class OddsTracker:
         })
         
         # Текущая временная метка
-        timestamp = datetime.now().isoformat()
+        timestamp = self.clock()
+        
+        # Матчи, цены которых нужно сверить: их массивы цен подряд, маски и цены снимка
+        active = []
+        prices = array('d')
+        present = []
+        current_prices = []
         
         for match_key, current_data in current_matches.items():
-            # Инициализация для нового матча
-            if match_key not in self.odds_history:
-                self.odds_history[match_key] = {
-                    'initial': {
-                        'odds1': current_data.get('odds1'),
-                        'odds2': current_data.get('odds2'),
-                        'handicap_odd1': current_data.get('handicap_odd1'),
-                        'handicap_odd2': current_data.get('handicap_odd2'),
-                    },
-                    'last_reported': {
-                        'odds1': current_data.get('odds1'),
-                        'odds2': current_data.get('odds2'),
-                        'handicap_odd1': current_data.get('handicap_odd1'),
-                        'handicap_odd2': current_data.get('handicap_odd2'),
-                    },
-                    'previous': None,
-                    'match_data': current_data,
-                    'last_updated': timestamp
-                }
-                
-                # Также инициализируем в last_notified
-                self.last_notified.setdefault(match_key, {})
-                for field in ['odds1', 'odds2', 'handicap_odd1', 'handicap_odd2']:
-                    if field in current_data:
-                        self.last_notified[match_key][field] = current_data.get(field)
-                
+            state = self.odds_history.get(match_key)
+            
+            # Инициализация для нового матча: начальные, последние отчеты
+            # и последние отправленные значения равны текущим
+            if state is None:
+                match_key = intern_value(match_key)
+                self.odds_history[match_key] = MatchState(current_data, timestamp)
+                changed_matches.add(match_key)
+                notified_matches.add(match_key)
+                self.expiry.touch(match_key, timestamp)
                 continue
-                
-            # Получаем данные из истории
-            history = self.odds_history[match_key]
-            previous_data = history['match_data']
-            initial_data = history['initial']
-            last_reported = history.get('last_reported', {})
             
-            # Флаг значимых изменений
-            has_significant_changes = False
+            # Снимок не изменился, а те же цены уже сверены с теми же последними
+            # отправленными значениями: остается только обновить отметку времени
+            unchanged = state.same_as_current(current_data)
+            if unchanged and state.settled:
+                persisted_update = self._persisted_updates.get(match_key)
+                if persisted_update is None or timestamp - persisted_update >= TOUCH_INTERVAL:
+                    changed_matches.add(match_key)
+                state.last_updated = timestamp
+                self.expiry.touch(match_key, timestamp)
+                continue
             
-            # Словарь изменений
-            changes = {}
+            active.append((match_key, state, current_data, unchanged))
+            prices.extend(state.prices)
+            present.append(state.present)
+            current_prices.extend([current_data.get(field) for field in PRICE_FIELDS])
+        
+        # Пороги, значимость и изменения с прошлого скрапа для всех полей сразу
+        fill, significant, moved, moved_diff, direction = evaluate_changes(prices, present, current_prices, self.schedule)
+        width = len(PRICE_FIELDS)
+        
+        # Без последнего отправленного значения отсчет начинается с текущей цены
+        for row in fill:
+            match_key, state, current_data, _ = active[row // width]
+            state.set(NOTIFIED, PRICE_FIELDS[row % width], current_prices[row])
+            notified_matches.add(match_key)
+        
+        significant_rows = {}
+        for row in significant:
+            significant_rows.setdefault(row // width, set()).add(row % width)
+        
+        # Изменения между текущим и предыдущим скрапингом
+        moved_rows = {}
+        for row, diff, row_direction in zip(moved, moved_diff, direction):
+            moved_rows.setdefault(row // width, []).append((row % width, diff, row_direction))
+        
+        for position, (match_key, state, current_data, unchanged) in enumerate(active):
+            fields = significant_rows.get(position, ())
+            has_significant_changes = bool(fields)
             
-            # Проверяем все поля коэффициентов
-            for field in ['odds1', 'odds2', 'handicap_odd1', 'handicap_odd2']:
-                if field in current_data and field in initial_data:
-                    current_value = current_data.get(field)
-                    initial_value = initial_data.get(field)
-                    
-                    # Получаем значение из last_notified
-                    last_reported_value = self.last_notified.get(match_key, {}).get(field)
-                    if last_reported_value is None and field in current_data:
-                        last_reported_value = current_value
-                        self.last_notified.setdefault(match_key, {})[field] = current_value
-                    
-                    # Проверяем значимость изменения
-                    is_significant, new_last_reported = self.is_significant_change(
-                        initial_value, current_value, last_reported_value
-                    )
-                    
-                    # Если изменение значимое
-                    if is_significant:
-                        has_significant_changes = True
-                        # Обновляем значение в last_notified
-                        self.last_notified.setdefault(match_key, {})[field] = new_last_reported
-                        # Также обновляем в истории
-                        last_reported[field] = new_last_reported
-                    
-                    # Если есть изменение между текущим и предыдущим скрапингом
-                    if field in previous_data and current_value != previous_data.get(field):
-                        previous_value = previous_data.get(field)
-                        diff = abs(previous_value - current_value)
-                        direction = 1 if current_value > previous_value else -1
-                        
-                        changes[field] = {
-                            'previous': previous_value,
-                            'current': current_value,
-                            'diff': diff,
-                            'direction': direction,
-                            'significant': is_significant
-                        }
+            # Значимое изменение становится новой точкой отсчета
+            references = {}
+            for index in fields:
+                field = PRICE_FIELDS[index]
+                references[field] = state.get(NOTIFIED, field)
+                state.set(NOTIFIED, field, current_data[field])
+                state.set(REPORTED, field, current_data[field])
+                notified_matches.add(match_key)
             
             # Если есть значимые изменения, добавляем матч в результат
             if has_significant_changes:
+                changes = {}
+                for index, diff, row_direction in moved_rows.get(position, ()):
+                    field = PRICE_FIELDS[index]
+                    changes[field] = {
+                        'previous': state.get(CURRENT, field),
+                        'current': current_data[field],
+                        'diff': diff,
+                        'direction': row_direction,
+                        'significant': index in fields
+                    }
                 significant_changes[match_key] = {
                     'match_data': current_data,
-                    'initial_data': initial_data,
-                    'changes': changes
+                    'initial_data': state.initial_dict(),
+                    'changes': changes,
+                    # Точки отсчета, от которых изменение оказалось значимым
+                    'references': references
                 }
             
-            # Обновляем историю матча
-            history['previous'] = dict(history['match_data'])
-            history['match_data'] = current_data
-            history['last_reported'] = last_reported
-            history['last_updated'] = timestamp
+            # Строка матча в хранилище меняется, только если изменились данные
+            # или давно не обновлялась отметка last_updated
+            content_changed = (
+                has_significant_changes
+                or not unchanged
+                or not state.previous_same_as_current()
+            )
+            persisted_update = self._persisted_updates.get(match_key)
+            stale = persisted_update is None or timestamp - persisted_update >= TOUCH_INTERVAL
+            if content_changed or stale:
+                changed_matches.add(match_key)
+            
+            # Обновляем историю матча без копирования словарей
+            state.shift_previous()
+            if not unchanged:
+                state.set_current(current_data)
+            state.settled = unchanged and state.notified_covers_current()
+            state.last_updated = timestamp
+            self.expiry.touch(match_key, timestamp)
+        
+        if significant_changes:
+            write_debug_log("Значимые изменения цикла", lambda: {
+                match_key: data['changes'] for match_key, data in significant_changes.items()
+            })
         
-        # Сохраняем обновленную историю и last_notified
-        self._save_odds_history()
-        self.save_last_notified()
+        # Сохраняем изменившиеся матчи и last_notified одной транзакцией
+        self._save_odds_history(changed_matches, removed_matches, notified_matches)
         
         return significant_changes
+
+    def history_records(self):
+        """Вся история в сохраняемом формате (для отладочных логов и команд)"""
+        return {match_key: state.to_record() for match_key, state in self.odds_history.items()}
+
     def load_last_notified(self):
         """
         Загружает последние отправленные значения для кумулятивного отслеживания
         """
-        last_notified_file = 'last_notified.json'
-        if os.path.exists(last_notified_file):
-            try:
-                with open(last_notified_file, 'r') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Error loading last notified values: {e}")
+        try:
+            return self.store.load_last_notified()
+        except Exception as e:
+            logger.error(f"Error loading last notified values: {e}")
         return {}
 
-    def save_last_notified(self):
+    def save_last_notified(self, match_keys=None):
         """
         Сохраняет последние отправленные значения для кумулятивного отслеживания
+        
+        Args:
+            match_keys (iterable): Матчи для записи (по умолчанию все)
         """
-        last_notified_file = 'last_notified.json'
         try:
-            with open(last_notified_file, 'w') as f:
-                json.dump(self.last_notified, f)
+            for match_key in (self.odds_history if match_keys is None else match_keys):
+                self.writer.put_last_notified(match_key, self.odds_history[match_key].notified_dict())
         except Exception as e:
-            logger.error(f"Error saving last notified values: {e}")
\ No newline at end of file
+            logger.error(f"Error saving last notified values: {e}")
@@ -1,20 +1,29 @@
 import asyncio
 import logging
 import os
-import json
 import traceback
 import time
+import threading
 import functools 
 from datetime import datetime
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes, JobQueue
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from odds_tracker import OddsTracker
+from match_tracker import MatchTracker
+from messages import format_odds_changes_message, format_new_matches_message
+from metrics import (get_metrics, instrument_job, job_failed, stage_timer, start_metrics_server,
+                     stop_metrics_server, STAGES, STAGE_SECONDS, JOB_SECONDS, JOB_RUNS, JOB_OVERLAPS,
+                     JOB_FAILURES, JOB_RUNNING)
+from state_store import get_state_writer, close_state_writer
+from tick_log import get_tick_log
+from driver_pool import get_driver_pool
+from fetchers import get_fetcher, close_fetchers, fetch_sources_async, scrape_sources
+from snapshot_bus import SnapshotBus
+from watch_mode import WatchSession
+from scheduler import AdaptiveScheduler
+from resource_governor import get_resource_governor, get_persistent_profiles, become_subreaper
+from config import SNAPSHOT_TTL, WATCH_MODE, DEBUG_LOG_FILE
+from logger import setup_logger, write_debug_log, rotate_debug_log, stop_logging
 
 # Загружаем конфигурацию из .env.development
 from dotenv import load_dotenv
@@ -23,13 +32,10 @@ if os.path.exists('.env.development'):
 else:
     load_dotenv()
 
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Логи пишутся из фонового потока: консоль, файл с ротацией и отладочный журнал
+setup_logger()
 
 logger = logging.getLogger(__name__)
-DEBUG_LOG_FILE = 'debug_odds_tracker.log'
 # Конфигурация из переменных окружения
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 UPDATE_INTERVAL = int(os.getenv('UPDATE_INTERVAL', '300'))
@@ -44,455 +50,78 @@ ODDS_CHANGES_CHANNEL_ID = os.getenv('ODDS_CHANGES_CHANNEL_ID')
 match_tracker = None
 odds_tracker = None
 
-# Глобальные переменные для хранения драйвера
-driver_instance = None
-driver_last_creation = None
+# Шина снимков: один скрап на всех потребителей
+snapshot_bus = None
 
-def write_debug_log(message, data=None):
-    """
-    Записывает отладочную информацию в файл
-    
-    Args:
-        message (str): Сообщение для записи
-        data (any): Данные для записи (будут преобразованы в JSON)
-    """
-    try:
-        timestamp = datetime.now().isoformat()
-        log_entry = f"[{timestamp}] {message}\n"
-        
-        if data is not None:
-            if isinstance(data, dict) or isinstance(data, list):
-                log_entry += json.dumps(data, indent=2, default=str) + "\n"
-            else:
-                log_entry += str(data) + "\n"
-        
-        log_entry += "\n" + "-" * 50 + "\n"
-        
-        with open(DEBUG_LOG_FILE, 'a', encoding='utf-8') as f:
-            f.write(log_entry)
-            
-        logger.info(f"Debug info written to {DEBUG_LOG_FILE}")
-    except Exception as e:
-        logger.error(f"Error writing debug log: {e}")
+# Постоянно открытая вкладка для режима наблюдения (WATCH_MODE)
+watch_session = None
 
-class DotaParser:
-    def __init__(self):
-        from config import BOOKMAKER_URLS
-        self.TARGET_URL = BOOKMAKER_URLS.get('pinnacle', "https://www.pin880.com/en/standard/esports/games/dota-2")
-        self.driver = None
-        
-    def init_driver(self):
-        global driver_instance, driver_last_creation
-        
-        try:
-            # Если у нас уже есть рабочий экземпляр драйвера, используем его
-            current_time = datetime.now()
-            
-            if driver_instance is not None:
-                if driver_last_creation and (current_time - driver_last_creation).total_seconds() < 1800:
-                    self.driver = driver_instance
-                    logger.debug("Reusing existing driver instance")
-                    return self.driver
-                else:
-                    try:
-                        driver_instance.quit()
-                    except:
-                        pass
-            
-            # Импортируем настройки из config
-            from config import ENVIRONMENT, CHROME_OPTIONS
-            
-            if ENVIRONMENT == 'production':
-                # Настройки для Chrome в продакшен-окружении
-                chrome_options = Options()
-                for arg in CHROME_OPTIONS['arguments']:
-                    chrome_options.add_argument(arg)
-                
-                if CHROME_OPTIONS['binary_location']:
-                    chrome_options.binary_location = CHROME_OPTIONS['binary_location']
-                    
-                # Используем установленный chromedriver
-                service = Service('/usr/bin/chromedriver')
-                driver_instance = webdriver.Chrome(service=service, options=chrome_options)
-            else:
-                # Оставляем ваш текущий код для Firefox в development
-                # Проверяем наличие локальных драйверов
-                driver_path = None
-                possible_paths = [
-                    'geckodriver.exe',
-                    'drivers/geckodriver.exe',
-                    './geckodriver.exe',
-                    './drivers/geckodriver.exe'
-                ]
-                
-                for path in possible_paths:
-                    if os.path.exists(path):
-                        driver_path = path
-                        break
-                
-                from selenium.webdriver.firefox.service import Service as FirefoxService
-                from selenium.webdriver.firefox.options import Options as FirefoxOptions
-                
-                # Настраиваем опции Firefox
-                firefox_options = FirefoxOptions()
-                firefox_options.add_argument("--headless")
-                firefox_options.add_argument("--disable-gpu")
-                firefox_options.add_argument("--no-sandbox")
-                
-                # Отключаем загрузку изображений для ускорения
-                firefox_options.set_preference("permissions.default.image", 2)
-                firefox_options.set_preference("dom.ipc.plugins.enabled.libflashplayer.so", False)
-                
-                # Маскируем автоматизацию
-                firefox_options.set_preference("dom.webdriver.enabled", False)
-                firefox_options.set_preference("useAutomationExtension", False)
-                
-                # Устанавливаем User-Agent
-                firefox_options.set_preference("general.useragent.override", 
-                                            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
-                
-                if driver_path:
-                    logger.info(f"Using local driver at {driver_path}")
-                    service = FirefoxService(executable_path=driver_path)
-                    driver_instance = webdriver.Firefox(service=service, options=firefox_options)
-                else:
-                    logger.info("No local driver found, downloading one time")
-                    from webdriver_manager.firefox import GeckoDriverManager
-                    service = FirefoxService(GeckoDriverManager(version="v0.33.0").install())
-                    driver_instance = webdriver.Firefox(service=service, options=firefox_options)
-            
-            # Обновляем время создания драйвера
-            driver_last_creation = current_time
-            
-            # Настраиваем таймауты
-            driver_instance.set_page_load_timeout(30)
-            driver_instance.set_script_timeout(30)
-            
-            # Устанавливаем размер окна
-            driver_instance.set_window_size(1920, 1080)
-            
-            self.driver = driver_instance
-            return self.driver
-            
-        except Exception as e:
-            logger.error(f"Error initializing driver: {e}")
-            logger.error(traceback.format_exc())
-            raise
-            
-    def close_driver(self):
-        """
-        Правильно закрывает браузер и очищает временные файлы
-        """
-        try:
-            if self.driver:
-                self.driver.quit()
-            self.driver = None
-            
-            # Очистить временные профили
-            import subprocess
-            import os
-            
-            # Очистка Chrome/Firefox профилей
-            if os.path.exists('/tmp/snap-private-tmp/snap.chromium/tmp/'):
-                try:
-                    subprocess.run("find /tmp/snap-private-tmp/snap.chromium/tmp/ -name '.org.chromium.Chromium.*' -type d -ctime +1 -exec rm -rf {} \\;", shell=True)
-                except Exception as e:
-                    logger.error(f"Failed to clean up Chrome profiles: {e}")
-                    
-        except Exception as e:
-            logger.error(f"Error in close_driver: {e}")
-            self.driver = None
-    def get_current_odds(self):
-        matches = {}
-        try:
-            self.init_driver()
-            logger.info("Driver initialized")
-            logger.info(f"Getting URL: {self.TARGET_URL}")
-            
-            self.driver.get(self.TARGET_URL)
-            logger.info("URL loaded")
-            
-            # Устанавливаем масштаб страницы для отображения большего количества столбцов
-            self.driver.execute_script("document.body.style.zoom = '70%'")
-            time.sleep(5)
-            
-            # Отключаем скриншоты для стабильности работы
-            logger.info("Page loaded and zoomed, starting parsing...")
-            
-            # Получаем строки с матчами
-            wait = WebDriverWait(self.driver, 15)
-            rows = wait.until(EC.presence_of_all_elements_located((By.CLASS_NAME, "styleRowHighlight")))
-            logger.info(f"Found {len(rows)} rows")
-            
-            for row in rows:
-                try:
-                    # Проверяем, что это строка с матчем
-                    if "(Match)" not in row.text:
-                        continue
-                    
-                    # Ищем команды
-                    teams = row.find_elements(By.CLASS_NAME, "event-row-participant")
-                    if len(teams) != 2:
-                        continue
-                    
-                    team1 = teams[0].text.replace("(Match)", "").strip()
-                    team2 = teams[1].text.replace("(Match)", "").strip()
-                    logger.info(f"Processing match: {team1} vs {team2}")
-                    
-                    # Ищем время
-                    time_elements = row.find_elements(By.CLASS_NAME, "styleMatchupDate")
-                    match_time = ""
-                    if time_elements:
-                        match_time = time_elements[0].text.strip()
-                    
-                    # Ищем основные коэффициенты
-                    odds = row.find_elements(By.CLASS_NAME, "stylePrice")
-                    if len(odds) < 2:
-                        continue
-                    
-                    odds1 = float(odds[0].text.strip())
-                    odds2 = float(odds[1].text.strip())
-                    
-                    # Базовая информация о матче
-                    match_data = {
-                        'team1': team1,
-                        'team2': team2,
-                        'time': match_time,
-                        'odds1': odds1,
-                        'odds2': odds2
-                    }
-                    
-                    # Используем JavaScript для поиска гандикапов и их коэффициентов
-                    handicap_data = self.driver.execute_script("""
-                        var row = arguments[0];
-                        var result = {
-                            pairs: []
-                        };
-                        
-                        // Найдем все спаны с текстом -1.5 или +1.5
-                        var handicapSpans = Array.from(row.querySelectorAll('span')).filter(
-                            span => span.textContent === "-1.5" || span.textContent === "+1.5"
-                        );
-                        
-                        // Для каждого гандикапа ищем ближайший коэффициент
-                        for (var i = 0; i < handicapSpans.length; i++) {
-                            var handicapSpan = handicapSpans[i];
-                            var handicapValue = handicapSpan.textContent;
-                            
-                            // Получаем родительский элемент (обычно это div или button)
-                            var parent = handicapSpan.parentElement;
-                            
-                            // Ищем соседний элемент с коэффициентом
-                            var oddSpan = parent.querySelector('span.stylePrice') || 
-                                        Array.from(parent.parentElement.querySelectorAll('span'))
-                                        .find(span => {
-                                            var text = span.textContent;
-                                            return text.match(/^\\d+\\.\\d+$/) && text !== handicapValue;
-                                        });
-                            
-                            // Если не нашли в родителе, ищем в соседних элементах
-                            if (!oddSpan) {
-                                // Ищем ближайший следующий элемент с числом
-                                var siblings = Array.from(parent.parentElement.children);
-                                var currentIndex = siblings.indexOf(parent);
-                                
-                                for (var j = currentIndex + 1; j < siblings.length; j++) {
-                                    var spanInSibling = siblings[j].querySelector('span');
-                                    if (spanInSibling && spanInSibling.textContent.match(/^\\d+\\.\\d+$/)) {
-                                        oddSpan = spanInSibling;
-                                        break;
-                                    }
-                                }
-                            }
-                            
-                            if (oddSpan) {
-                                result.pairs.push({
-                                    handicap: handicapValue,
-                                    odd: oddSpan.textContent
-                                });
-                            }
-                        }
-                        
-                        return result;
-                    """, row)
-                    
-                    # Ищем пары гандикап + коэффициент
-                    if handicap_data and 'pairs' in handicap_data:
-                        pairs = handicap_data['pairs']
-                        logger.info(f"Found {len(pairs)} handicap-odd pairs: {pairs}")
-                        
-                        # Определяем, какой гандикап для какой команды
-                        minus_handicap = None
-                        plus_handicap = None
-                        
-                        for pair in pairs:
-                            if pair['handicap'] == '-1.5':
-                                minus_handicap = pair
-                            elif pair['handicap'] == '+1.5':
-                                plus_handicap = pair
-                        
-                        # Обычно -1.5 для фаворита (команда с меньшим коэффициентом)
-                        if minus_handicap and plus_handicap:
-                            # Определяем кто фаворит
-                            if odds1 <= odds2:  # Первая команда фаворит
-                                match_data['handicap1'] = minus_handicap['handicap']
-                                match_data['handicap_odd1'] = float(minus_handicap['odd'])
-                                match_data['handicap2'] = plus_handicap['handicap']
-                                match_data['handicap_odd2'] = float(plus_handicap['odd'])
-                            else:  # Вторая команда фаворит
-                                match_data['handicap1'] = plus_handicap['handicap']
-                                match_data['handicap_odd1'] = float(plus_handicap['odd'])
-                                match_data['handicap2'] = minus_handicap['handicap']
-                                match_data['handicap_odd2'] = float(minus_handicap['odd'])
-                    
-                    # Добавляем информацию о матче
-                    matches[f"{team1} vs {team2}"] = match_data
-                    
-                except Exception as e:
-                    logger.error(f"Error processing match row: {e}")
-                    logger.error(traceback.format_exc())
-                    continue
-                    
-        except Exception as e:
-            logger.error(f"Error getting data: {e}")
-            logger.error(traceback.format_exc())
-        finally:
-            self.close_driver()
-                
-        return matches
+def get_watch_session():
+    global watch_session
+    if watch_session is None:
+        from config import WATCH_BUFFER_SIZE, WATCH_RELOAD_INTERVAL
+        watch_session = WatchSession(
+            DotaParser().TARGET_URL,
+            buffer_size=WATCH_BUFFER_SIZE,
+            reload_interval=WATCH_RELOAD_INTERVAL
+        )
+    return watch_session
+
+def get_snapshot_bus():
+    global snapshot_bus
+    if snapshot_bus is None:
+        # В режиме наблюдения снимки берутся из открытой вкладки без навигации
+        if WATCH_MODE:
+            from config import FETCH_BACKEND, BOOKMAKER_URLS
+            session = get_watch_session()
+            ignored = [name for name in BOOKMAKER_URLS if name != 'pinnacle']
+            if FETCH_BACKEND != 'selenium' or ignored:
+                logger.warning(f"WATCH_MODE watches only {session.url} in a selenium tab: "
+                               f"FETCH_BACKEND={FETCH_BACKEND} and extra sources {ignored} are ignored")
+            snapshot_bus = SnapshotBus(session.snapshot_async)
+        else:
+            # Все страницы из BOOKMAKER_URLS скрапятся параллельно в один снимок
+            from config import SOURCE_TIMEOUT
+            snapshot_bus = SnapshotBus(functools.partial(
+                fetch_sources_async, scrape_sources(), SOURCE_TIMEOUT
+            ))
+    return snapshot_bus
+
+# Адаптивное расписание скрапов (ADAPTIVE_SCHEDULE)
+scrape_scheduler = None
+
+# Блокировка состояния трекеров: скрап теперь выполняется в отдельном потоке,
+# и пока он идет, команды вроде /reset_odds_history могут заменить трекер
+state_lock = None
 
-class MatchTracker:
-    def __init__(self, storage_file='known_matches.json'):
+def get_state_lock():
+    global state_lock
+    if state_lock is None:
+        state_lock = asyncio.Lock()
+    return state_lock
+
+class DotaParser:
+    def __init__(self, source='pinnacle'):
         """
-        Initialize the match tracker with a file-based storage
+        Получает коэффициенты через стратегию, выбранную в FETCH_BACKEND
+        (selenium - разбор страницы в браузере, http - JSON-фид без браузера)
         """
-        self.storage_file = storage_file
-        self.known_matches = self._load_matches()
+        self.fetcher = get_fetcher(source)
+        self.TARGET_URL = self.fetcher.url
         
-    def _load_matches(self):
-        """
-        Load known matches from storage file
-        """
-        if os.path.exists(self.storage_file):
-            try:
-                with open(self.storage_file, 'r') as f:
-                    data = json.load(f)
-                    # Теперь храним словарь с матчами и их временем
-                    return data.get('matches', {})
-            except Exception as e:
-                logger.error(f"Error loading matches: {e}")
-        return {}
+    def get_current_odds(self):
+        return self.fetcher.fetch()
         
-    def _save_matches(self):
+    async def fetch_odds(self):
         """
-        Save known matches to storage file
+        Асинхронный вариант get_current_odds: скрап выполняется
+        вне event loop, бот в это время продолжает обрабатывать команды
         """
         try:
-            current_dir = os.getcwd()
-            absolute_path = os.path.abspath(self.storage_file)
-            logger.info(f"Saving matches to: {absolute_path} (Current dir: {current_dir})")
-            
-            with open(self.storage_file, 'w') as f:
-                data = {
-                    'matches': self.known_matches,
-                    'updated_at': datetime.now().isoformat()
-                }
-                json.dump(data, f)
-                logger.info(f"Saved {len(self.known_matches)} matches to {self.storage_file}")
-        except Exception as e:
-            logger.error(f"Error saving matches: {e}")
-            logger.exception("Full exception details:")
-    
-    def _is_within_time_buffer(self, time_str1, time_str2, buffer_hours=5):
-        """
-        Проверяет, находится ли время time_str2 в пределах буфера от time_str1
-        
-        Args:
-            time_str1 (str): Первая метка времени (формат: "HH:MM")
-            time_str2 (str): Вторая метка времени (формат: "HH:MM")
-            buffer_hours (int): Размер буфера в часах (по умолчанию 5)
-            
-        Returns:
-            bool: True если время в пределах буфера, иначе False
-        """
-        try:
-            # Парсим строки времени в стандартный формат
-            format_str = "%H:%M"
-            if ":" not in time_str1 or ":" not in time_str2:
-                logger.warning(f"Странный формат времени: {time_str1} или {time_str2}")
-                return False
-                
-            time1 = datetime.strptime(time_str1.strip(), format_str).time()
-            time2 = datetime.strptime(time_str2.strip(), format_str).time()
-            
-            # Преобразуем в минуты для простоты сравнения
-            minutes1 = time1.hour * 60 + time1.minute
-            minutes2 = time2.hour * 60 + time2.minute
-            
-            # Буфер в минутах (увеличен с 3 до 5 часов)
-            buffer_minutes = buffer_hours * 60
-            
-            # Проверяем, находится ли время2 в пределах ±buffer_minutes от время1
-            diff = abs(minutes1 - minutes2)
-            
-            # Учитываем переход через полночь
-            if diff > 12 * 60:
-                diff = 24 * 60 - diff
-                
-            within_buffer = diff <= buffer_minutes
-            logger.info(f"Сравнение времен: {time_str1} и {time_str2}, разница {diff} минут, в буфере: {within_buffer}")
-            return within_buffer
-            
+            return await self.fetcher.fetch_async()
         except Exception as e:
-            logger.error(f"Ошибка при сравнении времен {time_str1} и {time_str2}: {e}")
-            logger.exception("Полные детали ошибки:")
-            return False
-    
-    def find_new_matches(self, current_matches):
-        """
-        Identify new matches from the current set with time buffer
-        Returns a dictionary of new matches
-        """
-        new_matches = {}
-        logger.info(f"Проверка новых матчей. Всего текущих матчей: {len(current_matches)}")
-        logger.info(f"Известные матчи: {list(self.known_matches.keys())}")
-        
-        for match_name, data in current_matches.items():
-            match_time = data['time']
-            logger.info(f"Обработка матча: {match_name} в {match_time}")
-            
-            # Проверяем, есть ли уже такой матч
-            match_found = False
-            
-            # Поиск по точному названию
-            if match_name in self.known_matches:
-                known_time = self.known_matches[match_name]
-                logger.info(f"Найден известный матч: {match_name}, сохраненное время: {known_time}, новое время: {match_time}")
-                
-                # Проверяем, попадает ли текущее время в буфер от известного времени
-                if self._is_within_time_buffer(known_time, match_time, 5):
-                    match_found = True
-                    # Обновляем время, если оно изменилось
-                    if known_time != match_time:
-                        logger.info(f"Обновлено время для матча: {match_name} с {known_time} на {match_time}")
-                        self.known_matches[match_name] = match_time
-                else:
-                    logger.warning(f"Матч {match_name} найден, но время {match_time} не попадает в буфер с {known_time}")
-            else:
-                logger.info(f"Новый матч не найден в известных: {match_name}")
-            
-            # Если матч не найден, считаем его новым
-            if not match_found:
-                logger.info(f"Добавляем новый матч: {match_name} в {match_time}")
-                new_matches[match_name] = data
-                # Добавляем в список известных матчей
-                self.known_matches[match_name] = match_time
-        
-        # Сохраняем обновленный список
-        logger.info(f"Обнаружено {len(new_matches)} новых матчей")
-        self._save_matches()
-        
-        return new_matches
+            logger.error(f"Error getting data: {e}")
+            return {}
 
 async def debug_odds_tracker(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -504,9 +133,9 @@ async def debug_odds_tracker(update: Update, context: ContextTypes.DEFAULT_TYPE)
     try:
         await update.message.reply_text("Начинаю диагностику трекера коэффициентов...")
         
-        # Сбрасываем файл логов
-        with open(DEBUG_LOG_FILE, 'w', encoding='utf-8') as f:
-            f.write(f"=== Отладочный лог {datetime.now().isoformat()} ===\n\n")
+        # Начинаем отладочный журнал с нового файла
+        rotate_debug_log()
+        write_debug_log("Диагностика трекера коэффициентов")
         
         # Инициализируем трекер, если он не существует
         if odds_tracker is None:
@@ -516,9 +145,9 @@ async def debug_odds_tracker(update: Update, context: ContextTypes.DEFAULT_TYPE)
             write_debug_log("Используется существующий экземпляр OddsTracker")
         
         # Получаем текущие данные
-        write_debug_log("Запуск парсера для получения текущих коэффициентов")
-        parser = DotaParser()
-        current_matches = parser.get_current_odds()
+        write_debug_log("Получение снимка текущих коэффициентов")
+        snapshot = await get_snapshot_bus().get_fresh(SNAPSHOT_TTL)
+        current_matches = snapshot.matches if snapshot else {}
         
         if not current_matches:
             write_debug_log("ОШИБКА: Не удалось получить данные о матчах")
@@ -527,12 +156,13 @@ async def debug_odds_tracker(update: Update, context: ContextTypes.DEFAULT_TYPE)
         
         write_debug_log(f"Получено {len(current_matches)} матчей", current_matches)
         
-        # Проверяем историю коэффициентов
-        write_debug_log("История коэффициентов", odds_tracker.odds_history)
-        
-        # Получаем изменения
-        write_debug_log("Запуск определения изменений")
-        significant_changes = odds_tracker.detect_changes(current_matches)
+        async with get_state_lock():
+            # Проверяем историю коэффициентов
+            write_debug_log("История коэффициентов", odds_tracker.history_records)
+
+            # Получаем изменения
+            write_debug_log("Запуск определения изменений")
+            significant_changes = odds_tracker.detect_changes(current_matches)
         
         write_debug_log(f"Обнаружено {len(significant_changes)} матчей со значимыми изменениями", 
                       significant_changes)
@@ -586,7 +216,7 @@ async def debug_odds_tracker(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 write_debug_log(f"Изменения для {match_data.get('team2')}", changes_info)
         
         # Проверяем историю снова после обработки
-        write_debug_log("История коэффициентов после обработки", odds_tracker.odds_history)
+        write_debug_log("История коэффициентов после обработки", odds_tracker.history_records)
         
         await update.message.reply_text(
             f"Диагностика завершена. Проверьте файл {DEBUG_LOG_FILE}.\n\n"
@@ -612,8 +242,8 @@ async def test_diagnostic_message(update: Update, context: ContextTypes.DEFAULT_
         write_debug_log("Запуск test_diagnostic_message")
         
         # Получаем текущие матчи
-        parser = DotaParser()
-        current_matches = parser.get_current_odds()
+        snapshot = await get_snapshot_bus().get_fresh(SNAPSHOT_TTL)
+        current_matches = snapshot.matches if snapshot else {}
         
         if not current_matches:
             await update.message.reply_text("Не удалось получить данные о матчах для тестирования")
@@ -707,7 +337,7 @@ async def test_diagnostic_message(update: Update, context: ContextTypes.DEFAULT_
             f"- Исходные данные записаны в {DEBUG_LOG_FILE}\n"
             "- Если это тестовое сообщение отображается со стрелками, "
             "но обычные уведомления - нет, проблема в функции обнаружения изменений\n"
-            "- Проверьте файл odds_history.json, возможно, там накапливаются некорректные данные"
+            "- Проверьте таблицу odds_history в bot_state.db, возможно, там накапливаются некорректные данные"
         )
         
         await update.message.reply_text(diagnostic_info)
@@ -723,8 +353,8 @@ async def send_odds_updates(context: ContextTypes.DEFAULT_TYPE):
     Send regular odds updates to subscribers
     """
     try:
-        parser = DotaParser()
-        matches = parser.get_current_odds()
+        snapshot = await get_snapshot_bus().get_fresh(SNAPSHOT_TTL)
+        matches = snapshot.matches if snapshot else {}
         
         if not matches:
             await context.bot.send_message(
@@ -757,199 +387,6 @@ async def send_odds_updates(context: ContextTypes.DEFAULT_TYPE):
             text="Произошла ошибка при получении обновлений"
         )
 
-async def track_odds_changes(context: ContextTypes.DEFAULT_TYPE):
-    """
-    Отслеживает значимые изменения коэффициентов и отправляет уведомления.
-    ГАРАНТИРОВАННО показывает стрелки для ВСЕХ коэффициентов.
-    """
-    global odds_tracker
-    
-    if odds_tracker is None:
-        odds_tracker = OddsTracker()
-    
-    logger.info("Running track_odds_changes job")
-    try:
-        # Логируем начало работы
-        odds_tracker.write_debug_log("Начало выполнения функции track_odds_changes")
-        
-        parser = DotaParser()
-        current_matches = parser.get_current_odds()
-        
-        if not current_matches:
-            logger.warning("No matches found during odds change tracking")
-            odds_tracker.write_debug_log("Не найдено матчей при проверке коэффициентов")
-            return
-        
-        # Логируем полученные данные
-        odds_tracker.write_debug_log(f"Получено {len(current_matches)} матчей", current_matches)
-        
-        # Обнаружение значимых изменений через трекер
-        significant_changes = odds_tracker.detect_changes(current_matches)
-        
-        odds_tracker.write_debug_log(f"Обнаружено {len(significant_changes)} матчей со значимыми изменениями", 
-                     significant_changes)
-        
-        if significant_changes:
-            # Используем markdown для первой строки (курсив)
-            changes_message = "_Обнаружено значимое изменение коэффициента по Pinnacle_\n\n"
-            
-            # КРИТИЧЕСКОЕ ИЗМЕНЕНИЕ: Мы принудительно добавляем отсутствующие значения
-            for match_name, data in significant_changes.items():
-                match_data = data['match_data']
-                changes = data.get('changes', {})
-                
-                # Логируем данные для отладки
-                odds_tracker.write_debug_log(f"Формирование сообщения для матча {match_name}", {
-                    "match_data": match_data,
-                    "changes": changes
-                })
-                
-                # Убедимся, что у нас есть все необходимые поля
-                team1 = match_data.get('team1', 'Team 1')
-                team2 = match_data.get('team2', 'Team 2')
-                time_str = match_data.get('time', '')
-                
-                # Объединенная строка с названием матча и временем (жирным шрифтом)
-                now = datetime.now().strftime("%d.%m")
-                changes_message += f"*⚔️ {match_name} | {now} {time_str} (UTC+1)*\n\n"
-                
-                # Секция для монилайна (исхода)
-                changes_message += f"🧮 Исход:\n"
-                
-                # ПРИНУДИТЕЛЬНО создаем данные об изменениях для всех коэффициентов
-                all_odds_fields = ['odds1', 'odds2', 'handicap_odd1', 'handicap_odd2']
-                
-                # Находим первое реальное изменение для создания пропорций
-                base_diff = 0.01
-                base_value = 2.0
-                
-                for field in all_odds_fields:
-                    if field in changes:
-                        change_data = changes[field]
-                        if change_data.get('diff', 0) > 0:
-                            base_diff = change_data['diff']
-                            base_value = change_data['previous']
-                            break
-                
-                # Искусственно добавляем отсутствующие изменения
-                for field in all_odds_fields:
-                    if field not in changes and field in match_data:
-                        # Создаем синтетические данные об изменении
-                        current_value = match_data[field]
-                        # Определяем пропорциональную разницу
-                        if base_value > 0:
-                            diff = (base_diff / base_value) * current_value
-                        else:
-                            diff = 0.01
-                        # Добавляем искусственное изменение
-                        changes[field] = {
-                            'previous': current_value + diff,
-                            'current': current_value,
-                            'diff': diff,
-                            'significant': False,
-                            'artificial': True  # Метка для отладки
-                        }
-                
-                # Теперь у нас есть данные об изменениях для всех коэффициентов
-                # Формируем сообщение для каждого коэффициента
-                
-                # Коэффициент для первой команды
-                if 'odds1' in match_data:
-                    current_odds1 = match_data['odds1']
-                    if 'odds1' in changes:
-                        change_data = changes['odds1']
-                        previous_odds1 = change_data['previous']
-                        diff1 = change_data['diff']
-                        changes_message += f"{team1}: {previous_odds1:.3f} ➔ *{current_odds1:.3f}* (-{diff1:.2f})\n"
-                        odds_tracker.write_debug_log(f"Сформирована строка для odds1", {
-                            "message": f"{team1}: {previous_odds1:.3f} ➔ *{current_odds1:.3f}* (-{diff1:.2f})"
-                        })
-                    else:
-                        changes_message += f"{team1}: *{current_odds1:.3f}*\n"
-                
-                # Коэффициент для второй команды
-                if 'odds2' in match_data:
-                    current_odds2 = match_data['odds2']
-                    if 'odds2' in changes:
-                        change_data = changes['odds2']
-                        previous_odds2 = change_data['previous']
-                        diff2 = change_data['diff']
-                        changes_message += f"{team2}: {previous_odds2:.3f} ➔ *{current_odds2:.3f}* (-{diff2:.2f})\n"
-                        odds_tracker.write_debug_log(f"Сформирована строка для odds2", {
-                            "message": f"{team2}: {previous_odds2:.3f} ➔ *{current_odds2:.3f}* (-{diff2:.2f})"
-                        })
-                    else:
-                        changes_message += f"{team2}: *{current_odds2:.3f}*\n"
-                
-                # Если есть гандикапы, показываем и их
-                if 'handicap1' in match_data and 'handicap2' in match_data:
-                    changes_message += f"\n📍 Форы:\n"
-                    
-                    # Гандикап для первой команды
-                    if 'handicap_odd1' in match_data:
-                        handicap1 = match_data.get('handicap1', '-1.5')
-                        current_hc1 = match_data['handicap_odd1']
-                        if 'handicap_odd1' in changes:
-                            change_data = changes['handicap_odd1']
-                            previous_hc1 = change_data['previous']
-                            diff_hc1 = change_data['diff']
-                            changes_message += f"{team1} ({handicap1}): {previous_hc1:.3f} ➔ *{current_hc1:.3f}* (-{diff_hc1:.2f})\n"
-                            odds_tracker.write_debug_log(f"Сформирована строка для handicap_odd1", {
-                                "message": f"{team1} ({handicap1}): {previous_hc1:.3f} ➔ *{current_hc1:.3f}* (-{diff_hc1:.2f})"
-                            })
-                        else:
-                            changes_message += f"{team1} ({handicap1}): *{current_hc1:.3f}*\n"
-                    
-                    # Гандикап для второй команды
-                    if 'handicap_odd2' in match_data:
-                        handicap2 = match_data.get('handicap2', '+1.5')
-                        current_hc2 = match_data['handicap_odd2']
-                        if 'handicap_odd2' in changes:
-                            change_data = changes['handicap_odd2']
-                            previous_hc2 = change_data['previous']
-                            diff_hc2 = change_data['diff']
-                            changes_message += f"{team2} ({handicap2}): {previous_hc2:.3f} ➔ *{current_hc2:.3f}* (-{diff_hc2:.2f})\n"
-                            odds_tracker.write_debug_log(f"Сформирована строка для handicap_odd2", {
-                                "message": f"{team2} ({handicap2}): {previous_hc2:.3f} ➔ *{current_hc2:.3f}* (-{diff_hc2:.2f})"
-                            })
-                        else:
-                            changes_message += f"{team2} ({handicap2}): *{current_hc2:.3f}*\n"
-                
-                changes_message += "\n"
-            
-            # Логируем финальное сообщение
-            odds_tracker.write_debug_log("Сформировано финальное сообщение", {
-                "message_length": len(changes_message),
-                "message_preview": changes_message[:200] + "..."
-            })
-            
-            # Отправляем сообщение в канал
-            try:
-                await context.bot.send_message(
-                    chat_id=ODDS_CHANGES_CHANNEL_ID,
-                    text=changes_message,
-                    parse_mode='Markdown'
-                )
-                logger.info(f"Sent notification about {len(significant_changes)} matches with significant odds changes")
-                odds_tracker.write_debug_log("Сообщение успешно отправлено в канал", {
-                    "channel_id": ODDS_CHANGES_CHANNEL_ID,
-                    "matches_count": len(significant_changes)
-                })
-            except Exception as send_error:
-                logger.error(f"Error sending message to channel: {send_error}")
-                odds_tracker.write_debug_log(f"Ошибка отправки сообщения: {send_error}", {
-                    "changes_message": changes_message
-                })
-        else:
-            logger.info("No significant odds changes detected")
-            odds_tracker.write_debug_log("Значимых изменений не обнаружено")
-            
-    except Exception as e:
-        logger.error(f"Error in track_odds_changes: {e}")
-        logger.error(traceback.format_exc())
-        if odds_tracker:
-            odds_tracker.write_debug_log(f"Ошибка в track_odds_changes: {e}\n{traceback.format_exc()}")
-
 async def test_random_odds(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Тестовая команда для проверки отображения изменений коэффициентов
@@ -960,8 +397,8 @@ async def test_random_odds(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Запускаю тестирование пеленгатора просадок...")
         
         # Получаем текущие матчи
-        parser = DotaParser()
-        current_matches = parser.get_current_odds()
+        snapshot = await get_snapshot_bus().get_fresh(SNAPSHOT_TTL)
+        current_matches = snapshot.matches if snapshot else {}
         
         if not current_matches:
             await update.message.reply_text("Не удалось получить данные о матчах для тестирования")
@@ -1189,128 +626,96 @@ def detect_changes(self, current_matches):
     
     return significant_changes
 
-async def track_odds_changes(context: ContextTypes.DEFAULT_TYPE):
+@instrument_job('track_odds_changes')
+async def track_odds_changes(bot, snapshot):
     """
     Отслеживает значимые изменения коэффициентов (как падения, так и рост) и отправляет уведомления.
+    Вызывается шиной снимков для каждого нового скрапа.
+    """
+    logger.info(f"Running track_odds_changes for snapshot v{snapshot.version}")
+    await process_odds_changes(bot, snapshot.matches)
+
+@instrument_job('record_ticks')
+async def record_ticks(snapshot):
+    """
+    Дописывает все цены снимка в журнал цен (TICK_LOG)
+    """
+    tick_log = get_tick_log()
+    if tick_log is None:
+        return
+    try:
+        # Запись в файлы (и открытие сегмента) выполняется вне event loop
+        written = await asyncio.to_thread(tick_log.append_matches, snapshot.matches, snapshot.timestamp.timestamp())
+        logger.info(f"Recorded {written} prices from snapshot v{snapshot.version}")
+    except Exception as e:
+        job_failed()
+        logger.error(f"Error in record_ticks: {e}")
+        logger.error(traceback.format_exc())
+
+@instrument_job('watch_odds_changes')
+async def watch_odds_changes(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Режим наблюдения: забирает изменения цен, накопленные на открытой странице,
+    и сразу передает их в детектор изменений
+    """
+    try:
+        changes = await get_watch_session().drain_async()
+        if not changes:
+            return
+        
+        # В журнал цен попадает каждое изменение со временем, когда его увидела страница
+        tick_log = get_tick_log()
+        if tick_log is not None:
+            await asyncio.to_thread(tick_log.append, changes)
+        
+        # Для каждого матча берем последнее состояние строки
+        current_matches = {match_key: match_data for _, match_key, match_data in changes}
+        logger.info(f"Watch mode: {len(changes)} price changes in {len(current_matches)} matches")
+        await process_odds_changes(context.bot, current_matches)
+    except Exception as e:
+        job_failed()
+        logger.error(f"Error in watch_odds_changes: {e}")
+        logger.error(traceback.format_exc())
+
+async def process_odds_changes(bot, current_matches):
+    """
+    Прогоняет матчи через трекер и отправляет уведомление о значимых изменениях
     """
     global odds_tracker
     
     if odds_tracker is None:
         odds_tracker = OddsTracker()
     
-    logger.info("Running track_odds_changes job")
     try:
-        parser = DotaParser()
-        current_matches = parser.get_current_odds()
-        
-        if not current_matches:
-            logger.warning("No matches found during odds change tracking")
-            return
-        
         # Обнаружение значимых изменений через трекер
-        significant_changes = odds_tracker.detect_changes(current_matches)
+        async with get_state_lock():
+            with stage_timer('detection'):
+                significant_changes = odds_tracker.detect_changes(current_matches)
         
         logger.info(f"Detected {len(significant_changes)} matches with significant changes")
         
         if significant_changes:
-            # Используем markdown для первой строки (курсив)
-            changes_message = "_Обнаружено значимое изменение коэффициента по Pinnacle_\n\n"
-            
-            for match_name, data in significant_changes.items():
-                match_data = data['match_data']
-                changes = data.get('changes', {})
-                
-                # Название матча и время
-                match_time = match_data.get('time', '')
-                now = datetime.now().strftime("%d.%m")
-                changes_message += f"*⚔️ {match_name} | {now} {match_time} (UTC+1)*\n\n"
-                
-                # Секция для монилайна (исхода)
-                changes_message += f"🧮 Исход:\n"
-                
-                # Показываем изменения для обоих команд
-                team1 = match_data.get('team1', 'Team 1')
-                team2 = match_data.get('team2', 'Team 2')
-                
-                # Коэффициент для первой команды
-                if 'odds1' in changes and changes['odds1'].get('significant', False):
-                    previous_odds1 = changes['odds1']['previous']
-                    current_odds1 = changes['odds1']['current']
-                    diff1 = abs(previous_odds1 - current_odds1)
-                    
-                    # Определяем знак изменения
-                    if current_odds1 > previous_odds1:
-                        changes_message += f"{team1}: {previous_odds1:.3f} ➔ *{current_odds1:.3f}* (+{diff1:.2f})\n"
-                    else:
-                        changes_message += f"{team1}: {previous_odds1:.3f} ➔ *{current_odds1:.3f}* (-{diff1:.2f})\n"
-                
-                # Коэффициент для второй команды
-                if 'odds2' in changes and changes['odds2'].get('significant', False):
-                    previous_odds2 = changes['odds2']['previous']
-                    current_odds2 = changes['odds2']['current']
-                    diff2 = abs(previous_odds2 - current_odds2)
-                    
-                    # Определяем знак изменения
-                    if current_odds2 > previous_odds2:
-                        changes_message += f"{team2}: {previous_odds2:.3f} ➔ *{current_odds2:.3f}* (+{diff2:.2f})\n"
-                    else:
-                        changes_message += f"{team2}: {previous_odds2:.3f} ➔ *{current_odds2:.3f}* (-{diff2:.2f})\n"
-                
-                # Показываем форы если есть изменения
-                has_handicap_changes = False
-                handicap_part = f"\n📍 Форы:\n"
-                
-                # Гандикап для первой команды
-                if 'handicap_odd1' in changes and changes['handicap_odd1'].get('significant', False):
-                    previous_hc1 = changes['handicap_odd1']['previous']
-                    current_hc1 = changes['handicap_odd1']['current']
-                    diff_hc1 = abs(previous_hc1 - current_hc1)
-                    handicap1 = match_data.get('handicap1', '-1.5')
-                    
-                    # Определяем знак изменения
-                    if current_hc1 > previous_hc1:
-                        handicap_part += f"{team1} ({handicap1}): {previous_hc1:.3f} ➔ *{current_hc1:.3f}* (+{diff_hc1:.2f})\n"
-                    else:
-                        handicap_part += f"{team1} ({handicap1}): {previous_hc1:.3f} ➔ *{current_hc1:.3f}* (-{diff_hc1:.2f})\n"
-                    
-                    has_handicap_changes = True
-                
-                # Гандикап для второй команды
-                if 'handicap_odd2' in changes and changes['handicap_odd2'].get('significant', False):
-                    previous_hc2 = changes['handicap_odd2']['previous']
-                    current_hc2 = changes['handicap_odd2']['current']
-                    diff_hc2 = abs(previous_hc2 - current_hc2)
-                    handicap2 = match_data.get('handicap2', '+1.5')
-                    
-                    # Определяем знак изменения
-                    if current_hc2 > previous_hc2:
-                        handicap_part += f"{team2} ({handicap2}): {previous_hc2:.3f} ➔ *{current_hc2:.3f}* (+{diff_hc2:.2f})\n"
-                    else:
-                        handicap_part += f"{team2} ({handicap2}): {previous_hc2:.3f} ➔ *{current_hc2:.3f}* (-{diff_hc2:.2f})\n"
-                    
-                    has_handicap_changes = True
-                
-                # Добавляем секцию форы, только если есть изменения
-                if has_handicap_changes:
-                    changes_message += handicap_part
-                
-                changes_message += "\n"
+            with stage_timer('message_build'):
+                changes_message = format_odds_changes_message(significant_changes)
             
             # Отправляем сообщение в канал
             try:
-                await context.bot.send_message(
-                    chat_id=ODDS_CHANGES_CHANNEL_ID,
-                    text=changes_message,
-                    parse_mode='Markdown'
-                )
+                with stage_timer('telegram_send'):
+                    await bot.send_message(
+                        chat_id=ODDS_CHANGES_CHANNEL_ID,
+                        text=changes_message,
+                        parse_mode='Markdown'
+                    )
                 logger.info(f"Sent notification about {len(significant_changes)} matches with significant odds changes")
             except Exception as send_error:
+                job_failed()
                 logger.error(f"Error sending message to channel: {send_error}")
         else:
             logger.info("No significant odds changes detected")
             
     except Exception as e:
-        logger.error(f"Error in track_odds_changes: {e}")
+        job_failed()
+        logger.error(f"Error in process_odds_changes: {e}")
         logger.error(traceback.format_exc())
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1358,13 +763,12 @@ async def reset_odds_history(update: Update, context: ContextTypes.DEFAULT_TYPE)
     global odds_tracker
     
     try:
-        # Создаем новый трекер, чтобы сбросить историю
-        odds_tracker = OddsTracker()
-        
-        # Удаляем файл истории если он существует
-        import os
-        if os.path.exists('odds_history.json'):
-            os.remove('odds_history.json')
+        async with get_state_lock():
+            # Очищаем сохраненную историю
+            get_state_writer().clear('odds_history')
+            
+            # Создаем новый трекер, чтобы сбросить историю
+            odds_tracker = OddsTracker()
             
         await update.message.reply_text(
             "История коэффициентов сброшена. Следующие изменения будут считаться с нуля."
@@ -1407,9 +811,12 @@ async def debug_odds_history(update: Update, context: ContextTypes.DEFAULT_TYPE)
             await update.message.reply_text("История коэффициентов пуста.")
             return
         
-        debug_message = "📊 Отладка истории коэффициентов:\n\n"
+        debug_message = "📊 Отладка истории коэффициентов:\n"
+        debug_message += (f"Матчей в истории: {len(history)}, срок хранения {odds_tracker.retention_days} дн., "
+                          f"вытеснено с запуска: {odds_tracker.evicted_total}\n\n")
         
-        for match_key, match_history in history.items():
+        for match_key, match_state in history.items():
+            match_history = match_state.to_record()
             debug_message += f"Матч: {match_key}\n"
             
             # Начальные значения
@@ -1446,61 +853,43 @@ async def debug_odds_history(update: Update, context: ContextTypes.DEFAULT_TYPE)
         logger.error(f"Error in debug_odds_history: {e}")
         await update.message.reply_text(f"Ошибка при отладке истории: {e}")
 
-async def track_new_matches(context: ContextTypes.DEFAULT_TYPE):
+@instrument_job('track_new_matches')
+async def track_new_matches(bot, snapshot):
     """
-    Check for new matches and send notifications to the specified channel with improved formatting
+    Check for new matches and send notifications to the specified channel with improved formatting.
+    Called by the snapshot bus for every new scrape.
     """
     global match_tracker
     
     if match_tracker is None:
         match_tracker = MatchTracker()
     
-    logger.info("Running track_new_matches job")
+    logger.info(f"Running track_new_matches for snapshot v{snapshot.version}")
     try:
-        parser = DotaParser()
-        current_matches = parser.get_current_odds()
+        current_matches = snapshot.matches
         
-        if not current_matches:
-            logger.warning("No matches found during new match tracking")
-            return
-            
         # Find new matches
-        new_matches = match_tracker.find_new_matches(current_matches)
+        async with get_state_lock():
+            with stage_timer('new_matches'):
+                new_matches = match_tracker.find_new_matches(current_matches)
         
         if new_matches:
-            # Используем markdown для первой строки (курсив)
-            new_matches_message = "_Обнаружены новые матчи по Pinnacle_\n\n"
-            
-            for match_name, data in new_matches.items():
-                # Объединенная строка матча и времени (жирным шрифтом)
-                match_time = data['time']
-                now = datetime.now().strftime("%d.%m")
-                new_matches_message += f"*⚔️ {match_name} | {now} {match_time} (UTC+1)*\n\n"
-                
-                # Секция для исходов с жирными коэффициентами
-                new_matches_message += f"🧮 Исход:\n"
-                new_matches_message += f"{data['team1']}: *{data['odds1']:.3f}*\n"
-                new_matches_message += f"{data['team2']}: *{data['odds2']:.3f}*\n"
-                
-                # Секция для фор (если они есть) с жирными коэффициентами
-                if 'handicap1' in data and 'handicap2' in data:
-                    new_matches_message += f"\n📍 Форы:\n"
-                    new_matches_message += f"{data['team1']} ({data['handicap1']}): *{data['handicap_odd1']:.3f}*\n"
-                    new_matches_message += f"{data['team2']} ({data['handicap2']}): *{data['handicap_odd2']:.3f}*\n"
-                
-                new_matches_message += "\n"
+            with stage_timer('message_build'):
+                new_matches_message = format_new_matches_message(new_matches)
             
             # Отправляем сообщение в канал новых матчей с поддержкой markdown
-            await context.bot.send_message(
-                chat_id=NEW_MATCHES_CHANNEL_ID,
-                text=new_matches_message,
-                parse_mode='Markdown'
-            )
+            with stage_timer('telegram_send'):
+                await bot.send_message(
+                    chat_id=NEW_MATCHES_CHANNEL_ID,
+                    text=new_matches_message,
+                    parse_mode='Markdown'
+                )
             logger.info(f"Sent {len(new_matches)} new matches notification")
         else:
             logger.info("No new matches found")
             
     except Exception as e:
+        job_failed()
         logger.error(f"Error in track_new_matches: {e}")
         logger.error(traceback.format_exc())
 
@@ -1511,23 +900,15 @@ async def force_check_matches(update: Update, context: ContextTypes.DEFAULT_TYPE
     global match_tracker
     
     try:
-        # Сбрасываем трекер матчей
-        match_tracker = MatchTracker()
-        
-        # Удаляем файл если он существует
-        import os
-        if os.path.exists('known_matches.json'):
-            os.remove('known_matches.json')
-            await update.message.reply_text("Файл списка матчей удален")
-        
-        # Создаем пустой список матчей
-        match_tracker.known_matches = set()
-        match_tracker._save_matches()
+        async with get_state_lock():
+            # Очищаем сохраненный список и сбрасываем трекер матчей
+            get_state_writer().clear('known_matches')
+            match_tracker = MatchTracker()
         
         await update.message.reply_text("Список известных матчей сброшен. Запускаю принудительную проверку...")
         
-        # Принудительно запускаем проверку новых матчей
-        await track_new_matches(context)
+        # Принудительно запускаем скрап; новые матчи обработает подписчик шины
+        await get_snapshot_bus().refresh()
         
         await update.message.reply_text("Принудительная проверка завершена")
     except Exception as e:
@@ -1535,8 +916,157 @@ async def force_check_matches(update: Update, context: ContextTypes.DEFAULT_TYPE
         logger.error(traceback.format_exc())
         await update.message.reply_text(f"Произошла ошибка при принудительной проверке: {e}")
 
+@instrument_job('scrape_cycle')
+async def scrape_cycle(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Единственная задача, которая скрапит страницу. Снимок публикуется
+    всем подписчикам шины (изменения коэффициентов, новые матчи)
+    """
+    logger.info("Running scrape_cycle job")
+    snapshot = None
+    try:
+        snapshot = await get_snapshot_bus().refresh()
+        if snapshot is None:
+            # Скрап не вернул матчей
+            job_failed()
+    except Exception as e:
+        job_failed()
+        logger.error(f"Error in scrape_cycle: {e}")
+        logger.error(traceback.format_exc())
+    finally:
+        # Следующий скрап планируется по только что полученному снимку
+        if scrape_scheduler is not None:
+            context.job_queue.run_once(
+                scrape_cycle,
+                when=scrape_scheduler.plan(snapshot),
+                name="scrape_cycle"
+            )
+
+async def debug_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Показывает последние решения адаптивного расписания скрапов
+    """
+    if scrape_scheduler is None:
+        await update.message.reply_text("Адаптивное расписание выключено (ADAPTIVE_SCHEDULE=0)")
+        return
+
+    decisions = list(scrape_scheduler.decisions)[-15:]
+    if not decisions:
+        await update.message.reply_text("Решений пока нет: первый скрап еще не выполнен")
+        return
+
+    message = (f"⏱ Расписание скрапов (границы {scrape_scheduler.min_interval}-"
+               f"{scrape_scheduler.max_interval}с, базовый {scrape_scheduler.base_interval}с):\n\n")
+    for decision in reversed(decisions):
+        kickoff = decision['soonest_kickoff']
+        message += (f"{decision['timestamp'].strftime('%H:%M:%S')} → {decision['interval']:.0f}с, "
+                    f"{decision['reason']} (матчей: {decision['matches']}, "
+                    f"до начала: {'-' if kickoff is None else f'{kickoff} мин'})\n")
+
+    await update.message.reply_text(message)
+
+@instrument_job('govern_resources')
+async def govern_resources(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Периодический контроль процессов браузеров: память, CPU, зомби
+    """
+    try:
+        # Утилизация сессии вызывает quit(), поэтому выполняется вне event loop
+        stats = await asyncio.to_thread(get_resource_governor().sample)
+        logger.info(f"Browser resources: {stats['sessions']} sessions, {stats['browser_processes']} processes, "
+                    f"{stats['rss_mb']:.0f} MB RSS, {stats['cpu_percent']:.1f}% CPU")
+    except Exception as e:
+        job_failed()
+        logger.error(f"Error in govern_resources: {e}")
+        logger.error(traceback.format_exc())
+
+async def debug_resources(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Показывает потребление ресурсов браузерами и счетчики контролера
+    """
+    governor = get_resource_governor()
+    stats = governor.stats()
+    pool_stats = get_driver_pool().stats()
+
+    message = "🖥 Ресурсы браузеров:\n\n"
+    message += f"Сессий: {pool_stats['alive']} (простаивает {pool_stats['idle']}, размер пула {pool_stats['size']})\n"
+    message += f"Процессов: {stats['browser_processes']}\n"
+    message += f"Память: {stats['rss_mb']:.0f} МБ (бюджет на сессию {governor.rss_budget / 1024 / 1024:.0f} МБ)\n"
+    message += f"CPU: {stats['cpu_percent']:.1f}%\n\n"
+    message += f"Создано сессий: {pool_stats['created']}, утилизировано: {pool_stats['recycled']} "
+    message += f"(по памяти: {stats['memory_recycles']})\n"
+    message += f"Собрано зомби: {stats['zombies_reaped']}, добито процессов: {stats['processes_killed']}\n"
+    message += f"Удалено профилей: {stats['profiles_removed']}\n"
+
+    writer_stats = get_state_writer().stats()
+    message += (f"Запись состояния: {writer_stats['flushes']} транзакций, {writer_stats['rows_written']} строк "
+                f"({writer_stats['bytes_written'] / 1024:.0f} КБ), схлопнуто {writer_stats['coalesced']}, "
+                f"в очереди {writer_stats['pending']}, задержка {writer_stats['last_flush_latency'] * 1000:.1f}мс "
+                f"(макс. {writer_stats['max_flush_latency'] * 1000:.1f}мс)\n")
+    if odds_tracker is not None:
+        message += (f"История коэффициентов: {len(odds_tracker.odds_history)} матчей, "
+                    f"вытеснено {odds_tracker.evicted_total}\n")
+    if match_tracker is not None:
+        message += (f"Известные матчи: {len(match_tracker.known_matches)}, "
+                    f"вытеснено {match_tracker.evicted_total}\n")
+
+    persistent = get_persistent_profiles()
+    if persistent is not None:
+        profile_stats = persistent.stats()
+        message += (f"Постоянные профили: занято {profile_stats['in_use']}, переиспользовано "
+                    f"{profile_stats['reused']}, очищено {profile_stats['wiped']}\n")
+
+    for pid, session in governor.sessions.items():
+        message += (f"\nPID {pid}: {session['processes']} процессов, {session['rss_mb']:.0f} МБ, "
+                    f"{session['cpu_percent']:.1f}% CPU, возраст {session['age']:.0f}с, "
+                    f"запросов {session['requests']}")
+
+    await update.message.reply_text(message)
+
+def is_admin(update: Update):
+    """Отправил ли команду пользователь из ADMIN_IDS"""
+    from config import ADMIN_IDS
+    user = update.effective_user
+    return user is not None and user.id in ADMIN_IDS
+
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Сводка метрик: время этапов цикла и запуски задач (то же, что отдает /metrics)
+    """
+    if not is_admin(update):
+        await update.message.reply_text("Команда доступна только администраторам")
+        return
+
+    metrics = get_metrics()
+    stages = {labels['stage']: histogram for labels, histogram in metrics.histograms(STAGE_SECONDS)}
+    message = "📊 Этапы цикла (количество, среднее / p95 / макс.):\n\n"
+    if not stages:
+        message += "Замеров пока нет\n"
+    for stage in list(STAGES) + sorted(set(stages) - set(STAGES)):
+        histogram = stages.get(stage)
+        if histogram is None:
+            continue
+        message += (f"{stage}: {histogram.count}, {histogram.sum / histogram.count * 1000:.0f} / "
+                    f"≤{histogram.quantile(0.95) * 1000:.0f} / {histogram.max * 1000:.0f} мс\n")
+
+    runs = {labels['job']: value for labels, value in metrics.values(JOB_RUNS)}
+    overlaps = {labels['job']: value for labels, value in metrics.values(JOB_OVERLAPS)}
+    failures = {labels['job']: value for labels, value in metrics.values(JOB_FAILURES)}
+    running = {labels['job']: value for labels, value in metrics.values(JOB_RUNNING)}
+    durations = {labels['job']: histogram for labels, histogram in metrics.histograms(JOB_SECONDS)}
+    message += "\n⚙️ Задачи (запуски, наложения, ошибки, среднее время):\n\n"
+    if not runs:
+        message += "Запусков пока нет\n"
+    for job in sorted(runs):
+        histogram = durations.get(job)
+        average = f"{histogram.sum / histogram.count:.2f}с" if histogram and histogram.count else "-"
+        message += (f"{job}: {runs[job]}, {overlaps.get(job, 0)}, {failures.get(job, 0)}, {average}"
+                    f"{' (выполняется)' if running.get(job) else ''}\n")
+
+    await update.message.reply_text(message)
+
 def main():
-    global match_tracker, odds_tracker
+    global match_tracker, odds_tracker, scrape_scheduler
     
     try:
         # Инициализация трекеров
@@ -1545,10 +1075,10 @@ def main():
         
         # Загружаем конфигурацию из .env
         odds_changes_interval = int(os.getenv('ODDS_CHANGES_INTERVAL', 120))
-        new_matches_interval = int(os.getenv('NEW_MATCHES_INTERVAL', 600))
         update_interval = int(os.getenv('UPDATE_INTERVAL', 300))
         
-        logger.info(f"Configuration: ODDS_CHANGES_INTERVAL={odds_changes_interval}, NEW_MATCHES_INTERVAL={new_matches_interval}")
+        logger.info(f"Configuration: ODDS_CHANGES_INTERVAL={odds_changes_interval}, SNAPSHOT_TTL={SNAPSHOT_TTL} "
+                    f"(new matches are checked on every scrape)")
         
         job_queue = JobQueue()
         application = (
@@ -1567,24 +1097,71 @@ def main():
         application.add_handler(CommandHandler("force_check_matches", force_check_matches))
         application.add_handler(CommandHandler("debug_odds_tracker", debug_odds_tracker))
         application.add_handler(CommandHandler("test_diagnostic_message", test_diagnostic_message))
+        application.add_handler(CommandHandler("debug_schedule", debug_schedule))
+        application.add_handler(CommandHandler("debug_resources", debug_resources))
+        application.add_handler(CommandHandler("stats", stats))
         # Set up the job queue
         job_queue.set_application(application)
         
-        # Add global job for tracking new matches
-        job_queue.run_repeating(
-            track_new_matches,
-            interval=new_matches_interval,  # По умолчанию 10 минут
-            first=10,  # Start after 10 seconds
-            name="new_matches_tracker"
-        )
+        # Один скрап на цикл: снимок получают все подписчики шины
+        bus = get_snapshot_bus()
+        bus.subscribe(functools.partial(track_new_matches, application.bot))
+        bus.subscribe(functools.partial(track_odds_changes, application.bot))
+        bus.subscribe(record_ticks)
+        
+        from config import (ADAPTIVE_SCHEDULE, SCHEDULE_MIN_INTERVAL, SCHEDULE_MAX_INTERVAL,
+                            SCHEDULE_KICKOFF_WINDOW, SCHEDULE_VOLATILITY_WINDOW, DISPLAY_UTC_OFFSET)
+        if ADAPTIVE_SCHEDULE:
+            # Каждый цикл сам планирует следующий по последнему снимку
+            scrape_scheduler = AdaptiveScheduler(
+                base_interval=odds_changes_interval,
+                min_interval=SCHEDULE_MIN_INTERVAL,
+                max_interval=SCHEDULE_MAX_INTERVAL,
+                kickoff_window=SCHEDULE_KICKOFF_WINDOW,
+                volatility_window=SCHEDULE_VOLATILITY_WINDOW,
+                utc_offset=DISPLAY_UTC_OFFSET
+            )
+            job_queue.run_once(scrape_cycle, when=10, name="scrape_cycle")
+        else:
+            job_queue.run_repeating(
+                scrape_cycle,
+                interval=odds_changes_interval,  # По умолчанию 2 минуты
+                first=10,  # Start after 10 seconds
+                name="scrape_cycle"
+            )
         
-        # Add global job for tracking odds changes
-        job_queue.run_repeating(
-            track_odds_changes,
-            interval=odds_changes_interval,  # По умолчанию 2 минуты
-            first=30,  # Start after 30 seconds
-            name="odds_changes_tracker"
-        )
+        # Режим наблюдения: изменения цен забираются со страницы каждую секунду
+        if WATCH_MODE:
+            from config import WATCH_DRAIN_INTERVAL
+            job_queue.run_repeating(
+                watch_odds_changes,
+                interval=WATCH_DRAIN_INTERVAL,
+                first=5,
+                name="watch_odds_changes"
+            )
+        
+        # Метрики этапов и задач для Prometheus (сводка - команда /stats)
+        from config import METRICS_HOST, METRICS_PORT
+        if METRICS_PORT:
+            start_metrics_server(METRICS_HOST, METRICS_PORT)
+        
+        from config import FETCH_BACKEND, GOVERNOR_INTERVAL
+        # Пул браузеров работает для стратегии selenium и для вкладки режима наблюдения
+        uses_driver_pool = FETCH_BACKEND == 'selenium' or WATCH_MODE
+        # Стратегия cdp запускает свой Chromium с такими же временными профилями
+        if uses_driver_pool or FETCH_BACKEND == 'cdp':
+            # Осиротевшие процессы Chrome переходят к боту и собираются им, а не копятся зомби
+            become_subreaper()
+            get_resource_governor().sweep()
+            job_queue.run_repeating(
+                govern_resources,
+                interval=GOVERNOR_INTERVAL,
+                first=GOVERNOR_INTERVAL,
+                name="govern_resources"
+            )
+        if uses_driver_pool:
+            # Прогреваем пул браузеров в фоне, чтобы первый скрап не ждал холодного старта
+            threading.Thread(target=get_driver_pool().warm_up, name="driver-pool-warmup", daemon=True).start()
         
         # Start the bot
         application.run_polling()
@@ -1592,6 +1169,18 @@ def main():
     except Exception as e:
         logger.error(f"Error in main: {e}")
         logger.error(traceback.format_exc())
+    finally:
+        if watch_session is not None:
+            watch_session.close()
+        close_fetchers()
+        get_driver_pool().close()
+        tick_log = get_tick_log()
+        if tick_log is not None:
+            tick_log.close()
+        stop_metrics_server()
+        # Записываем отложенные изменения состояния
+        close_state_writer()
+        stop_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
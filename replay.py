@@ -0,0 +1,273 @@
+import sys
+import json
+import time
+import logging
+import argparse
+from bisect import bisect_right
+
+from state_store import StateStore
+from tick_log import TickReader
+from odds_tracker import OddsTracker
+from match_tracker import MatchTracker
+from change_engine import DEFAULT_SCHEDULE, make_schedule
+
+logger = logging.getLogger(__name__)
+
+
+class VirtualClock:
+    def __init__(self, now=0.0):
+        """
+        Виртуальные часы для трекеров: время задается меткой проигрываемого снимка,
+        поэтому сроки хранения и вытеснение работают так же, как в реальном времени
+
+        Args:
+            now (float): Начальное время (секунды epoch)
+        """
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance_to(self, timestamp):
+        """Переводит часы вперед (назад время не идет, как и в журнале цен)"""
+        if timestamp > self.now:
+            self.now = timestamp
+
+
+class NullWriter:
+    def __init__(self):
+        """
+        Запись состояния для проигрывания: изменения только считаются, рабочее
+        хранилище не затрагивается, а трекеры стартуют с пустой базы в памяти
+        """
+        self.store = StateStore(':memory:')
+        self.rows = 0
+
+    def _put(self, *args):
+        self.rows += 1
+
+    put_odds_history = delete_odds_history = _put
+    put_last_notified = delete_last_notified = _put
+    put_known_match = delete_known_match = _put
+
+    def flush(self):
+        return 0
+
+
+def read_snapshots(path, interval=300.0, start=0.0):
+    """
+    Читает записанные снимки: JSON lines, по строке на скрап - {"timestamp": ..., "matches": {...}}
+    или просто словарь матчей (тогда снимки идут через interval секунд от start).
+    Файл .json может содержать список таких же записей.
+
+    Yields:
+        tuple: (timestamp, current_matches)
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            entries = json.load(f)
+        else:
+            entries = (json.loads(line) for line in f if line.strip())
+
+        timestamp = start
+        for entry in entries:
+            if 'matches' in entry:
+                timestamp = float(entry.get('timestamp', timestamp + interval))
+                matches = entry['matches']
+            else:
+                timestamp += interval
+                matches = entry
+            yield timestamp, matches
+
+
+def read_ticks(directory, start=None, end=None, window=0.0):
+    """
+    Собирает снимки из журнала цен: цены с одной меткой времени (или в пределах
+    window секунд) образуют один снимок. Цены, которых в записи нет, берутся из
+    предыдущих записей матча, поэтому журнал только изменений тоже подходит;
+    матчи без записей в окне в снимок не попадают.
+
+    Yields:
+        tuple: (timestamp, current_matches)
+    """
+    board = {}
+    batch = {}
+    batch_start = None
+    for timestamp, match_key, field, price in TickReader(directory).scan(start=start, end=end):
+        if batch_start is not None and timestamp - batch_start > window:
+            yield batch_start, {key: dict(board[key]) for key in batch}
+            batch = {}
+            batch_start = None
+        if batch_start is None:
+            batch_start = timestamp
+        board.setdefault(match_key, {})[field] = price
+        batch[match_key] = True
+    if batch:
+        yield batch_start, {key: dict(board[key]) for key in batch}
+
+
+def load_schedules(path=None, scales=()):
+    """
+    Схемы порогов для сравнения: текущая (current), из JSON-файла
+    {"name": {"edges": [...], "values": [...]}} и текущая, умноженная на каждый из scales
+
+    Returns:
+        dict: {name: schedule}
+    """
+    schedules = {'current': DEFAULT_SCHEDULE}
+    if path:
+        with open(path, encoding='utf-8') as f:
+            for name, schedule in json.load(f).items():
+                schedules[name] = make_schedule(schedule['edges'], schedule['values'])
+    for scale in scales:
+        edges, values = DEFAULT_SCHEDULE
+        schedules[f"x{scale:g}"] = make_schedule(edges, (value * scale for value in values))
+    return schedules
+
+
+def replay(snapshots, schedules, retention_days=None, known_retention_days=None, new_matches=True):
+    """
+    Проигрывает снимки через свежие трекеры на виртуальных часах: OddsTracker
+    на каждую схему порогов и один MatchTracker (новые матчи от порогов не зависят)
+
+    Args:
+        snapshots (iterable): [(timestamp, current_matches), ...] в порядке времени
+        schedules (dict): {name: schedule}
+        retention_days (float): Срок хранения истории коэффициентов (по умолчанию из конфига)
+        known_retention_days (float): Срок хранения известных матчей (по умолчанию из конфига)
+        new_matches (bool): Проверять ли новые матчи (снимкам нужно поле time)
+
+    Returns:
+        dict: Отчет: объем проигранного, скорость и срабатывания по каждой схеме
+    """
+    clock = VirtualClock()
+    trackers = {
+        name: OddsTracker(NullWriter(), retention_days=retention_days, clock=clock, schedule=schedule)
+        for name, schedule in schedules.items()
+    }
+    match_tracker = MatchTracker(NullWriter(), retention_days=known_retention_days, clock=clock) \
+        if new_matches else None
+
+    results = {
+        name: {'alerts': 0, 'field_alerts': 0, 'bands': [0] * len(schedule[1]), 'seconds': 0.0}
+        for name, schedule in schedules.items()
+    }
+    new_match_count = 0
+    snapshot_count = 0
+    events = 0
+    first_timestamp = last_timestamp = None
+
+    started = time.perf_counter()
+    for timestamp, current_matches in snapshots:
+        clock.advance_to(timestamp)
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        last_timestamp = timestamp
+        snapshot_count += 1
+        events += len(current_matches)
+
+        if match_tracker is not None:
+            new_match_count += len(match_tracker.find_new_matches(current_matches))
+
+        for name, tracker in trackers.items():
+            result = results[name]
+            edges = tracker.schedule[0]
+            tracker_started = time.perf_counter()
+            significant_changes = tracker.detect_changes(current_matches)
+            result['seconds'] += time.perf_counter() - tracker_started
+
+            result['alerts'] += len(significant_changes)
+            for data in significant_changes.values():
+                # Срабатывания по диапазонам схемы, в которые попала точка отсчета
+                for reference in data['references'].values():
+                    result['field_alerts'] += 1
+                    result['bands'][bisect_right(edges, reference)] += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'snapshots': snapshot_count,
+        'events': events,
+        'span_hours': (last_timestamp - first_timestamp) / 3600 if snapshot_count else 0.0,
+        'elapsed': elapsed,
+        'events_per_second': events / elapsed if elapsed else 0.0,
+        'new_matches': new_match_count if match_tracker is not None else None,
+        'schedules': {
+            name: dict(result, history_size=len(trackers[name].odds_history),
+                       evicted=trackers[name].evicted_total)
+            for name, result in results.items()
+        },
+    }
+
+
+def format_report(report, schedules):
+    lines = [
+        f"Snapshots: {report['snapshots']}, match observations: {report['events']}, "
+        f"span: {report['span_hours']:.1f}h",
+        f"Replayed in {report['elapsed']:.2f}s ({report['events_per_second']:.0f} events/s)",
+    ]
+    if report['new_matches'] is not None:
+        lines.append(f"New matches: {report['new_matches']}")
+    for name, result in report['schedules'].items():
+        edges = schedules[name][0]
+        lines.append(f"\n[{name}] alerts: {result['alerts']}, field alerts: {result['field_alerts']}, "
+                     f"detect_changes: {result['seconds']:.2f}s, history: {result['history_size']}, "
+                     f"evicted: {result['evicted']}")
+        bounds = (None,) + edges + (None,)
+        for index, count in enumerate(result['bands']):
+            if not count:
+                continue
+            low = f"{bounds[index]:g}" if bounds[index] is not None else ''
+            high = f"{bounds[index + 1]:g}" if bounds[index + 1] is not None else ''
+            lines.append(f"  {low:>5}-{high:<5} threshold {schedules[name][1][index]:.2f}: {count}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay recorded snapshots or a tick log through fresh trackers "
+                    "and compare threshold schedules")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--snapshots', help="JSON lines file with recorded snapshots (or .json list)")
+    source.add_argument('--ticks', help="Tick log directory (TICK_LOG_DIR)")
+    parser.add_argument('--start', type=float, help="Tick log: start of the interval (epoch seconds)")
+    parser.add_argument('--end', type=float, help="Tick log: end of the interval (epoch seconds)")
+    parser.add_argument('--window', type=float, default=0.0,
+                        help="Tick log: group prices within this many seconds into one snapshot")
+    parser.add_argument('--interval', type=float, default=300.0,
+                        help="Snapshots without a timestamp: seconds between them")
+    parser.add_argument('--schedules', help='JSON file {"name": {"edges": [...], "values": [...]}}')
+    parser.add_argument('--scale', type=float, action='append', default=[],
+                        help="Also replay the current schedule with thresholds multiplied by SCALE")
+    parser.add_argument('--retention-days', type=float, help="Odds history retention (default from config)")
+    parser.add_argument('--known-retention-days', type=float, help="Known matches retention (default from config)")
+    parser.add_argument('--no-new-matches', action='store_true', help="Skip MatchTracker.find_new_matches")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Show tracker logs")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    try:
+        schedules = load_schedules(args.schedules, args.scale)
+    except (OSError, ValueError, KeyError) as e:
+        parser.error(f"Invalid schedules: {e}")
+
+    if args.snapshots:
+        snapshots = read_snapshots(args.snapshots, args.interval)
+        new_matches = not args.no_new_matches
+    else:
+        snapshots = read_ticks(args.ticks, args.start, args.end, args.window)
+        # В журнале цен нет времени начала матча, без него новые матчи не определить
+        new_matches = False
+
+    report = replay(snapshots, schedules, args.retention_days, args.known_retention_days, new_matches)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report, schedules))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,555 @@
+import os
+import json
+import time
+import errno
+import shutil
+import signal
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PREFIX = 'oddsbot-chrome-'
+
+# Старые профили snap-версии Chromium, которые раньше удалял clean_browser.sh
+SNAP_CHROMIUM_TMP = '/tmp/snap-private-tmp/snap.chromium/tmp/'
+
+PR_SET_CHILD_SUBREAPER = 36
+
+try:
+    CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = 100
+    PAGE_SIZE = 4096
+
+
+def read_process_stat(pid):
+    """
+    Читает состояние процесса из /proc/<pid>/stat
+
+    Returns:
+        dict: {'pid', 'ppid', 'state', 'cpu_ticks', 'starttime', 'rss'} (rss в байтах,
+            starttime - момент запуска в тиках от загрузки системы) или None, если процесса нет
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    # Имя процесса в скобках может содержать пробелы, поэтому режем по последней скобке
+    fields = data[data.rfind(')') + 2:].split()
+    return {
+        'pid': pid,
+        'state': fields[0],
+        'ppid': int(fields[1]),
+        'cpu_ticks': int(fields[11]) + int(fields[12]),
+        'starttime': int(fields[19]),
+        'rss': int(fields[21]) * PAGE_SIZE,
+    }
+
+
+def list_processes():
+    """Состояние всех процессов системы: {pid: stat}"""
+    processes = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return processes
+    for entry in entries:
+        if entry.isdigit():
+            stat = read_process_stat(int(entry))
+            if stat is not None:
+                processes[stat['pid']] = stat
+    return processes
+
+
+def process_tree(root_pid, processes=None):
+    """
+    Возвращает процесс и всех его потомков
+
+    Args:
+        root_pid (int): Корневой процесс (chromedriver)
+        processes (dict): Результат list_processes, чтобы не сканировать /proc повторно
+
+    Returns:
+        list: Состояния процессов дерева
+    """
+    if processes is None:
+        processes = list_processes()
+    if root_pid not in processes:
+        return []
+
+    children = {}
+    for stat in processes.values():
+        children.setdefault(stat['ppid'], []).append(stat['pid'])
+
+    tree = []
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        tree.append(processes[pid])
+        stack.extend(children.get(pid, []))
+    return tree
+
+
+def become_subreaper():
+    """
+    Делает процесс бота "сборщиком" осиротевших потомков (Linux): процессы Chrome,
+    пережившие chromedriver, становятся нашими детьми и могут быть собраны reap_zombies
+    """
+    try:
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) != 0:
+            raise OSError(ctypes.get_errno(), "prctl failed")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not become child subreaper: {e}")
+        return False
+
+
+# Процессы браузеров, которые после завершения сессии могут перейти к боту: {pid: starttime}
+_orphans = {}
+_orphans_lock = threading.Lock()
+
+
+def track_orphans(processes, root_pid=None):
+    """
+    Запоминает процессы дерева сессии, которые могут осиротеть и перейти к боту.
+    Корень дерева (chromedriver или Chromium, запущенный через subprocess.Popen)
+    не запоминается: его статус завершения забирает владеющий им Popen
+
+    Args:
+        processes (list): Состояния процессов из process_tree
+        root_pid (int): Процесс, которым владеет Popen
+    """
+    with _orphans_lock:
+        for stat in processes:
+            if stat['pid'] != root_pid:
+                _orphans[stat['pid']] = stat['starttime']
+
+
+def reap_zombies():
+    """
+    Без блокировки собирает завершившиеся процессы браузеров, запомненные
+    track_orphans и перешедшие к боту. waitpid(-1) не используется: он забрал бы
+    статус и у процессов, которыми владеют объекты Popen (chromedriver, Chromium)
+
+    Returns:
+        int: Количество собранных процессов
+    """
+    reaped = 0
+    own_pid = os.getpid()
+    with _orphans_lock:
+        for pid, starttime in list(_orphans.items()):
+            stat = read_process_stat(pid)
+            if stat is None or stat['starttime'] != starttime:
+                # Процесс уже собран (например, init, если бот не сборщик)
+                del _orphans[pid]
+                continue
+            if stat['ppid'] != own_pid or stat['state'] != 'Z':
+                continue
+            try:
+                collected, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                del _orphans[pid]
+                continue
+            except OSError as e:
+                if e.errno != errno.EINTR:
+                    del _orphans[pid]
+                continue
+            if collected:
+                del _orphans[pid]
+                reaped += 1
+    return reaped
+
+
+def kill_processes(processes):
+    """
+    Завершает процессы, которые остались живы после quit() драйвера
+
+    Args:
+        processes (list): Состояния процессов из process_tree, снятые до quit().
+            PID мог быть выдан новому процессу, поэтому процесс завершается,
+            только если время его запуска совпадает с записанным
+    """
+    killed = 0
+    for recorded in processes:
+        pid = recorded['pid']
+        stat = read_process_stat(pid)
+        if stat is None or stat['state'] == 'Z' or stat['starttime'] != recorded['starttime']:
+            continue
+        try:
+            os.kill(pid, signal.SIGKILL)
+            killed += 1
+        except OSError:
+            pass
+    return killed
+
+
+def make_profile_dir(root=None):
+    """
+    Создает временный профиль браузера, принадлежащий боту. В имени каталога
+    записан PID бота, чтобы другой экземпляр на той же машине не удалил его при очистке
+    """
+    return tempfile.mkdtemp(prefix=f'{PROFILE_PREFIX}{os.getpid()}-', dir=root or None)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Процесс есть, но принадлежит другому пользователю
+        return True
+    return True
+
+
+def profile_owner_alive(path):
+    """
+    Проверяет, используется ли профиль живым процессом: экземпляром бота,
+    записанным в имени каталога, или Chrome, держащим SingletonLock профиля
+
+    Returns:
+        bool: True, если каталог трогать нельзя
+    """
+    owner = os.path.basename(path)[len(PROFILE_PREFIX):].split('-', 1)[0]
+    if owner.isdigit() and int(owner) != os.getpid() and _pid_alive(int(owner)):
+        return True
+
+    # SingletonLock - символическая ссылка вида "hostname-pid"
+    try:
+        target = os.readlink(os.path.join(path, 'SingletonLock'))
+    except OSError:
+        return False
+    host, _, pid = target.rpartition('-')
+    return host == os.uname().nodename and pid.isdigit() and _pid_alive(int(pid))
+
+
+def remove_profile_dir(path):
+    """Удаляет профиль браузера; возвращает True, если каталог был удален"""
+    if not path or not os.path.isdir(path):
+        return False
+    shutil.rmtree(path, ignore_errors=True)
+    return not os.path.exists(path)
+
+
+def sweep_stale_profiles(root=None, keep=(), max_age=86400):
+    """
+    Удаляет профили, оставшиеся после аварийных завершений: собственные
+    каталоги бота (кроме используемых этим и другими живыми экземплярами)
+    и старые профили snap-версии Chromium
+
+    Args:
+        root (str): Каталог, в котором создаются профили бота
+        keep (iterable): Профили живых сессий, которые трогать нельзя
+        max_age (int): Возраст в секундах, после которого удаляются профили snap Chromium
+
+    Returns:
+        int: Количество удаленных каталогов
+    """
+    keep = set(keep)
+    removed = 0
+    now = time.time()
+
+    candidates = []
+    root = root or tempfile.gettempdir()
+    if os.path.isdir(root):
+        candidates += [
+            os.path.join(root, name) for name in os.listdir(root)
+            if name.startswith(PROFILE_PREFIX)
+        ]
+    if os.path.isdir(SNAP_CHROMIUM_TMP):
+        for name in os.listdir(SNAP_CHROMIUM_TMP):
+            path = os.path.join(SNAP_CHROMIUM_TMP, name)
+            try:
+                old = now - os.stat(path).st_ctime > max_age
+            except OSError:
+                continue
+            if name.startswith('.org.chromium.Chromium.') and old:
+                candidates.append(path)
+
+    for path in candidates:
+        if path in keep or profile_owner_alive(path):
+            continue
+        if remove_profile_dir(path):
+            removed += 1
+    if removed:
+        logger.info(f"Removed {removed} stale browser profiles")
+    return removed
+
+
+class PersistentProfiles:
+    def __init__(self, root, max_size_mb=1000):
+        """
+        Постоянные профили браузера, которые переживают утилизацию сессий и
+        сохраняют HTTP-кэш (JS-бандлы страницы). Каждой живой сессии выдается
+        свой слот: Chrome не позволяет двум процессам работать с одним профилем.
+
+        Args:
+            root (str): Каталог со слотами профилей
+            max_size_mb (int): Размер слота, после которого он очищается
+        """
+        self.root = os.path.abspath(root)
+        self.max_size = max_size_mb * 1024 * 1024
+        self._in_use = set()
+        self._lock = threading.Lock()
+
+        # Счетчики для диагностики
+        self.reused = 0
+        self.wiped = 0
+
+    def owns(self, path):
+        return bool(path) and os.path.dirname(os.path.abspath(path)) == self.root
+
+    def acquire(self):
+        """
+        Выдает свободный слот профиля, предварительно проверив его
+
+        Returns:
+            str: Путь к каталогу профиля
+        """
+        with self._lock:
+            slot = 0
+            while os.path.join(self.root, f'slot-{slot}') in self._in_use:
+                slot += 1
+            path = os.path.join(self.root, f'slot-{slot}')
+            self._in_use.add(path)
+
+        reason = self._check(path)
+        if reason is not None:
+            self.wipe(path, reason)
+        elif os.path.isdir(path):
+            self.reused += 1
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def release(self, path):
+        with self._lock:
+            self._in_use.discard(path)
+
+    def wipe(self, path, reason):
+        """Удаляет содержимое слота; следующий запуск начнет с чистого профиля"""
+        if os.path.isdir(path):
+            logger.warning(f"Wiping browser profile {path}: {reason}")
+            shutil.rmtree(path, ignore_errors=True)
+            self.wiped += 1
+
+    def _check(self, path):
+        """Причина, по которой слот нельзя переиспользовать, или None"""
+        if not os.path.isdir(path):
+            return None
+
+        size = 0
+        for directory, _, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.lstat(os.path.join(directory, name)).st_size
+                except OSError:
+                    pass
+        if self.max_size and size > self.max_size:
+            return f"size {size / 1024 / 1024:.0f} MB exceeds limit"
+
+        # Испорченные настройки - признак аварийной записи профиля
+        preferences = os.path.join(path, 'Default', 'Preferences')
+        if os.path.exists(preferences):
+            try:
+                with open(preferences, encoding='utf-8') as f:
+                    json.load(f)
+            except (OSError, ValueError):
+                return "corrupted Preferences"
+
+        # Блокировки, оставшиеся после аварийно завершенного Chrome; слот принадлежит
+        # только этой сессии, поэтому их можно снять
+        for name in ('SingletonLock', 'SingletonSocket', 'SingletonCookie'):
+            lock_path = os.path.join(path, name)
+            if os.path.lexists(lock_path):
+                try:
+                    os.unlink(lock_path)
+                except OSError:
+                    return f"stale {name} could not be removed"
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_use': len(self._in_use),
+                'reused': self.reused,
+                'wiped': self.wiped,
+            }
+
+
+_persistent_profiles = None
+_persistent_profiles_lock = threading.Lock()
+
+
+def get_persistent_profiles():
+    """Постоянные профили из настроек или None, если они выключены"""
+    global _persistent_profiles
+
+    with _persistent_profiles_lock:
+        if _persistent_profiles is None:
+            from config import CHROME_PERSISTENT_PROFILE, CHROME_PROFILE_DIR, CHROME_PROFILE_MAX_MB
+            if not CHROME_PERSISTENT_PROFILE:
+                return None
+            _persistent_profiles = PersistentProfiles(CHROME_PROFILE_DIR, max_size_mb=CHROME_PROFILE_MAX_MB)
+        return _persistent_profiles
+
+
+def discard_profile_dir(path):
+    """
+    Освобождает профиль завершенной сессии: постоянный слот возвращается
+    для следующей сессии, временный профиль удаляется
+
+    Returns:
+        bool: True, если каталог был удален
+    """
+    if _persistent_profiles is not None and _persistent_profiles.owns(path):
+        _persistent_profiles.release(path)
+        return False
+    return remove_profile_dir(path)
+
+
+class ResourceGovernor:
+    def __init__(self, pool, rss_budget_mb=1500, profile_root=None):
+        """
+        Следит за процессами браузеров пула: память и CPU из /proc,
+        утилизация сессий сверх бюджета памяти, сбор зомби и удаление профилей
+
+        Args:
+            pool (DriverPool): Пул, сессии которого контролируются
+            rss_budget_mb (int): Бюджет памяти на одну сессию (chromedriver и все процессы Chrome)
+            profile_root (str): Каталог временных профилей бота
+        """
+        self.pool = pool
+        self.rss_budget = rss_budget_mb * 1024 * 1024
+        self.profile_root = profile_root
+        pool.on_destroy = self.on_session_destroyed
+
+        self._cpu_samples = {}
+        self._lock = threading.Lock()
+
+        # Метрики
+        self.sessions = {}
+        self.zombies_reaped = 0
+        self.processes_killed = 0
+        self.profiles_removed = 0
+        self.memory_recycles = 0
+        self.samples = 0
+
+    def sample(self):
+        """
+        Один проход контроля: собирает зомби, замеряет сессии и помечает
+        превысившие бюджет памяти на утилизацию
+
+        Returns:
+            dict: Метрики после замера
+        """
+        with self._lock:
+            self.zombies_reaped += reap_zombies()
+
+            processes = list_processes()
+            now = time.monotonic()
+            sessions = {}
+            for pooled in self.pool.sessions():
+                if pooled.pid is None:
+                    continue
+                tree = process_tree(pooled.pid, processes)
+                # Процессы Chrome переходят к боту, если chromedriver завершится раньше них
+                track_orphans(tree, pooled.pid)
+                rss = sum(stat['rss'] for stat in tree)
+                ticks = sum(stat['cpu_ticks'] for stat in tree)
+
+                cpu = 0.0
+                previous = self._cpu_samples.get(pooled.pid)
+                if previous is not None and now > previous[0]:
+                    cpu = 100.0 * (ticks - previous[1]) / CLOCK_TICKS / (now - previous[0])
+                self._cpu_samples[pooled.pid] = (now, ticks)
+
+                sessions[pooled.pid] = {
+                    'processes': len(tree),
+                    'zombies': sum(1 for stat in tree if stat['state'] == 'Z'),
+                    'rss_mb': rss / 1024 / 1024,
+                    'cpu_percent': max(cpu, 0.0),
+                    'age': pooled.age,
+                    'requests': pooled.requests,
+                }
+
+                if self.rss_budget and rss > self.rss_budget and pooled.recycle_reason is None:
+                    logger.warning(f"Driver session {pooled.pid} uses {rss / 1024 / 1024:.0f} MB "
+                                   f"(budget {self.rss_budget / 1024 / 1024:.0f} MB), recycling")
+                    pooled.recycle_reason = "memory budget exceeded"
+                    self.memory_recycles += 1
+
+            # Забываем замеры завершившихся сессий
+            self._cpu_samples = {pid: value for pid, value in self._cpu_samples.items() if pid in sessions}
+            self.sessions = sessions
+            self.samples += 1
+
+        # Простаивающие сессии сверх бюджета утилизируем сразу, занятые - при возврате
+        self.pool.recycle_marked()
+        return self.stats()
+
+    def on_session_destroyed(self, processes, profile_dir):
+        """
+        Добивает процессы сессии, пережившие quit(), собирает их и удаляет профиль
+
+        Args:
+            processes (list): Состояния процессов дерева сессии, снятые до quit()
+            profile_dir (str): Временный профиль сессии
+        """
+        killed = kill_processes(processes)
+        reaped = reap_zombies()
+        removed = discard_profile_dir(profile_dir)
+        with self._lock:
+            self.processes_killed += killed
+            self.zombies_reaped += reaped
+            self.profiles_removed += int(removed)
+        if killed:
+            logger.warning(f"Killed {killed} browser processes left after driver quit")
+
+    def sweep(self, keep=()):
+        """Удаляет профили, оставшиеся от прошлых запусков"""
+        removed = sweep_stale_profiles(self.profile_root, keep)
+        with self._lock:
+            self.profiles_removed += removed
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self.sessions),
+                'rss_mb': sum(session['rss_mb'] for session in self.sessions.values()),
+                'cpu_percent': sum(session['cpu_percent'] for session in self.sessions.values()),
+                'browser_processes': sum(session['processes'] for session in self.sessions.values()),
+                'zombies_reaped': self.zombies_reaped,
+                'processes_killed': self.processes_killed,
+                'profiles_removed': self.profiles_removed,
+                'memory_recycles': self.memory_recycles,
+                'samples': self.samples,
+            }
+
+
+# Глобальный контролер ресурсов
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_resource_governor():
+    """Возвращает контролер ресурсов общего пула драйверов, создавая его при первом вызове"""
+    global _governor
+
+    with _governor_lock:
+        if _governor is None:
+            from config import CHROME_RSS_BUDGET_MB, CHROME_PROFILE_ROOT
+            from driver_pool import get_driver_pool
+            _governor = ResourceGovernor(
+                get_driver_pool(),
+                rss_budget_mb=CHROME_RSS_BUDGET_MB,
+                profile_root=CHROME_PROFILE_ROOT
+            )
+        return _governor
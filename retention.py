@@ -0,0 +1,79 @@
+import heapq
+from datetime import datetime
+
+
+def to_epoch(value):
+    """
+    Приводит метку времени к секундам epoch; строки ISO из старых версий
+    состояния тоже принимаются
+
+    Returns:
+        float: Секунды epoch или None, если значение не разобрать
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        # Колонки TEXT в SQLite возвращают число строкой
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class ExpiryIndex:
+    def __init__(self):
+        """
+        Индекс сроков хранения: куча (время обновления, ключ) с ленивым удалением.
+        Обновление ключа добавляет новую запись, а устаревшие записи
+        пропускаются при извлечении, поэтому вытеснение стоит O(вытесненных)
+        плюс уже устаревшие записи кучи.
+        """
+        self._heap = []
+        self._updated = {}
+
+    def __len__(self):
+        return len(self._updated)
+
+    def __contains__(self, key):
+        return key in self._updated
+
+    def get(self, key):
+        return self._updated.get(key)
+
+    def touch(self, key, timestamp):
+        """Запоминает время последнего обновления ключа"""
+        if self._updated.get(key) == timestamp:
+            return
+        self._updated[key] = timestamp
+        heapq.heappush(self._heap, (timestamp, key))
+
+        # Куча не должна расти за счет устаревших записей бесконечно
+        if len(self._heap) > 2 * len(self._updated) + 64:
+            self._heap = [(updated, key) for key, updated in self._updated.items()]
+            heapq.heapify(self._heap)
+
+    def discard(self, key):
+        self._updated.pop(key, None)
+
+    def expire(self, cutoff):
+        """
+        Удаляет из индекса и возвращает ключи, не обновлявшиеся с cutoff
+
+        Args:
+            cutoff (float): Граница в секундах epoch
+
+        Returns:
+            list: Вытесненные ключи
+        """
+        expired = []
+        while self._heap and self._heap[0][0] < cutoff:
+            timestamp, key = heapq.heappop(self._heap)
+            if self._updated.get(key) == timestamp:
+                del self._updated[key]
+                expired.append(key)
+        return expired
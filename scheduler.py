@@ -0,0 +1,169 @@
+import time
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+# Поля, изменение которых считается движением цены
+PRICE_FIELDS = ('odds1', 'odds2', 'handicap_odd1', 'handicap_odd2')
+
+
+def minutes_to_kickoff(match_time, now, live_window=180):
+    """
+    Сколько минут осталось до начала матча. Время без даты ("HH:MM"), поэтому
+    матч следующего дня, который начнется в то же время суток чуть позже,
+    неотличим от сегодняшнего, а время, прошедшее меньше live_window минут
+    назад, считается началом уже идущего матча, а не матча через сутки
+
+    Args:
+        match_time (str): Время начала в формате "HH:MM" (время отображения)
+        now (datetime): Текущее время в том же часовом поясе
+        live_window (int): Сколько минут после начала матч считается идущим
+
+    Returns:
+        int: Минуты до начала или None для идущего матча и неразборчивого времени
+    """
+    try:
+        kickoff = datetime.strptime(match_time.strip(), "%H:%M")
+    except (AttributeError, ValueError):
+        return None
+
+    diff = (kickoff.hour * 60 + kickoff.minute) - (now.hour * 60 + now.minute)
+    diff %= 24 * 60
+    # Время недавно прошло - матч уже идет, до его начала ускоряться незачем
+    if diff > 24 * 60 - live_window:
+        return None
+    return diff
+
+
+class AdaptiveScheduler:
+    def __init__(self, base_interval=120, min_interval=30, max_interval=900,
+                 kickoff_window=60, volatility_window=600, utc_offset=1, history_size=50):
+        """
+        Выбирает время следующего скрапа по последнему снимку: чаще перед
+        началом матчей и после движения цен, реже на пустой или спокойной доске
+
+        Args:
+            base_interval (int): Обычный интервал между скрапами в секундах
+            min_interval (int): Нижняя граница интервала
+            max_interval (int): Верхняя граница интервала
+            kickoff_window (int): За сколько минут до начала матча ускоряться
+            volatility_window (int): Сколько секунд после движения цены опрашивать чаще
+            utc_offset (int): Часовой пояс, в котором указано время матчей
+            history_size (int): Сколько последних решений хранить для просмотра
+        """
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.kickoff_window = kickoff_window
+        self.volatility_window = volatility_window
+        self.display_tz = timezone(timedelta(hours=utc_offset))
+
+        self._previous = None
+        self._last_move_at = None
+        self._quiet_cycles = 0
+        self.decisions = deque(maxlen=history_size)
+
+    def _count_moves(self, matches):
+        """Сколько матчей изменили цены относительно предыдущего снимка"""
+        if self._previous is None:
+            return 0
+        moved = 0
+        for key, data in matches.items():
+            previous = self._previous.get(key)
+            if previous is None:
+                continue
+            if any(data.get(field) != previous.get(field) for field in PRICE_FIELDS):
+                moved += 1
+        return moved
+
+    def _clamp(self, interval):
+        return max(self.min_interval, min(self.max_interval, interval))
+
+    def _kickoff_interval(self, matches):
+        """
+        Интервал с учетом ближайшего начала матча
+
+        Returns:
+            tuple: (минуты до ближайшего начала или None, интервал, причина)
+        """
+        local_now = datetime.now(self.display_tz)
+        kickoffs = [
+            minutes for minutes in (minutes_to_kickoff(data.get('time'), local_now) for data in matches.values())
+            if minutes is not None
+        ]
+        soonest = min(kickoffs) if kickoffs else None
+
+        # Ближе к началу матча интервал линейно сокращается до минимума
+        if soonest is not None and soonest <= self.kickoff_window:
+            kickoff_interval = self.min_interval + (
+                (self.base_interval - self.min_interval) * soonest / self.kickoff_window
+            )
+            if kickoff_interval < self.base_interval:
+                return soonest, kickoff_interval, f"kickoff in {soonest} min"
+        return soonest, self.base_interval, "base"
+
+    def plan(self, snapshot):
+        """
+        Вычисляет интервал до следующего скрапа и запоминает решение
+
+        Args:
+            snapshot (Snapshot): Только что опубликованный снимок или None, если скрап не удался
+
+        Returns:
+            float: Интервал в секундах
+        """
+        now = time.monotonic()
+        matches = snapshot.matches if snapshot is not None else None
+
+        soonest = None
+        moved = 0
+        if snapshot is None:
+            # Ошибка скрапа ничего не говорит о доске: повторяем в обычном темпе
+            # (или чаще перед уже известными началами матчей), счетчик тишины не трогаем
+            soonest, interval, reason = self._kickoff_interval(self._previous or {})
+            reason = "no data" if reason == "base" else f"no data, {reason}"
+        elif not matches:
+            # Пустая доска: постепенно отступаем до максимума
+            self._quiet_cycles += 1
+            interval = self.base_interval * 2 ** min(self._quiet_cycles, 10)
+            reason = "empty board"
+            self._previous = None
+        else:
+            if self._previous is None:
+                # Доска снова заполнилась: начинаем отсчет тишины заново
+                self._quiet_cycles = 0
+            soonest, interval, reason = self._kickoff_interval(matches)
+
+            moved = self._count_moves(matches)
+            if moved:
+                self._last_move_at = now
+            self._previous = matches
+
+            # Недавнее движение цен: опрашиваем в два раза чаще
+            volatile = self._last_move_at is not None and now - self._last_move_at <= self.volatility_window
+            if volatile and self.base_interval / 2 < interval:
+                interval = self.base_interval / 2
+                reason = f"{moved} matches moved" if moved else "prices moved recently"
+
+            if reason == "base" and not volatile:
+                # Спокойная доска: каждый тихий цикл удваивает интервал
+                self._quiet_cycles += 1
+                interval = self.base_interval * 2 ** min(self._quiet_cycles - 1, 10)
+                if self._quiet_cycles > 1:
+                    reason = f"quiet for {self._quiet_cycles} cycles"
+            else:
+                self._quiet_cycles = 0
+
+        interval = self._clamp(interval)
+        self.decisions.append({
+            'timestamp': datetime.now(),
+            'interval': interval,
+            'reason': reason,
+            'matches': len(matches) if matches else 0,
+            'soonest_kickoff': soonest,
+            'moved': moved,
+        })
+        logger.info(f"Next scrape in {interval:.0f}s ({reason})")
+        return interval
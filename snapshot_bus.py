@@ -0,0 +1,98 @@
+import time
+import asyncio
+import logging
+import traceback
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    """Результат одного скрапа, общий для всех потребителей"""
+
+    def __init__(self, version, matches, duration, sources=None):
+        self.version = version
+        self.matches = matches
+        self.duration = duration
+        # Статистика по источникам: {source: SourceResult}
+        self.sources = sources or {}
+        self.created_at = time.monotonic()
+        self.timestamp = datetime.now()
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+
+class SnapshotBus:
+    def __init__(self, scrape):
+        """
+        Шина снимков: один скрап публикуется всем подписчикам
+
+        Args:
+            scrape (callable): Корутина без аргументов, возвращающая словарь матчей
+        """
+        self._scrape = scrape
+        self._subscribers = []
+        self._latest = None
+        self._version = 0
+        self._inflight = None
+
+    @property
+    def latest(self):
+        return self._latest
+
+    def subscribe(self, callback):
+        """
+        Регистрирует корутину callback(snapshot), которая вызывается для каждого нового снимка
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    async def refresh(self):
+        """
+        Выполняет скрап и публикует снимок подписчикам. Если скрап уже идет,
+        ждет его результата вместо запуска второго.
+
+        Returns:
+            Snapshot: Новый снимок или None, если данные получить не удалось
+        """
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._refresh())
+        return await asyncio.shield(self._inflight)
+
+    async def get_fresh(self, max_age):
+        """
+        Возвращает последний снимок, если он не старше max_age секунд,
+        иначе запускает (или дожидается) новый скрап
+        """
+        if self._latest is not None and self._latest.age <= max_age:
+            return self._latest
+        return await self.refresh()
+
+    async def _refresh(self):
+        started = time.monotonic()
+        matches = await self._scrape()
+        duration = time.monotonic() - started
+
+        if not matches:
+            logger.warning(f"Scrape returned no matches after {duration:.2f}s, snapshot not published")
+            return None
+
+        self._version += 1
+        snapshot = Snapshot(self._version, matches, duration, getattr(matches, 'sources', None))
+        self._latest = snapshot
+        logger.info(f"Published snapshot v{snapshot.version}: {len(matches)} matches, "
+                    f"scraped in {duration:.2f}s, {len(self._subscribers)} subscribers")
+
+        for callback in list(self._subscribers):
+            try:
+                await callback(snapshot)
+            except Exception as e:
+                logger.error(f"Error in snapshot subscriber {callback}: {e}")
+                logger.error(traceback.format_exc())
+
+        return snapshot
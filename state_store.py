@@ -0,0 +1,378 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS odds_history (
+    match_key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    last_updated TEXT
+);
+CREATE INDEX IF NOT EXISTS odds_history_last_updated ON odds_history (last_updated);
+
+CREATE TABLE IF NOT EXISTS last_notified (
+    match_key TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS known_matches (
+    match_key TEXT PRIMARY KEY,
+    match_time TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS known_matches_updated_at ON known_matches (updated_at);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class StateStore:
+    def __init__(self, path='bot_state.db'):
+        """
+        Хранилище состояния трекеров в SQLite (WAL): история коэффициентов,
+        последние отправленные значения и известные матчи. Каждый матч - отдельная
+        строка, поэтому за цикл записываются только изменившиеся матчи.
+
+        Args:
+            path (str): Путь к файлу базы данных
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        """Одна транзакция на цикл: все изменения применяются атомарно"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # История коэффициентов
+
+    def load_odds_history(self):
+        return {key: json.loads(data) for key, data in self._query("SELECT match_key, data FROM odds_history")}
+
+    def save_odds_history(self, conn, history, keys=(), removed=()):
+        """
+        Записывает историю матчей keys и удаляет removed в рамках транзакции conn
+        """
+        conn.executemany(
+            "INSERT INTO odds_history (match_key, data, last_updated) VALUES (?, ?, ?) "
+            "ON CONFLICT (match_key) DO UPDATE SET data = excluded.data, last_updated = excluded.last_updated",
+            [(key, json.dumps(history[key]), history[key].get('last_updated')) for key in keys]
+        )
+        conn.executemany("DELETE FROM odds_history WHERE match_key = ?", [(key,) for key in removed])
+
+    # Последние отправленные значения
+
+    def load_last_notified(self):
+        return {key: json.loads(data) for key, data in self._query("SELECT match_key, data FROM last_notified")}
+
+    def save_last_notified(self, conn, last_notified, keys=()):
+        conn.executemany(
+            "INSERT INTO last_notified (match_key, data) VALUES (?, ?) "
+            "ON CONFLICT (match_key) DO UPDATE SET data = excluded.data",
+            [(key, json.dumps(last_notified[key])) for key in keys]
+        )
+
+    # Известные матчи
+
+    def load_known_matches(self):
+        return dict(self._query("SELECT match_key, match_time FROM known_matches"))
+
+    def load_known_matches_seen(self):
+        """Когда каждый известный матч последний раз был на странице (epoch или ISO из старых версий)"""
+        return dict(self._query("SELECT match_key, updated_at FROM known_matches"))
+
+    def save_known_matches(self, conn, known_matches, keys=()):
+        updated_at = time.time()
+        conn.executemany(
+            "INSERT INTO known_matches (match_key, match_time, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (match_key) DO UPDATE SET match_time = excluded.match_time, updated_at = excluded.updated_at",
+            [(key, known_matches[key], updated_at) for key in keys]
+        )
+
+    def clear(self, table):
+        """Очищает одну из таблиц состояния (для команд сброса)"""
+        if table not in ('odds_history', 'last_notified', 'known_matches'):
+            raise ValueError(f"Unknown state table: {table}")
+        with self.transaction() as conn:
+            conn.execute(f"DELETE FROM {table}")
+
+    def write_batch(self, clears=(), rows=None):
+        """
+        Применяет одной транзакцией накопленные изменения StateWriter
+
+        Args:
+            clears (iterable): Таблицы, которые нужно очистить до записи строк
+            rows (dict): {(table, match_key): значения строки или None для удаления}
+        """
+        upserts = {
+            'odds_history': "INSERT INTO odds_history (match_key, data, last_updated) VALUES (?, ?, ?) "
+                            "ON CONFLICT (match_key) DO UPDATE SET data = excluded.data, "
+                            "last_updated = excluded.last_updated",
+            'last_notified': "INSERT INTO last_notified (match_key, data) VALUES (?, ?) "
+                             "ON CONFLICT (match_key) DO UPDATE SET data = excluded.data",
+            'known_matches': "INSERT INTO known_matches (match_key, match_time, updated_at) VALUES (?, ?, ?) "
+                             "ON CONFLICT (match_key) DO UPDATE SET match_time = excluded.match_time, "
+                             "updated_at = excluded.updated_at",
+        }
+        with self.transaction() as conn:
+            for table in clears:
+                conn.execute(f"DELETE FROM {table}")
+            for (table, match_key), values in (rows or {}).items():
+                if values is None:
+                    conn.execute(f"DELETE FROM {table} WHERE match_key = ?", (match_key,))
+                else:
+                    conn.execute(upserts[table], (match_key,) + values)
+
+    def import_json_files(self, odds_history_file='odds_history.json', last_notified_file='last_notified.json',
+                          known_matches_file='known_matches.json'):
+        """
+        Однократно переносит состояние из старых JSON-файлов. Файлы не удаляются,
+        повторный импорт не выполняется (отметка в таблице meta).
+
+        Returns:
+            bool: True, если импорт был выполнен
+        """
+        if self._query("SELECT value FROM meta WHERE key = 'json_imported'"):
+            return False
+
+        def read_json(path):
+            if not os.path.exists(path):
+                return {}
+            try:
+                with open(path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                logger.error(f"Error reading {path} for import, skipping it: {e}")
+                return {}
+
+        odds_history = read_json(odds_history_file)
+        last_notified = read_json(last_notified_file)
+        known_matches = read_json(known_matches_file).get('matches', {})
+
+        with self.transaction() as conn:
+            self.save_odds_history(conn, odds_history, odds_history)
+            self.save_last_notified(conn, last_notified, last_notified)
+            self.save_known_matches(conn, known_matches, known_matches)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (datetime.now().isoformat(),))
+
+        logger.info(f"Imported state from JSON: {len(odds_history)} odds histories, "
+                    f"{len(last_notified)} last notified, {len(known_matches)} known matches")
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class StateWriter:
+    def __init__(self, store, flush_interval=2.0):
+        """
+        Отложенная запись состояния в фоновом потоке: изменения копятся в памяти,
+        повторные изменения одного матча схлопываются, и раз в flush_interval
+        все накопленное записывается одной транзакцией
+
+        Args:
+            store (StateStore): Хранилище, в которое выполняется запись
+            flush_interval (float): Сколько секунд копить изменения перед записью
+        """
+        self.store = store
+        self.flush_interval = flush_interval
+
+        self._pending = {}
+        self._clears = []
+        # Номер очистки каждой таблицы: изменения, взятые до очистки, в очередь не возвращаются
+        self._generations = {}
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._thread.start()
+
+        # Метрики
+        self.flushes = 0
+        self.rows_written = 0
+        self.bytes_written = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def _put(self, table, match_key, values):
+        with self._cond:
+            if (table, match_key) in self._pending:
+                self.coalesced += 1
+            self._pending[(table, match_key)] = values
+            self._cond.notify()
+
+    def put_odds_history(self, match_key, history):
+        # Сериализуем сразу: словари трекера продолжают меняться в event loop
+        self._put('odds_history', match_key, (json.dumps(history), history.get('last_updated')))
+
+    def delete_odds_history(self, match_key):
+        self._put('odds_history', match_key, None)
+
+    def put_last_notified(self, match_key, values):
+        self._put('last_notified', match_key, (json.dumps(values),))
+
+    def delete_last_notified(self, match_key):
+        self._put('last_notified', match_key, None)
+
+    def put_known_match(self, match_key, match_time, seen_at=None):
+        self._put('known_matches', match_key, (match_time, time.time() if seen_at is None else seen_at))
+
+    def delete_known_match(self, match_key):
+        self._put('known_matches', match_key, None)
+
+    def clear(self, table):
+        """Очищает таблицу и сразу записывает это, чтобы новый трекер не загрузил старые данные"""
+        if table not in ('odds_history', 'last_notified', 'known_matches'):
+            raise ValueError(f"Unknown state table: {table}")
+        with self._cond:
+            self._pending = {key: values for key, values in self._pending.items() if key[0] != table}
+            self._clears.append(table)
+            self._generations[table] = self._generations.get(table, 0) + 1
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._clears and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # Даем накопиться изменениям следующих циклов; close() прерывает ожидание
+                self._cond.wait_for(lambda: self._closed, timeout=self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Записывает все накопленные изменения одной транзакцией
+
+        Returns:
+            int: Количество записанных строк
+        """
+        with self._flush_lock:
+            with self._cond:
+                rows, self._pending = self._pending, {}
+                clears, self._clears = self._clears, []
+                generations = dict(self._generations)
+            if not rows and not clears:
+                return 0
+
+            started = time.monotonic()
+            try:
+                self.store.write_batch(clears, rows)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error flushing state ({len(rows)} rows): {e}")
+                with self._cond:
+                    # Возвращаем изменения в очередь, не затирая более новые. Строки таблиц,
+                    # очищенных после того, как батч был взят, отбрасываются: иначе следующая
+                    # запись вернула бы их после очистки
+                    for key, values in rows.items():
+                        if self._generations.get(key[0], 0) == generations.get(key[0], 0):
+                            self._pending.setdefault(key, values)
+                    self._clears = clears + self._clears
+                return 0
+
+            latency = time.monotonic() - started
+            observe_stage('persistence', latency)
+            self.flushes += 1
+            self.rows_written += len(rows)
+            self.bytes_written += sum(
+                len(match_key) + sum(len(str(value)) for value in values if value is not None)
+                for (_, match_key), values in rows.items() if values is not None
+            )
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            logger.info(f"Flushed {len(rows)} state rows in {latency * 1000:.1f}ms")
+            return len(rows)
+
+    def close(self):
+        """Останавливает поток и записывает все, что осталось"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'pending': pending,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'bytes_written': self.bytes_written,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'last_flush_latency': self.last_flush_latency,
+            'max_flush_latency': self.max_flush_latency,
+        }
+
+
+# Общее хранилище состояния
+_state_store = None
+_state_store_lock = threading.Lock()
+
+
+def get_state_store():
+    """Возвращает общее хранилище состояния, при первом вызове импортируя старые JSON-файлы"""
+    global _state_store
+
+    with _state_store_lock:
+        if _state_store is None:
+            from config import STATE_DB_FILE
+            _state_store = StateStore(STATE_DB_FILE)
+            _state_store.import_json_files()
+        return _state_store
+
+
+_state_writer = None
+
+
+def get_state_writer():
+    """Возвращает общий фоновый писатель состояния"""
+    global _state_writer
+
+    store = get_state_store()
+    with _state_store_lock:
+        if _state_writer is None:
+            from config import STATE_FLUSH_INTERVAL
+            _state_writer = StateWriter(store, flush_interval=STATE_FLUSH_INTERVAL)
+        return _state_writer
+
+
+def close_state_writer():
+    """Записывает отложенные изменения при завершении бота"""
+    with _state_store_lock:
+        writer = _state_writer
+    if writer is not None:
+        writer.close()
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from state_store import StateStore, StateWriter
+
+
+class StateStoreRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.store = StateStore(':memory:')
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_write_batch_upserts_and_deletes(self):
+        history = {'initial': {'odds1': 1.9}, 'last_updated': '2026-03-01T10:00:00'}
+        self.store.write_batch(rows={
+            ('odds_history', 'A vs B'): (json.dumps(history), history['last_updated']),
+            ('odds_history', 'C vs D'): (json.dumps({}), None),
+            ('last_notified', 'A vs B'): (json.dumps({'odds1': 1.9}),),
+            ('known_matches', 'A vs B'): ('18:00', 1_700_000_000.0),
+        })
+        self.assertEqual(self.store.load_odds_history(), {'A vs B': history, 'C vs D': {}})
+        self.assertEqual(self.store.load_last_notified(), {'A vs B': {'odds1': 1.9}})
+        self.assertEqual(self.store.load_known_matches(), {'A vs B': '18:00'})
+        self.assertEqual(float(self.store.load_known_matches_seen()['A vs B']), 1_700_000_000.0)
+
+        self.store.write_batch(rows={
+            ('odds_history', 'C vs D'): None,
+            ('last_notified', 'A vs B'): (json.dumps({'odds1': 2.1}),),
+            ('known_matches', 'A vs B'): ('19:30', 1_700_000_600.0),
+        })
+        self.assertEqual(self.store.load_odds_history(), {'A vs B': history})
+        self.assertEqual(self.store.load_last_notified(), {'A vs B': {'odds1': 2.1}})
+        self.assertEqual(self.store.load_known_matches(), {'A vs B': '19:30'})
+
+    def test_clears_apply_before_rows(self):
+        self.store.write_batch(rows={('last_notified', 'A vs B'): (json.dumps({'odds1': 1.9}),),
+                                     ('last_notified', 'C vs D'): (json.dumps({'odds1': 2.5}),)})
+        self.store.write_batch(clears=['last_notified'],
+                               rows={('last_notified', 'E vs F'): (json.dumps({'odds2': 1.4}),)})
+        self.assertEqual(self.store.load_last_notified(), {'E vs F': {'odds2': 1.4}})
+
+        with self.assertRaises(ValueError):
+            self.store.clear('meta')
+
+    def test_import_json_files_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {name: os.path.join(directory, f"{name}.json")
+                     for name in ('odds_history', 'last_notified', 'known_matches')}
+            with open(paths['odds_history'], 'w') as f:
+                json.dump({'A vs B': {'initial': {'odds1': 1.9}, 'last_updated': '2026-03-01T10:00:00'}}, f)
+            with open(paths['last_notified'], 'w') as f:
+                json.dump({'A vs B': {'odds1': 1.9}}, f)
+            with open(paths['known_matches'], 'w') as f:
+                f.write('{broken')
+
+            self.assertTrue(self.store.import_json_files(paths['odds_history'], paths['last_notified'],
+                                                         paths['known_matches']))
+            self.assertEqual(self.store.load_last_notified(), {'A vs B': {'odds1': 1.9}})
+            self.assertEqual(list(self.store.load_odds_history()), ['A vs B'])
+            self.assertEqual(self.store.load_known_matches(), {})
+
+            self.store.clear('last_notified')
+            self.assertFalse(self.store.import_json_files(paths['odds_history'], paths['last_notified'],
+                                                          paths['known_matches']))
+            self.assertEqual(self.store.load_last_notified(), {})
+
+
+class StateWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.store = StateStore(':memory:')
+        self.writer = StateWriter(self.store, flush_interval=3600)
+
+    def tearDown(self):
+        self.writer.close()
+        self.store.close()
+
+    def test_changes_are_coalesced_until_flush(self):
+        self.writer.put_last_notified('A vs B', {'odds1': 1.9})
+        self.writer.put_last_notified('A vs B', {'odds1': 2.1})
+        self.writer.put_known_match('A vs B', '18:00', seen_at=1_700_000_000.0)
+        self.writer.put_odds_history('C vs D', {'initial': {'odds1': 3.0}, 'last_updated': None})
+        self.writer.delete_odds_history('C vs D')
+        self.assertEqual(self.store.load_last_notified(), {})
+
+        self.assertEqual(self.writer.flush(), 3)
+        self.assertEqual(self.writer.flush(), 0)
+        self.assertEqual(self.store.load_last_notified(), {'A vs B': {'odds1': 2.1}})
+        self.assertEqual(self.store.load_known_matches(), {'A vs B': '18:00'})
+        self.assertEqual(self.store.load_odds_history(), {})
+
+        stats = self.writer.stats()
+        self.assertEqual((stats['pending'], stats['flushes'], stats['rows_written'], stats['coalesced']),
+                         (0, 1, 3, 2))
+
+    def test_clear_drops_pending_rows_of_the_table(self):
+        self.writer.put_last_notified('A vs B', {'odds1': 1.9})
+        self.writer.flush()
+        self.writer.put_last_notified('C vs D', {'odds1': 2.5})
+        self.writer.put_known_match('C vs D', '20:00')
+        self.writer.clear('last_notified')
+
+        self.assertEqual(self.store.load_last_notified(), {})
+        self.assertEqual(self.store.load_known_matches(), {'C vs D': '20:00'})
+
+    def test_failed_flush_requeues_rows(self):
+        self.writer.put_last_notified('A vs B', {'odds1': 1.9})
+        with mock.patch.object(self.store, 'write_batch', side_effect=RuntimeError("disk is full")):
+            self.assertEqual(self.writer.flush(), 0)
+        self.writer.put_known_match('C vs D', '20:00')
+
+        self.assertEqual(self.writer.flush(), 2)
+        self.assertEqual(self.writer.stats()['errors'], 1)
+        self.assertEqual(self.store.load_last_notified(), {'A vs B': {'odds1': 1.9}})
+        self.assertEqual(self.store.load_known_matches(), {'C vs D': '20:00'})
+
+    def test_clear_during_failed_flush_is_not_undone(self):
+        self.writer.put_last_notified('A vs B', {'odds1': 1.9})
+        self.writer.put_known_match('A vs B', '18:00')
+        clearing = threading.Thread(target=self.writer.clear, args=('last_notified',))
+
+        def failing_write(clears, rows):
+            # Очистка из другого потока, пока батч записывается: она ждет окончания этой записи
+            clearing.start()
+            deadline = time.monotonic() + 5
+            while not self.writer._generations.get('last_notified') and time.monotonic() < deadline:
+                time.sleep(0.01)
+            raise RuntimeError("database is locked")
+
+        with mock.patch.object(self.store, 'write_batch', side_effect=failing_write):
+            self.assertEqual(self.writer.flush(), 0)
+        clearing.join(timeout=5)
+
+        self.assertEqual(self.store.load_last_notified(), {})
+        self.assertEqual(self.store.load_known_matches(), {'A vs B': '18:00'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+from tick_log import TickLog, TickReader, RECORD, segment_name
+
+DAY_START = datetime(2026, 3, 1, tzinfo=timezone.utc).timestamp()
+
+
+class TickLogRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_scan_returns_written_prices(self):
+        log = TickLog(self.directory)
+        snapshots = [
+            (DAY_START + 10, {'A vs B': {'odds1': 1.85, 'odds2': 1.95}, 'C vs D': {'odds1': 3.4, 'odds2': 1.3,
+                                                                                  'handicap_odd1': 1.72}}),
+            (DAY_START + 20, {'A vs B': {'odds1': 1.9, 'odds2': 1.9}}),
+            (DAY_START + 30, {'C vs D': {'odds1': 3.5, 'odds2': 1.28, 'handicap_odd2': None}}),
+        ]
+        for timestamp, matches in snapshots:
+            log.append_matches(matches, timestamp)
+        log.close()
+
+        expected = [
+            (timestamp, match_key, field, price)
+            for timestamp, matches in snapshots
+            for match_key, match_data in matches.items()
+            for field, price in match_data.items() if price is not None
+        ]
+        reader = TickReader(self.directory)
+        self.assertEqual(list(reader.scan()), expected)
+        self.assertEqual(list(reader.scan(match_key='A vs B')),
+                         [record for record in expected if record[1] == 'A vs B'])
+        self.assertEqual(list(reader.scan(field='odds2')),
+                         [record for record in expected if record[2] == 'odds2'])
+        self.assertEqual(list(reader.scan(start=DAY_START + 20, end=DAY_START + 30)),
+                         [record for record in expected if record[0] == DAY_START + 20])
+        self.assertEqual(reader.series('C vs D', 'odds1'), [(DAY_START + 10, 3.4), (DAY_START + 30, 3.5)])
+        self.assertEqual(list(reader.scan(match_key='unknown')), [])
+
+    def test_day_rollover_and_range(self):
+        log = TickLog(self.directory)
+        log.append_matches({'A vs B': {'odds1': 2.0}}, DAY_START - 5)
+        log.append_matches({'A vs B': {'odds1': 2.1}}, DAY_START + 5)
+        log.close()
+
+        reader = TickReader(self.directory)
+        self.assertEqual(reader.segments(), [segment_name(DAY_START - 5), segment_name(DAY_START + 5)])
+        self.assertEqual(reader.series('A vs B', 'odds1'), [(DAY_START - 5, 2.0), (DAY_START + 5, 2.1)])
+        self.assertEqual(reader.series('A vs B', 'odds1', start=DAY_START), [(DAY_START + 5, 2.1)])
+
+    def test_changes_only_restarts_each_segment(self):
+        log = TickLog(self.directory, changes_only=True)
+        self.assertEqual(log.append_matches({'A vs B': {'odds1': 2.0, 'odds2': 1.8}}, DAY_START - 20), 2)
+        self.assertEqual(log.append_matches({'A vs B': {'odds1': 2.0, 'odds2': 1.75}}, DAY_START - 10), 1)
+        # В новом сегменте первая цена матча записывается, даже если не изменилась
+        self.assertEqual(log.append_matches({'A vs B': {'odds1': 2.0, 'odds2': 1.75}}, DAY_START + 10), 2)
+        self.assertEqual(log.append_matches({'A vs B': {'odds1': 2.0, 'odds2': 1.75}}, DAY_START + 20), 0)
+        log.close()
+
+        self.assertEqual(TickReader(self.directory).series('A vs B', 'odds1', start=DAY_START),
+                         [(DAY_START + 10, 2.0)])
+
+    def test_timestamps_do_not_decrease(self):
+        log = TickLog(self.directory)
+        log.append_matches({'A vs B': {'odds1': 2.0}}, DAY_START + 50)
+        log.append_matches({'A vs B': {'odds1': 2.1}}, DAY_START + 40)
+        log.close()
+
+        self.assertEqual(TickReader(self.directory).series('A vs B', 'odds1'),
+                         [(DAY_START + 50, 2.0), (DAY_START + 50, 2.1)])
+
+    def test_reopen_after_torn_writes(self):
+        log = TickLog(self.directory)
+        log.append_matches({'A vs B': {'odds1': 2.0}, 'C vs D': {'odds1': 1.5}}, DAY_START + 10)
+        log.close()
+
+        # Аварийная остановка посреди записи: половина записи и недописанная строка словаря
+        base = os.path.join(self.directory, segment_name(DAY_START))
+        with open(base + '.ticks', 'ab') as f:
+            f.write(RECORD.pack(DAY_START + 20, 7, 0, 9.9)[:RECORD.size // 2])
+        with open(base + '.keys', 'a', encoding='utf-8') as f:
+            f.write('2\tE vs')
+
+        reader = TickReader(self.directory)
+        self.assertEqual(list(reader.scan()), [
+            (DAY_START + 10, 'A vs B', 'odds1', 2.0),
+            (DAY_START + 10, 'C vs D', 'odds1', 1.5),
+        ])
+
+        log = TickLog(self.directory)
+        log.append_matches({'E vs F': {'odds1': 3.0}, 'A vs B': {'odds1': 2.2}}, DAY_START + 30)
+        log.close()
+
+        self.assertEqual(os.path.getsize(base + '.ticks') % RECORD.size, 0)
+        with open(base + '.keys', encoding='utf-8') as f:
+            self.assertEqual(f.read(), '0\tA vs B\n1\tC vs D\n2\tE vs F\n')
+        self.assertEqual(list(TickReader(self.directory).scan(start=DAY_START + 30)), [
+            (DAY_START + 30, 'E vs F', 'odds1', 3.0),
+            (DAY_START + 30, 'A vs B', 'odds1', 2.2),
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,269 @@
+import random
+import unittest
+from unittest import mock
+from datetime import datetime
+
+import change_engine
+from state_store import StateStore, StateWriter
+from odds_tracker import OddsTracker
+from match_tracker import MatchTracker
+from benchmarks.synthetic import SyntheticBoard
+
+FIELDS = ('odds1', 'odds2', 'handicap_odd1', 'handicap_odd2')
+
+
+class BaselineOddsTracker:
+    """
+    Исходный алгоритм OddsTracker.detect_changes (словари и JSON-файлы) без
+    записи на диск: эталон, с которым сверяется текущая реализация
+    """
+
+    def __init__(self):
+        self.odds_history = {}
+        self.last_notified = {}
+
+    @staticmethod
+    def _get_threshold(odds_value):
+        if 1.01 <= odds_value < 1.1:
+            return 0.01
+        elif 1.1 <= odds_value < 1.2:
+            return 0.02
+        elif 1.2 <= odds_value < 1.3:
+            return 0.03
+        elif 1.3 <= odds_value < 1.4:
+            return 0.04
+        elif 1.4 <= odds_value < 1.6:
+            return 0.05
+        elif 1.6 <= odds_value < 1.9:
+            return 0.07
+        elif 1.9 <= odds_value < 2.2:
+            return 0.10
+        elif 2.2 <= odds_value < 2.5:
+            return 0.15
+        elif 2.5 <= odds_value < 3.0:
+            return 0.20
+        elif 3.0 <= odds_value < 4.0:
+            return 0.30
+        else:
+            return 0.50
+
+    def is_significant_change(self, current_value, last_reported_value):
+        if last_reported_value is None or current_value is None:
+            return False, current_value
+        if current_value == last_reported_value:
+            return False, last_reported_value
+        is_significant = abs(current_value - last_reported_value) >= self._get_threshold(last_reported_value)
+        return is_significant, current_value if is_significant else last_reported_value
+
+    def detect_changes(self, current_matches):
+        significant_changes = {}
+        for match_key, current_data in current_matches.items():
+            if match_key not in self.odds_history:
+                prices = {field: current_data.get(field) for field in FIELDS}
+                self.odds_history[match_key] = {
+                    'initial': dict(prices),
+                    'last_reported': dict(prices),
+                    'previous': None,
+                    'match_data': current_data,
+                }
+                self.last_notified.setdefault(match_key, {})
+                for field in FIELDS:
+                    if field in current_data:
+                        self.last_notified[match_key][field] = current_data.get(field)
+                continue
+
+            history = self.odds_history[match_key]
+            previous_data = history['match_data']
+            initial_data = history['initial']
+            last_reported = history.get('last_reported', {})
+            has_significant_changes = False
+            changes = {}
+
+            for field in FIELDS:
+                if field in current_data and field in initial_data:
+                    current_value = current_data.get(field)
+                    last_reported_value = self.last_notified.get(match_key, {}).get(field)
+                    if last_reported_value is None:
+                        last_reported_value = current_value
+                        self.last_notified.setdefault(match_key, {})[field] = current_value
+
+                    is_significant, new_last_reported = self.is_significant_change(current_value, last_reported_value)
+                    if is_significant:
+                        has_significant_changes = True
+                        self.last_notified.setdefault(match_key, {})[field] = new_last_reported
+                        last_reported[field] = new_last_reported
+
+                    if field in previous_data and current_value != previous_data.get(field):
+                        previous_value = previous_data.get(field)
+                        changes[field] = {
+                            'previous': previous_value,
+                            'current': current_value,
+                            'diff': abs(previous_value - current_value),
+                            'direction': 1 if current_value > previous_value else -1,
+                            'significant': is_significant
+                        }
+
+            if has_significant_changes:
+                significant_changes[match_key] = {
+                    'match_data': current_data,
+                    'initial_data': initial_data,
+                    'changes': changes
+                }
+
+            history['previous'] = dict(history['match_data'])
+            history['match_data'] = current_data
+            history['last_reported'] = last_reported
+
+        return significant_changes
+
+
+class BaselineMatchTracker:
+    """Исходный алгоритм MatchTracker.find_new_matches без записи на диск"""
+
+    def __init__(self):
+        self.known_matches = {}
+
+    @staticmethod
+    def _is_within_time_buffer(time_str1, time_str2, buffer_hours=5):
+        time1 = datetime.strptime(time_str1.strip(), "%H:%M").time()
+        time2 = datetime.strptime(time_str2.strip(), "%H:%M").time()
+        diff = abs((time1.hour * 60 + time1.minute) - (time2.hour * 60 + time2.minute))
+        if diff > 12 * 60:
+            diff = 24 * 60 - diff
+        return diff <= buffer_hours * 60
+
+    def find_new_matches(self, current_matches):
+        new_matches = {}
+        for match_name, data in current_matches.items():
+            match_time = data['time']
+            known_time = self.known_matches.get(match_name)
+            if known_time is not None and self._is_within_time_buffer(known_time, match_time, 5):
+                self.known_matches[match_name] = match_time
+                continue
+            new_matches[match_name] = data
+            self.known_matches[match_name] = match_time
+        return new_matches
+
+
+def random_snapshots(seed, count=60, cycles=80):
+    """
+    Снимки синтетической линии, в которых кроме цен иногда пропадают
+    и появляются форы и сдвигается время начала (в пределах буфера и за ним)
+    """
+    board = SyntheticBoard(count, volatility=0.3, handicap_ratio=0.7, churn=0.03, step_size=0.1, seed=seed)
+    rnd = random.Random(seed)
+    snapshots = [{key: dict(data) for key, data in board.matches.items()}]
+    for _ in range(cycles - 1):
+        snapshot = {}
+        for match_key, match_data in board.step().items():
+            match_data = dict(match_data)
+            roll = rnd.random()
+            if roll < 0.03:
+                for field in ('handicap1', 'handicap_odd1', 'handicap2', 'handicap_odd2'):
+                    match_data.pop(field, None)
+            elif roll < 0.06:
+                hours, minutes = map(int, match_data['time'].split(':'))
+                match_data['time'] = f"{(hours + rnd.choice((1, 3, 6, 9))) % 24:02d}:{minutes:02d}"
+            snapshot[match_key] = match_data
+        snapshots.append(snapshot)
+    return snapshots
+
+
+class TrackersMatchBaselineTest(unittest.TestCase):
+    seeds = range(40)
+    cycles = 80
+    interval = 300.0
+
+    def _run_odds(self, seed):
+        snapshots = random_snapshots(seed, cycles=self.cycles)
+        now = [1_700_000_000.0]
+        clock = lambda: now[0]
+        writer = StateWriter(StateStore(':memory:'), flush_interval=3600)
+        try:
+            baseline = BaselineOddsTracker()
+            tracker = OddsTracker(writer, retention_days=7, clock=clock)
+            for cycle, snapshot in enumerate(snapshots):
+                now[0] += self.interval
+                if cycle == self.cycles // 2:
+                    # Перезапуск посреди прогона: состояние должно пережить запись и загрузку
+                    writer.flush()
+                    tracker = OddsTracker(writer, retention_days=7, clock=clock)
+
+                references = {key: dict(values) for key, values in baseline.last_notified.items()}
+                expected = baseline.detect_changes(snapshot)
+                actual = tracker.detect_changes(snapshot)
+
+                self.assertEqual(list(actual), list(expected), f"seed {seed}, cycle {cycle}")
+                for match_key, data in expected.items():
+                    result = actual[match_key]
+                    self.assertEqual(result['match_data'], data['match_data'])
+                    self.assertEqual(result['initial_data'], data['initial_data'])
+                    self.assertEqual(result['changes'], data['changes'], f"seed {seed}, cycle {cycle}, {match_key}")
+                    significant = [field for field, change in data['changes'].items() if change['significant']]
+                    self.assertEqual(result['references'],
+                                     {field: references[match_key][field] for field in result['references']})
+                    self.assertTrue(set(significant) <= set(result['references']))
+
+            for match_key, notified in baseline.last_notified.items():
+                self.assertEqual(tracker.odds_history[match_key].notified_dict(), notified)
+        finally:
+            writer.close()
+
+    def test_odds_tracker_numpy(self):
+        if change_engine.np is None:
+            self.skipTest("numpy is not installed")
+        for seed in self.seeds:
+            self._run_odds(seed)
+
+    def test_odds_tracker_pure_python(self):
+        with mock.patch.object(change_engine, 'np', None):
+            for seed in self.seeds:
+                self._run_odds(seed)
+
+    def test_match_tracker(self):
+        for seed in self.seeds:
+            snapshots = random_snapshots(seed, cycles=self.cycles)
+            now = [1_700_000_000.0]
+            clock = lambda: now[0]
+            writer = StateWriter(StateStore(':memory:'), flush_interval=3600)
+            try:
+                baseline = BaselineMatchTracker()
+                tracker = MatchTracker(writer, retention_days=30, clock=clock)
+                for cycle, snapshot in enumerate(snapshots):
+                    now[0] += self.interval
+                    if cycle == self.cycles // 2:
+                        writer.flush()
+                        tracker = MatchTracker(writer, retention_days=30, clock=clock)
+                    self.assertEqual(tracker.find_new_matches(snapshot), baseline.find_new_matches(snapshot),
+                                     f"seed {seed}, cycle {cycle}")
+                self.assertEqual({key: known.match_time for key, known in tracker.known_matches.items()},
+                                 baseline.known_matches)
+            finally:
+                writer.close()
+
+
+class OddsTrackerEvictionTest(unittest.TestCase):
+    def test_match_back_on_board_after_eviction_stays_persisted(self):
+        now = [1_700_000_000.0]
+        store = StateStore(':memory:')
+        writer = StateWriter(store, flush_interval=3600)
+        try:
+            tracker = OddsTracker(writer, retention_days=1, clock=lambda: now[0])
+            tracker.detect_changes({'A vs B': {'time': '18:00', 'odds1': 1.9, 'odds2': 1.9}})
+            writer.flush()
+
+            # Простой дольше retention_days: матч вытесняется и сразу появляется снова
+            now[0] += 2 * 86400
+            tracker.detect_changes({'A vs B': {'time': '18:00', 'odds1': 2.5, 'odds2': 1.5}})
+            writer.flush()
+
+            self.assertIn('A vs B', tracker.odds_history)
+            self.assertEqual(list(store.load_odds_history()), ['A vs B'])
+            self.assertEqual(store.load_odds_history()['A vs B']['initial']['odds1'], 2.5)
+            self.assertEqual(store.load_last_notified()['A vs B']['odds1'], 2.5)
+        finally:
+            writer.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
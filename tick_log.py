@@ -0,0 +1,284 @@
+import os
+import mmap
+import time
+import struct
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Поля коэффициентов, которые попадают в лог
+FIELDS = ('odds1', 'odds2', 'handicap_odd1', 'handicap_odd2')
+FIELD_IDS = {field: index for index, field in enumerate(FIELDS)}
+
+# Запись фиксированной длины: время (секунды epoch), id матча в сегменте, поле, цена
+RECORD = struct.Struct('<dIBf')
+
+
+def segment_name(timestamp):
+    """Имя дневного сегмента (UTC) для метки времени"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('ticks-%Y%m%d')
+
+
+def read_keys(path):
+    """
+    Читает словарь матчей сегмента (.keys). Строки, испорченные аварийной
+    записью, пропускаются
+
+    Yields:
+        tuple: (match_id, match_key)
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            if not line.endswith('\n'):
+                # Недописанная последняя строка
+                continue
+            match_id, separator, match_key = line[:-1].partition('\t')
+            if not separator or not match_id.isdigit():
+                logger.warning(f"Skipping malformed line in {path}: {line[:80]!r}")
+                continue
+            yield int(match_id), match_key
+
+
+class TickLog:
+    def __init__(self, directory='ticks', changes_only=False):
+        """
+        Журнал всех наблюдаемых цен: дневные сегменты из записей фиксированной длины
+        (.ticks) и словарь матчей сегмента (.keys)
+
+        Args:
+            directory (str): Каталог с сегментами
+            changes_only (bool): Записывать цену, только если она изменилась
+        """
+        self.directory = directory
+        self.changes_only = changes_only
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._segment = None
+        self._data_file = None
+        self._keys_file = None
+        self._match_ids = {}
+        self._next_match_id = 0
+        self._last_timestamp = 0.0
+        self._last_prices = {}
+
+        # Счетчики для диагностики
+        self.records_written = 0
+
+    def _open_segment(self, name):
+        self._close_segment()
+        base = os.path.join(self.directory, name)
+
+        # Восстанавливаем словарь матчей и последнюю метку времени сегмента
+        keys_path = base + '.keys'
+        self._match_ids = {match_key: match_id for match_id, match_key in read_keys(keys_path)}
+        self._next_match_id = max(self._match_ids.values(), default=-1) + 1
+        if os.path.exists(keys_path):
+            # Отрезаем недописанную при аварии строку, чтобы новые строки не склеились с ней
+            with open(keys_path, 'r+b') as f:
+                data = f.read()
+                if data and not data.endswith(b'\n'):
+                    f.truncate(data.rfind(b'\n') + 1)
+
+        self._last_timestamp = 0.0
+        data_path = base + '.ticks'
+        if os.path.exists(data_path):
+            size = os.path.getsize(data_path)
+            # Отрезаем недописанную при аварии запись
+            if size % RECORD.size:
+                with open(data_path, 'r+b') as f:
+                    f.truncate(size - size % RECORD.size)
+                size -= size % RECORD.size
+            if size:
+                with open(data_path, 'rb') as f:
+                    f.seek(size - RECORD.size)
+                    self._last_timestamp = RECORD.unpack(f.read(RECORD.size))[0]
+
+        self._data_file = open(data_path, 'ab')
+        self._keys_file = open(base + '.keys', 'a', encoding='utf-8')
+        self._segment = name
+
+        # Кэш последних цен для changes_only живет в пределах сегмента: первая цена
+        # матча за день записывается всегда, а кэш не растет без ограничений
+        self._last_prices = {}
+
+    def _close_segment(self):
+        for f in (self._data_file, self._keys_file):
+            if f is not None:
+                f.close()
+        self._data_file = None
+        self._keys_file = None
+        self._segment = None
+
+    def _match_id(self, match_key):
+        match_id = self._match_ids.get(match_key)
+        if match_id is None:
+            match_id = self._next_match_id
+            self._next_match_id += 1
+            self._match_ids[match_key] = match_id
+            self._keys_file.write(f"{match_id}\t{match_key}\n")
+            self._keys_file.flush()
+        return match_id
+
+    def append(self, observations):
+        """
+        Дописывает наблюдения одной пачкой
+
+        Args:
+            observations (iterable): [(timestamp, match_key, match_data), ...]
+
+        Returns:
+            int: Количество записанных цен
+        """
+        with self._lock:
+            buffer = bytearray()
+            for timestamp, match_key, match_data in observations:
+                name = segment_name(timestamp)
+                if name != self._segment:
+                    if buffer:
+                        self._data_file.write(buffer)
+                        buffer = bytearray()
+                    self._open_segment(name)
+
+                # Метки времени в сегменте не убывают, чтобы по ним работал бинарный поиск
+                timestamp = max(timestamp, self._last_timestamp)
+                self._last_timestamp = timestamp
+
+                match_id = None
+                for field, field_id in FIELD_IDS.items():
+                    price = match_data.get(field)
+                    if price is None:
+                        continue
+                    if self.changes_only:
+                        if self._last_prices.get((match_key, field_id)) == price:
+                            continue
+                        self._last_prices[(match_key, field_id)] = price
+                    if match_id is None:
+                        match_id = self._match_id(match_key)
+                    buffer += RECORD.pack(timestamp, match_id, field_id, price)
+
+            if buffer:
+                self._data_file.write(buffer)
+                self._data_file.flush()
+            written = len(buffer) // RECORD.size
+            self.records_written += written
+            return written
+
+    def append_matches(self, matches, timestamp=None):
+        """Записывает все цены снимка с одной меткой времени"""
+        timestamp = time.time() if timestamp is None else timestamp
+        return self.append((timestamp, match_key, match_data) for match_key, match_data in matches.items())
+
+    def close(self):
+        with self._lock:
+            self._close_segment()
+
+
+class TickReader:
+    def __init__(self, directory='ticks'):
+        """
+        Чтение журнала цен через mmap: поиск диапазона времени бинарным поиском,
+        фильтр по матчу и полю без разбора остальных записей
+
+        Args:
+            directory (str): Каталог с сегментами
+        """
+        self.directory = directory
+
+    def segments(self, start=None, end=None):
+        """Имена сегментов, пересекающихся с интервалом [start, end]"""
+        names = sorted(
+            name[:-len('.ticks')] for name in os.listdir(self.directory) if name.endswith('.ticks')
+        ) if os.path.isdir(self.directory) else []
+        first = segment_name(start) if start is not None else None
+        last = segment_name(end) if end is not None else None
+        return [name for name in names if (first is None or name >= first) and (last is None or name <= last)]
+
+    def _load_keys(self, name):
+        return dict(read_keys(os.path.join(self.directory, name + '.keys')))
+
+    @staticmethod
+    def _bisect(view, count, timestamp):
+        """Индекс первой записи с меткой времени >= timestamp"""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if RECORD.unpack_from(view, middle * RECORD.size)[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def scan(self, match_key=None, start=None, end=None, field=None):
+        """
+        Перебирает записи в порядке времени
+
+        Args:
+            match_key (str): Только этот матч
+            start (float): Начало интервала (секунды epoch, включительно)
+            end (float): Конец интервала (не включительно)
+            field (str): Только это поле из FIELDS
+
+        Yields:
+            tuple: (timestamp, match_key, field, price)
+        """
+        field_id = FIELD_IDS[field] if field is not None else None
+
+        for name in self.segments(start, end):
+            keys = self._load_keys(name)
+            match_id = None
+            if match_key is not None:
+                match_id = next((key_id for key_id, key in keys.items() if key == match_key), None)
+                if match_id is None:
+                    continue
+
+            path = os.path.join(self.directory, name + '.ticks')
+            count = os.path.getsize(path) // RECORD.size
+            if not count:
+                continue
+
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                chunk = None
+                try:
+                    first = self._bisect(view, count, start) if start is not None else 0
+                    last = self._bisect(view, count, end) if end is not None else count
+                    chunk = view[first * RECORD.size:last * RECORD.size]
+                    for timestamp, record_match, record_field, price in RECORD.iter_unpack(chunk):
+                        if match_id is not None and record_match != match_id:
+                            continue
+                        if field_id is not None and record_field != field_id:
+                            continue
+                        # float32 хранит коэффициент с погрешностью, возвращаем исходную точность
+                        yield timestamp, keys.get(record_match), FIELDS[record_field], round(price, 3)
+                finally:
+                    # Срезы должны быть освобождены до закрытия mmap
+                    if chunk is not None:
+                        chunk.release()
+                    view.release()
+
+    def series(self, match_key, field, start=None, end=None):
+        """Ряд цен одного поля матча: [(timestamp, price), ...]"""
+        return [(timestamp, price) for timestamp, _, _, price in self.scan(match_key, start, end, field)]
+
+
+# Общий журнал цен
+_tick_log = None
+_tick_log_lock = threading.Lock()
+
+
+def get_tick_log():
+    """Возвращает общий журнал цен или None, если он выключен"""
+    global _tick_log
+
+    with _tick_log_lock:
+        if _tick_log is None:
+            from config import TICK_LOG, TICK_LOG_DIR, TICK_LOG_CHANGES_ONLY
+            if not TICK_LOG:
+                return None
+            _tick_log = TickLog(TICK_LOG_DIR, changes_only=TICK_LOG_CHANGES_ONLY)
+        return _tick_log
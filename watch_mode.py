@@ -0,0 +1,196 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+from driver_pool import get_driver_pool
+from extraction import ROW_EXTRACT_JS, IncrementalExtractor, build_match, wait_for_odds_table
+from fetchers import get_scrape_executor
+
+logger = logging.getLogger(__name__)
+
+# Ставит на страницу наблюдатель, который при каждом изменении цены
+# перечитывает строку матча и кладет ее с отметкой времени в кольцевой буфер
+WATCH_INSTALL_JS = ROW_EXTRACT_JS + r"""
+var capacity = arguments[0];
+if (window.__oddsWatch) {
+    return false;
+}
+
+var watch = {buffer: [], dropped: 0};
+
+function priceRow(node) {
+    var element = node.nodeType === 1 ? node : node.parentElement;
+    if (!element) {
+        return null;
+    }
+    var isPrice = element.closest('.stylePrice') ||
+        (element.getElementsByClassName && element.getElementsByClassName('stylePrice').length);
+    return isPrice ? element.closest('.styleRowHighlight') : null;
+}
+
+watch.observer = new MutationObserver(function(mutations) {
+    var rows = new Set();
+    for (var i = 0; i < mutations.length; i++) {
+        var row = priceRow(mutations[i].target);
+        if (row) {
+            rows.add(row);
+        }
+    }
+    var now = Date.now();
+    rows.forEach(function(row) {
+        var extracted = extractRow(row);
+        if (extracted === null) {
+            return;
+        }
+        watch.buffer.push([now, extracted]);
+        if (watch.buffer.length > capacity) {
+            watch.buffer.shift();
+            watch.dropped++;
+        }
+    });
+});
+watch.observer.observe(document.body, {subtree: true, childList: true, characterData: true});
+window.__oddsWatch = watch;
+return true;
+"""
+
+# Забирает накопленные изменения и очищает буфер
+WATCH_DRAIN_JS = r"""
+var watch = window.__oddsWatch;
+if (!watch) {
+    return null;
+}
+var ticks = watch.buffer;
+var dropped = watch.dropped;
+watch.buffer = [];
+watch.dropped = 0;
+return JSON.stringify([dropped, ticks]);
+"""
+
+
+class WatchSession:
+    def __init__(self, url, buffer_size=2000, reload_interval=1800):
+        """
+        Постоянно открытая вкладка, в которой изменения цен отслеживаются
+        на стороне страницы, без перезагрузки на каждый цикл
+
+        Args:
+            url (str): Страница с коэффициентами
+            buffer_size (int): Емкость кольцевого буфера изменений на странице
+            reload_interval (int): Через сколько секунд перезагружать вкладку
+        """
+        self.url = url
+        self.buffer_size = buffer_size
+        self.reload_interval = reload_interval
+
+        self._lease = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        # Снимки из открытой вкладки передают только изменившиеся строки
+        self._extractor = IncrementalExtractor()
+
+        # Счетчики для диагностики
+        self.ticks_total = 0
+        self.dropped_total = 0
+
+    def _load(self):
+        from config import DRIVER_ACQUIRE_TIMEOUT, READY_TIMEOUT, READY_QUIET_WINDOW, READY_POLL_INTERVAL
+
+        pool = get_driver_pool()
+        if self._lease is not None:
+            # Возвращаем сессию, чтобы пул мог утилизировать ее по возрасту
+            pool.release(self._lease)
+            self._lease = None
+        self._lease = pool.acquire(timeout=DRIVER_ACQUIRE_TIMEOUT)
+
+        driver = self._lease.driver
+        logger.info(f"Watch mode: loading {self.url}")
+        driver.get(self.url)
+        driver.execute_script("document.body.style.zoom = '70%'")
+        waited = wait_for_odds_table(
+            driver,
+            timeout=READY_TIMEOUT,
+            quiet_window=READY_QUIET_WINDOW,
+            poll_interval=READY_POLL_INTERVAL
+        )
+        driver.execute_script(WATCH_INSTALL_JS, self.buffer_size)
+        self._loaded_at = time.monotonic()
+        logger.info(f"Watch mode: observer installed after {waited:.2f}s")
+
+    def _ensure_loaded(self):
+        if (self._lease is None or self._loaded_at is None
+                or time.monotonic() - self._loaded_at >= self.reload_interval):
+            self._load()
+        return self._lease.driver
+
+    def _reset(self):
+        if self._lease is not None:
+            get_driver_pool().release(self._lease, failed=True)
+        self._lease = None
+        self._loaded_at = None
+
+    def drain(self):
+        """
+        Забирает изменения цен, накопленные на странице с прошлого вызова
+
+        Returns:
+            list: [(timestamp, match_key, match_data), ...] в порядке поступления
+        """
+        with self._lock:
+            try:
+                driver = self._ensure_loaded()
+                raw = driver.execute_script(WATCH_DRAIN_JS)
+                if raw is None:
+                    # Страница была перезагружена или наблюдатель потерян
+                    logger.warning("Watch mode: observer missing, reloading page")
+                    self._loaded_at = None
+                    return []
+            except Exception as e:
+                logger.error(f"Watch mode: error draining changes: {e}")
+                logger.error(traceback.format_exc())
+                self._reset()
+                return []
+
+        dropped, ticks = json.loads(raw)
+        if dropped:
+            logger.warning(f"Watch mode: ring buffer overflow, {dropped} changes dropped")
+        self.dropped_total += dropped
+        self.ticks_total += len(ticks)
+
+        changes = []
+        for timestamp, row in ticks:
+            try:
+                match_key, match_data = build_match(row)
+            except Exception as e:
+                logger.error(f"Watch mode: error processing row {row}: {e}")
+                continue
+            changes.append((timestamp / 1000, match_key, match_data))
+        return changes
+
+    def snapshot(self):
+        """Полный снимок таблицы из открытой вкладки без навигации"""
+        with self._lock:
+            try:
+                driver = self._ensure_loaded()
+                return self._extractor.extract(driver)
+            except Exception as e:
+                logger.error(f"Watch mode: error taking snapshot: {e}")
+                logger.error(traceback.format_exc())
+                self._reset()
+                return {}
+
+    async def drain_async(self):
+        return await asyncio.get_running_loop().run_in_executor(get_scrape_executor(), self.drain)
+
+    async def snapshot_async(self):
+        return await asyncio.get_running_loop().run_in_executor(get_scrape_executor(), self.snapshot)
+
+    def close(self):
+        with self._lock:
+            if self._lease is not None:
+                get_driver_pool().release(self._lease)
+            self._lease = None
+            self._loaded_at = None